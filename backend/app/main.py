@@ -1,9 +1,40 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from app.routes.admin import router as admin_router
 from app.routes.chat import router as chat_router
+from app.routes.files import router as files_router
+from app.routes.jobs import router as jobs_router
+from app.routes.stats import router as stats_router
+from app.routes.ws import router as ws_router
 from app.middleware.session import SessionMiddleware
+from app.services.admission import AdmissionRejected
+from app.services.jobs import job_manager
+from app.services.message_service import message_service
+import asyncio
+import os
 
-app = FastAPI(title="Chat API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The store is loaded and its plans indexed in the background; health checks answer meanwhile,
+    # other requests wait for the store
+    message_service.start()
+    prewarm = None
+    if os.getenv("STARTUP_PREWARM", "false").lower() == "true":
+        # Services are built on first use; this warms them in the background without delaying startup
+        prewarm = asyncio.create_task(message_service.prewarm())
+    yield
+    if prewarm is not None:
+        prewarm.cancel()
+    # Stop job workers first, their conversations go through the message service
+    await job_manager.close()
+    # Flush queued conversation writes before the process exits
+    await message_service.close()
+
+
+app = FastAPI(title="Chat API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware to allow requests from frontend (must be first)
 app.add_middleware(
@@ -12,6 +43,7 @@ app.add_middleware(
     allow_credentials=True,  # Required for cookies
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],  # Readable by the frontend for paging and versions
 )
 
 # Session middleware - creates session automatically on first request
@@ -19,6 +51,21 @@ app.add_middleware(SessionMiddleware)
 
 # Include routes
 app.include_router(chat_router)
+app.include_router(files_router)
+app.include_router(jobs_router)
+app.include_router(stats_router)
+app.include_router(ws_router)
+app.include_router(admin_router)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Tell clients to back off when upstream capacity is exhausted"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.get("/")
@@ -28,4 +75,4 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "store": message_service.store_state}
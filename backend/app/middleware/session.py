@@ -1,43 +1,129 @@
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
 from uuid import uuid4
-from datetime import datetime
-from typing import Dict
-
-
-# In-memory session storage (use Redis in production)
-sessions: Dict[str, dict] = {}
-
-
-class SessionMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Check if session cookie exists
-        session_id = request.cookies.get("session_id")
-        
-        # If no session or invalid session, create a new one
-        if not session_id or session_id not in sessions:
-            session_id = str(uuid4())
-            sessions[session_id] = {
-                "created_at": datetime.now().isoformat()
-            }
-        
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+
+SESSION_COOKIE = "session_id"
+SESSION_MAX_AGE = 86400 * 7  # 7 days
+SESSION_ROTATE_AFTER = 86400  # Re-issue the token once a day for active sessions
+
+
+def _load_secret() -> bytes:
+    secret = os.getenv("SESSION_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    # Without a shared secret sessions only survive as long as this process
+    print("SESSION_SECRET is not set, using a random secret for this process")
+    return secrets.token_bytes(32)
+
+
+class SessionSigner:
+    """Issue and verify HMAC-signed session tokens: <session_id>.<issued_at>.<signature>"""
+
+    def __init__(self, secret: bytes):
+        self._secret = secret
+
+    def _signature(self, payload: str) -> str:
+        digest = hmac.new(self._secret, payload.encode("ascii"), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+    def sign(self, session_id: str, issued_at: int) -> str:
+        payload = f"{session_id}.{issued_at}"
+        return f"{payload}.{self._signature(payload)}"
+
+    def verify(self, token: str) -> Optional[tuple[str, int]]:
+        """Return (session_id, issued_at) for a correctly signed token, or None"""
+        try:
+            payload, signature = token.rsplit(".", 1)
+            session_id, issued_at = payload.split(".", 1)
+            issued = int(issued_at)
+            expected = self._signature(payload)
+        except (ValueError, UnicodeEncodeError):
+            return None
+        if not hmac.compare_digest(signature, expected):
+            return None
+        return session_id, issued
+
+
+class SessionMiddleware:
+    """Stateless session middleware based on signed cookies.
+
+    Tokens are validated without any server-side lookup, so sessions work
+    across workers and restarts as long as SESSION_SECRET is shared. Expired
+    or invalid tokens start a new session, and tokens older than
+    `rotate_after` are re-issued with the same session id. The Set-Cookie
+    header is only sent when a token is issued.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        secret: Optional[bytes] = None,
+        max_age: int = SESSION_MAX_AGE,
+        rotate_after: int = SESSION_ROTATE_AFTER,
+        secure: Optional[bool] = None
+    ):
+        self.app = app
+        self.signer = SessionSigner(secret or _load_secret())
+        self.max_age = max_age
+        self.rotate_after = rotate_after
+        if secure is None:
+            secure = os.getenv("SESSION_COOKIE_SECURE", "false").lower() == "true"
+        # Static cookie attributes, built once
+        self._cookie_attributes = f"; Max-Age={max_age}; Path=/; HttpOnly; SameSite=lax"
+        if secure:
+            self._cookie_attributes += "; Secure"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        now = int(time.time())
+        session = self._read_session(scope, now)
+        if session is None:
+            session_id, new_token = uuid4().hex, True
+        else:
+            session_id, issued_at = session
+            new_token = now - issued_at >= self.rotate_after
+
         # Store session_id in request state for routes to access
-        request.state.session_id = session_id
-        
-        # Process the request
-        response: Response = await call_next(request)
-        
-        # Set/update cookie in response
-        response.set_cookie(
-            key="session_id",
-            value=session_id,
-            httponly=True,  # Not accessible from JavaScript
-            secure=False,   # Set to True in production with HTTPS
-            samesite="lax", # CSRF protection
-            max_age=86400 * 7  # 7 days
-        )
-        
-        return response
+        scope.setdefault("state", {})["session_id"] = session_id
+        # WebSockets cannot set the cookie, so they need to know whether the session already existed
+        scope["state"]["new_session"] = session is None
+
+        if not new_token or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cookie = f"{SESSION_COOKIE}={self.signer.sign(session_id, now)}{self._cookie_attributes}".encode("latin-1")
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+    def _read_session(self, scope: Scope, now: int) -> Optional[tuple[str, int]]:
+        """Return (session_id, issued_at) from a valid, unexpired session cookie"""
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                token = cookie_parser(value.decode("latin-1")).get(SESSION_COOKIE)
+                if not token:
+                    continue
+                session = self.signer.verify(token)
+                if session and now - session[1] < self.max_age:
+                    return session
+        return None
 
 
 def get_session_id(request: Request) -> str:
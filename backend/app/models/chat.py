@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from datetime import datetime
+from enum import Enum
 
 
 def to_camel(string: str) -> str:
@@ -22,6 +23,7 @@ class MessageRequest(BaseModel):
     """User message request"""
     message: str = Field(..., min_length=1, description="User message content")
     mode: str = Field(default='basic', description="Planning mode: 'basic' or 'detailed'")
+    attachments: List[str] = Field(default_factory=list, max_length=5, description="IDs of uploaded files to use as context")
 
 
 class Task(CamelCaseModel):
@@ -46,19 +48,106 @@ class ProjectPlan(CamelCaseModel):
     tips: List[str]
 
 
+class PlanPatchOperation(CamelCaseModel):
+    """A single change to a project plan, applied in order with 0-based indices"""
+    op: Literal[
+        'addTask', 'updateTask', 'removeTask', 'moveTask',
+        'addTimeBlock', 'renameTimeBlock', 'removeTimeBlock',
+        'setOverview', 'setTechStack', 'setTips'
+    ]
+    block_index: Optional[int] = None
+    task_index: Optional[int] = None
+    to_block_index: Optional[int] = None  # moveTask destination
+    to_task_index: Optional[int] = None
+    task: Optional[str] = None
+    essential: Optional[bool] = None
+    estimated_time: Optional[str] = None
+    name: Optional[str] = None  # Time block name
+    value: Optional[Union[str, List[str]]] = None  # setOverview / setTechStack / setTips
+
+
+class FileType(str, Enum):
+    """Kind of an uploaded file"""
+    IMAGE = "image"
+    PDF = "pdf"
+    WORD = "word"
+    OTHER = "other"
+
+
+class FileUpload(CamelCaseModel):
+    """An uploaded file"""
+    id: str
+    path: str  # Download URL
+    type: FileType
+    filename: str
+    size: int
+    content_type: str = "application/octet-stream"
+    sha256: str = ""  # Content hash, identical uploads share storage
+    uploaded_at: datetime = Field(default_factory=datetime.now)
+
+
+class FileReference(CamelCaseModel):
+    """Reference to an uploaded file stored with a conversation"""
+    id: str
+    path: str
+    type: FileType
+    filename: str
+
+
 class Conversation(CamelCaseModel):
     """Chat conversation with user message and bot response"""
     id: str
     user_message: str
     bot_response: str
     project_plan: Optional[ProjectPlan] = None
+    plan_patch: Optional[List[PlanPatchOperation]] = None  # Set when the plan was refined by a patch
+    base_conversation_id: Optional[str] = None  # Conversation whose plan the patch was applied to
+    attachments: Optional[List[FileReference]] = None  # Files attached to the user message
+    plan_version: int = 0  # Incremented on every task state change
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+class ConversationSummary(CamelCaseModel):
+    """Conversation without its plan, for listing history cheaply"""
+    id: str
+    user_message: str
+    bot_response: str
+    has_plan: bool
+    plan_version: int = 0
+    base_conversation_id: Optional[str] = None
+    timestamp: datetime
+
+
 class ConversationResponse(CamelCaseModel):
     """API response for a conversation"""
     id: str
     user_message: str
     bot_response: str
     project_plan: Optional[ProjectPlan] = None
+    plan_patch: Optional[List[PlanPatchOperation]] = None
+    base_conversation_id: Optional[str] = None
+    attachments: Optional[List[FileReference]] = None
+    plan_version: int = 0
+    timestamp: datetime
+
+
+class PlanSearchResult(CamelCaseModel):
+    """A stored plan matching a search"""
+    conversation_id: str
+    score: float
+    project_overview: str
+    tech_stack: List[str]
+    completed_tasks: int
+    total_tasks: int
     timestamp: datetime
+
+
+class JobStatus(CamelCaseModel):
+    """State of an asynchronous plan generation job"""
+    id: str
+    status: Literal['queued', 'running', 'succeeded', 'failed']
+    conversation_id: Optional[str] = None  # Set once the result is stored
+    conversation: Optional[ConversationResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
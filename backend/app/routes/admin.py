@@ -0,0 +1,155 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import Field, ValidationError
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+import hmac
+import os
+import zlib
+from app.models.chat import CamelCaseModel, Conversation
+from app.services.message_service import message_service
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Conversations added to the store per batch during an import
+IMPORT_BATCH_SIZE = int(os.getenv("ADMIN_IMPORT_BATCH_SIZE", "500"))
+# Longest accepted NDJSON line, also bounds the memory of a gzip bomb
+MAX_LINE_BYTES = 4 * 1024 * 1024
+# Invalid lines reported in the import result, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Check the `Authorization: Bearer <ADMIN_TOKEN>` header"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin), Depends(message_service.wait_until_loaded)]
+)
+
+
+class ExportedConversation(CamelCaseModel):
+    """One line of an export"""
+    session_id: str = Field(..., min_length=1)
+    conversation: Conversation
+
+
+class ImportResult(CamelCaseModel):
+    imported: int
+    skipped: int
+    invalid: int
+    errors: List[str]
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def body_lines(request: Request, gzip: bool) -> AsyncIterator[bytes]:
+    """Lines of a streamed request body, decompressed on the fly if `gzip`"""
+    decompressor = zlib.decompressobj(47) if gzip else None
+    buffer = b""
+
+    def split(data: bytes) -> List[bytes]:
+        nonlocal buffer
+        buffer += data
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        if len(buffer) > MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Line longer than {MAX_LINE_BYTES} bytes")
+        return lines
+
+    async for chunk in request.stream():
+        if decompressor is None:
+            for line in split(chunk):
+                yield line
+            continue
+        try:
+            # Bounded output per call, a small compressed chunk can expand a lot
+            while chunk:
+                for line in split(decompressor.decompress(chunk, MAX_LINE_BYTES)):
+                    yield line
+                chunk = decompressor.unconsumed_tail
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    if buffer:
+        yield buffer
+
+
+@router.get("/export")
+async def export_conversations(
+    session_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = False
+):
+    """Stream conversations and their plans as NDJSON, optionally of one session and time range.
+
+    One `{"sessionId", "conversation"}` object per line, in the format
+    accepted by the import. With `gzip` the body is a .ndjson.gz file.
+    """
+    chunks = message_service.export_conversations(session_id, since, until)
+    if gzip:
+        return StreamingResponse(
+            gzip_chunks(chunks),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="conversations.ndjson.gz"'}
+        )
+    return StreamingResponse(
+        chunks,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="conversations.ndjson"'}
+    )
+
+
+@router.post("/import", response_model=ImportResult)
+async def import_conversations(request: Request, content_encoding: Optional[str] = Header(None)):
+    """Import an NDJSON export, gzip compressed if sent with `Content-Encoding: gzip`.
+
+    The body is read as a stream and added in batches. Conversations whose
+    id already exists are skipped, so an interrupted import can be sent
+    again. Invalid lines are counted and reported without stopping it.
+    """
+    gzip = (content_encoding or "").strip().lower() == "gzip" \
+        or request.headers.get("content-type", "").startswith("application/gzip")
+    imported = skipped = invalid = 0
+    errors: List[str] = []
+    batch: List[tuple[str, Conversation]] = []
+
+    async def flush():
+        nonlocal imported, skipped
+        added = await message_service.import_conversations(batch)
+        imported += added
+        skipped += len(batch) - added
+        batch.clear()
+
+    number = 0
+    async for line in body_lines(request, gzip):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            entry = ExportedConversation.model_validate_json(line)
+        except ValidationError as e:
+            invalid += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"Line {number}: {e.error_count()} validation errors, first: {e.errors()[0]['msg']}")
+            continue
+        batch.append((entry.session_id, entry.conversation))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return ImportResult(imported=imported, skipped=skipped, invalid=invalid, errors=errors)
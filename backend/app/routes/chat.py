@@ -1,11 +1,21 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List
-from pydantic import BaseModel
-from app.models.chat import MessageRequest, ConversationResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+import json
+from pydantic import BaseModel, Field
+from app.models.chat import CamelCaseModel, MessageRequest, ConversationResponse, PlanSearchResult
+from app.storage import PlanVersionConflict
+from app.services.file_service import file_service
 from app.services.message_service import message_service
+from app.services.serialization import JSONBytesResponse
 from app.middleware.session import get_session_id
 
-router = APIRouter(prefix="/api", tags=["chat"])
+# Requests wait until the conversation store has been loaded at startup
+router = APIRouter(prefix="/api", tags=["chat"], dependencies=[Depends(message_service.wait_until_loaded)])
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_SEARCH_RESULTS = 50
 
 
 class UpdateTaskRequest(BaseModel):
@@ -15,38 +25,165 @@ class UpdateTaskRequest(BaseModel):
     completed: bool
 
 
-@router.get("/conversations", response_model=List[ConversationResponse])
-async def get_conversations(request: Request):
-    """Get all conversations for current session"""
+class TaskUpdate(CamelCaseModel):
+    """A single task completion change in a batch"""
+    time_block_index: int
+    task_index: int
+    completed: bool
+
+
+class BatchUpdateTasksRequest(CamelCaseModel):
+    """Request to update several tasks of a plan at once"""
+    version: Optional[int] = None  # Plan version the updates are based on
+    updates: List[TaskUpdate] = Field(..., min_length=1, max_length=500)
+
+
+def check_attachments(message_data: MessageRequest, session_id: str):
+    """Reject attachments that are unknown or belong to another session"""
+    for file_id in message_data.attachments:
+        if not file_service.get_file(file_id, session_id):
+            raise HTTPException(status_code=400, detail=f"Unknown attachment {file_id}")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True if an If-None-Match header matches the ETag (weak comparison)"""
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def plan_etag(version: int) -> str:
+    return f'"v{version}"'
+
+
+def parse_plan_etag(etag: str) -> Optional[int]:
+    """Plan version from an ETag/If-Match value, or None if it is not a plan ETag"""
+    value = etag.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    value = value.strip('"')
+    if not value.startswith('v') or not value[1:].isdigit():
+        return None
+    return int(value[1:])
+
+
+@router.get(
+    "/conversations",
+    response_class=JSONBytesResponse,
+    responses={200: {"model": List[ConversationResponse]}}
+)
+async def get_conversations(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    view: Literal['full', 'summary'] = 'full',
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get conversations for current session, oldest first.
+    
+    Without parameters the whole history is returned. With `limit` the newest
+    page is returned and X-Next-Cursor is set if there are older conversations;
+    pass it as `before` to get the previous page. `since` returns only the
+    conversations after the given id. view=summary leaves out the plans.
+    Responses carry an ETag and unchanged history is answered with 304.
+    """
+    if before and since:
+        raise HTTPException(status_code=400, detail="Use either before or since, not both")
     session_id = get_session_id(request)
-    conversations = await message_service.get_conversations(user=session_id)
-    return conversations
+    
+    etag = message_service.history_etag(session_id, str(sorted(request.query_params.multi_items())))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    if limit is None and before is None and since is None:
+        conversations, has_more = await message_service.get_conversations(user=session_id), False
+    else:
+        page = await message_service.get_conversation_page(
+            session_id, limit or DEFAULT_PAGE_SIZE, before=before, since=since
+        )
+        if page is None:
+            raise HTTPException(status_code=400, detail="Unknown cursor")
+        conversations, has_more = page
+    
+    if has_more and conversations:
+        # Delta mode continues forwards from the newest item, paging goes backwards
+        headers["X-Next-Cursor"] = conversations[-1].id if since else conversations[0].id
+    
+    return JSONBytesResponse(message_service.serializer.dumps_list(conversations, view), headers=headers)
 
 
-@router.post("/conversations", response_model=ConversationResponse)
-async def send_message(message_data: MessageRequest, request: Request):
-    """Process user message and generate bot response"""
+@router.post("/conversations", response_class=JSONBytesResponse, responses={200: {"model": ConversationResponse}})
+async def send_message(
+    message_data: MessageRequest,
+    request: Request,
+    plan_format: Literal['full', 'patch'] = Query('full', alias='planFormat')
+):
+    """Process user message and generate bot response.
+    
+    With planFormat=patch, a refined plan is returned as the patch against the
+    base conversation's plan instead of the full patched plan.
+    """
     session_id = get_session_id(request)
+    check_attachments(message_data, session_id)
     
     # Process user message and generate bot response
     conversation = await message_service.process_user_message(message_data, user=session_id)
     
-    return ConversationResponse(
-        id=conversation.id,
-        user_message=conversation.user_message,
-        bot_response=conversation.bot_response,
-        project_plan=conversation.project_plan,
-        timestamp=conversation.timestamp
+    if plan_format == 'patch' and conversation.plan_patch is not None:
+        return JSONBytesResponse(message_service.serializer.dumps_uncached(
+            conversation.model_copy(update={"project_plan": None})
+        ))
+    return JSONBytesResponse(message_service.serializer.dumps(conversation))
+
+
+@router.post("/conversations/stream")
+async def stream_message(message_data: MessageRequest, request: Request):
+    """Process user message and stream the bot response as NDJSON events"""
+    session_id = get_session_id(request)
+    check_attachments(message_data, session_id)
+    events = message_service.stream_user_message(message_data, user=session_id)
+    # Wait for the first event before responding, so an admission rejection is still a 429
+    first_event = await anext(events)
+    
+    async def event_lines():
+        yield json.dumps(first_event) + "\n"
+        async for event in events:
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(
+        event_lines(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering so events flush immediately
+        }
     )
 
 
-@router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
-async def get_conversation(conversation_id: str):
+@router.get(
+    "/conversations/{conversation_id}",
+    response_class=JSONBytesResponse,
+    responses={200: {"model": ConversationResponse}}
+)
+async def get_conversation(conversation_id: str, request: Request):
     """Get a specific conversation by ID"""
-    conversation = await message_service.get_conversation_by_id(conversation_id)
+    session_id = get_session_id(request)
+    conversation = await message_service.get_conversation_by_id(conversation_id, session_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation
+    return JSONBytesResponse(message_service.serializer.dumps(conversation))
+
+
+@router.get("/plans/search", response_model=List[PlanSearchResult])
+async def search_plans(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS)
+):
+    """Search the plans of the current session by overview, tech stack and task text, best match first"""
+    return await message_service.search_plans(get_session_id(request), q, limit)
 
 
 @router.delete("/conversations")
@@ -58,11 +195,11 @@ async def clear_conversations(request: Request):
 
 
 @router.patch("/conversations/{conversation_id}/tasks")
-async def update_task_status(conversation_id: str, update: UpdateTaskRequest, request: Request):
+async def update_task_status(conversation_id: str, update: UpdateTaskRequest, request: Request, response: Response):
     """Update the completion status of a specific task"""
     session_id = get_session_id(request)
     
-    success = await message_service.update_task_completion(
+    version = await message_service.update_task_completion(
         conversation_id=conversation_id,
         user=session_id,
         time_block_index=update.time_block_index,
@@ -70,7 +207,51 @@ async def update_task_status(conversation_id: str, update: UpdateTaskRequest, re
         completed=update.completed
     )
     
-    if not success:
+    if version is None:
+        raise HTTPException(status_code=404, detail="Conversation or task not found")
+    
+    response.headers["ETag"] = plan_etag(version)
+    return {"message": "Task status updated successfully", "version": version}
+
+
+@router.patch("/conversations/{conversation_id}/tasks/batch")
+async def update_task_statuses(
+    conversation_id: str,
+    batch: BatchUpdateTasksRequest,
+    request: Request,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    """Atomically update several tasks of a plan.
+    
+    The expected plan version comes from the body or an If-Match ETag; stale
+    versions are rejected with 409 so out-of-order updates cannot overwrite
+    each other.
+    """
+    session_id = get_session_id(request)
+    
+    expected_version = batch.version
+    if expected_version is None and if_match:
+        expected_version = parse_plan_etag(if_match)
+        if expected_version is None:
+            raise HTTPException(status_code=412, detail="Invalid If-Match header")
+    
+    try:
+        version = await message_service.update_tasks(
+            conversation_id=conversation_id,
+            user=session_id,
+            updates=[(u.time_block_index, u.task_index, u.completed) for u in batch.updates],
+            expected_version=expected_version
+        )
+    except PlanVersionConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Plan was modified", "currentVersion": e.current_version},
+            headers={"ETag": plan_etag(e.current_version)}
+        )
+    
+    if version is None:
         raise HTTPException(status_code=404, detail="Conversation or task not found")
     
-    return {"message": "Task status updated successfully"}
+    response.headers["ETag"] = plan_etag(version)
+    return {"message": "Task statuses updated successfully", "version": version}
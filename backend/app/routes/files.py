@@ -1,43 +1,166 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from pathlib import Path
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from typing import Optional
+from urllib.parse import quote
+import anyio
+import os
 from app.models.chat import FileUpload
-from app.services.file_service import file_service
+from app.middleware.session import get_session_id
+from app.services.file_service import FileTooLargeError, file_service
+from app.services.upload_stream import MultipartFileStream, UploadFormError
 
 router = APIRouter(prefix="/api/files", tags=["files"])
 
+# Bytes read per chunk when zero-copy send is not available
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Allowance for multipart boundaries and part headers on top of the file size
+MULTIPART_OVERHEAD = 16 * 1024
+# Content types shown inline; anything else could run script on the API origin and is downloaded as bytes
+INLINE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp", "application/pdf", "text/plain"}
+
+
+def served_content_type(content_type: str) -> tuple[str, str]:
+    """(media type, disposition) to serve an upload with, never trusting the uploader's type for active content"""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in INLINE_CONTENT_TYPES:
+        return media_type, "inline"
+    return "application/octet-stream", "attachment"
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Inclusive (start, end) of a single `bytes=` range, None if unsatisfiable or unsupported"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """File response with single-range support and zero-copy send.
+
+    Uses the ASGI `http.response.zerocopysend` extension when the server
+    provides it, otherwise the file is read in fixed-size chunks so memory
+    stays flat regardless of the file size.
+    """
+
+    def __init__(self, path: Path, content_type: str, filename: str, range_header: Optional[str] = None):
+        media_type, disposition = served_content_type(content_type)
+        super().__init__(media_type=media_type)
+        self.path = path
+        size = path.stat().st_size
+        self.start, self.end = 0, size - 1
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["content-disposition"] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+        self.headers["x-content-type-options"] = "nosniff"
+        if range_header:
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{size}"
+                self.start, self.end = 0, -1
+            else:
+                self.start, self.end = byte_range
+                self.status_code = 206
+                self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+        self.headers["content-length"] = str(self.end - self.start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        length = self.end - self.start + 1
+        if scope["method"] == "HEAD" or length <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        async with await anyio.open_file(self.path, "rb") as file:
+            if zerocopy:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": self.start,
+                    "count": length,
+                })
+                return
+            await file.seek(self.start)
+            remaining = length
+            while remaining > 0:
+                chunk = await file.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # The file shrank while sending, end the response
+            await send({"type": "http.response.body", "body": b""})
+
 
 @router.post("/upload", response_model=FileUpload)
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a file (simulated - no actual file storage)"""
-    if not file.filename:
+async def upload_file(request: Request):
+    """Upload a file as multipart form field `file`, streamed to disk"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > file_service.max_size + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"File exceeds the maximum size of {file_service.max_size} bytes")
+
+    try:
+        upload = MultipartFileStream(request, "file")
+        await upload.start()
+    except UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not upload.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
-    
-    # Read file size (but don't store the actual content)
-    content = await file.read()
-    file_size = len(content)
-    
-    # Simulate file upload
-    uploaded_file = file_service.upload_file(
-        filename=file.filename,
-        size=file_size,
-        content_type=file.content_type or "application/octet-stream"
-    )
-    
-    return uploaded_file
+
+    try:
+        return await file_service.save_upload(
+            upload.chunks(),
+            filename=os.path.basename(upload.filename),
+            content_type=upload.content_type,
+            user=get_session_id(request)
+        )
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{file_id}", response_model=FileUpload)
-async def get_file(file_id: str):
+async def get_file(file_id: str, request: Request):
     """Get file information by ID"""
-    file = file_service.get_file(file_id)
+    file = file_service.get_file(file_id, get_session_id(request))
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     return file
 
 
+@router.get("/{file_id}/content")
+async def download_file(file_id: str, request: Request):
+    """Download file content, supports Range requests"""
+    file = file_service.get_file(file_id, get_session_id(request))
+    path = file_service.blob_path(file.sha256) if file else None
+    if not file or not path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    return RangeFileResponse(path, file.content_type, file.filename, request.headers.get("range"))
+
+
 @router.delete("/{file_id}")
-async def delete_file(file_id: str):
+async def delete_file(file_id: str, request: Request):
     """Delete a file"""
-    success = file_service.delete_file(file_id)
+    success = file_service.delete_file(file_id, get_session_id(request))
     if not success:
         raise HTTPException(status_code=404, detail="File not found")
     return {"message": "File deleted successfully"}
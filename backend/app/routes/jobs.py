@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from typing import Optional
+import asyncio
+from app.models.chat import JobStatus, MessageRequest
+from app.routes.chat import check_attachments
+from app.services.jobs import IdempotencyKeyReused, job_manager
+from app.services.message_service import message_service
+from app.middleware.session import get_session_id
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"], dependencies=[Depends(message_service.wait_until_loaded)])
+
+# Longest a status request may wait for completion, below common load balancer idle timeouts
+MAX_WAIT_SECONDS = 30
+
+
+def job_response(status: JobStatus, status_code: int = 200) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content=status.model_dump(mode="json", by_alias=True),
+        headers={"Location": f"/api/jobs/{status.id}"}
+    )
+
+
+@router.post("", status_code=202, response_model=JobStatus)
+async def create_job(
+    message_data: MessageRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=200)
+):
+    """Queue a message and return its job right away.
+
+    Retrying with the same Idempotency-Key returns the existing job instead
+    of generating the response again.
+    """
+    session_id = get_session_id(request)
+    check_attachments(message_data, session_id)
+    try:
+        job, created = job_manager.submit(message_data, session_id, idempotency_key)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job_response(job.to_status(), 202 if created or not job.finished else 200)
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, request: Request, wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS)):
+    """Get a job, with `wait` seconds to long-poll until it has finished"""
+    job = job_manager.get(job_id, get_session_id(request))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    await job_manager.wait(job, wait)
+    return job_response(job.to_status())
+
+
+@router.websocket("/{job_id}/ws")
+async def watch_job(websocket: WebSocket, job_id: str):
+    """Send the job status now and again once it has finished, then close"""
+    job = job_manager.get(job_id, websocket.state.session_id)
+    if not job:
+        await websocket.close(code=4404, reason="Job not found")
+        return
+    await websocket.accept()
+    await websocket.send_json(job.to_status().model_dump(mode="json", by_alias=True))
+    if not job.finished:
+        finished = asyncio.create_task(job.done.wait())
+        disconnected = asyncio.create_task(websocket.receive())
+        done, pending = await asyncio.wait((finished, disconnected), return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if finished not in done:
+            return
+        try:
+            await websocket.send_json(job.to_status().model_dump(mode="json", by_alias=True))
+        except WebSocketDisconnect:
+            return
+    await websocket.close()
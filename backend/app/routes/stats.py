@@ -0,0 +1,53 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.file_service import file_service
+from app.services.jobs import job_manager
+from app.services.message_service import message_service
+from app.services.metrics import metrics, sample_lines
+
+router = APIRouter(prefix="/api", tags=["stats"])
+
+
+@router.get("/stats")
+async def get_stats():
+    """Runtime counters for tuning caches and limits"""
+    return {
+        "responseCache": message_service.response_cache.stats(),
+        "context": message_service.context_builder.stats(),
+        "admission": message_service.admission.stats(),
+        "upstream": message_service.upstream.stats(),
+        "routing": message_service.upstream.router.stats(),
+        "serializer": message_service.serializer.stats(),
+        "files": file_service.stats(),
+        "attachments": message_service.attachments.stats(),
+        "structuredOutput": message_service.structured_output.stats(),
+        "jobs": job_manager.stats(),
+        "realtime": message_service.events.stats(),
+        "planIndex": {
+            **message_service.plan_index.stats(),
+            "reuseMode": message_service.plan_reuse,
+            "served": message_service.plans_served,
+            "seeded": message_service.plans_seeded
+        }
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage latencies, token usage and runtime counters in the Prometheus text format"""
+    cache = message_service.response_cache.stats()
+    admission = message_service.admission.stats()
+    upstream = message_service.upstream.stats()
+    extra = (
+        sample_lines("weekend_ship_response_cache_hits_total", "Plan cache hits", cache["hits"], "counter")
+        + sample_lines("weekend_ship_response_cache_misses_total", "Plan cache misses", cache["misses"], "counter")
+        + sample_lines("weekend_ship_response_cache_coalesced_total", "Requests that joined an in-flight generation", cache["coalesced"], "counter")
+        + sample_lines("weekend_ship_response_cache_entries", "Cached plans", cache["size"])
+        + sample_lines("weekend_ship_admission_active", "Upstream calls in progress", admission["active"])
+        + sample_lines("weekend_ship_admission_queue_depth", "Requests waiting for an upstream slot", admission["queueDepth"])
+        + sample_lines("weekend_ship_admission_rejected_total", "Requests rejected with 429", admission["rejectedQueueFull"] + admission["rejectedTimeout"], "counter")
+        + sample_lines("weekend_ship_upstream_retries_total", "Retried upstream attempts", upstream["retries"], "counter")
+        + sample_lines("weekend_ship_upstream_hedges_total", "Hedged upstream attempts", upstream["hedges"], "counter")
+        + sample_lines("weekend_ship_upstream_deadline_exceeded_total", "Upstream calls over their deadline", upstream["deadlineExceeded"], "counter")
+    )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,206 @@
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import Field, TypeAdapter, ValidationError
+from typing import Annotated, List, Literal, Optional, Union
+import asyncio
+import json
+import os
+from app.models.chat import CamelCaseModel, MessageRequest
+from app.routes.chat import MAX_PAGE_SIZE, TaskUpdate, check_attachments
+from app.services.admission import AdmissionRejected
+from app.services.message_service import message_service
+from app.services.realtime import Connection, event_origin
+from app.storage import PlanVersionConflict
+
+router = APIRouter(prefix="/api", tags=["websocket"], dependencies=[Depends(message_service.wait_until_loaded)])
+
+# Browser origins allowed to open the socket; clients without an Origin header rely on the cookie alone
+ALLOWED_ORIGINS = set(os.getenv("WS_ALLOWED_ORIGINS", "http://localhost:5173").split(","))
+# Requests of one connection processed at the same time, further messages wait to be read
+MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "8"))
+
+
+class ChatSend(CamelCaseModel):
+    """Send a message, the response is streamed as chat.event frames followed by a result"""
+    type: Literal["chat.send"]
+    id: str
+    message: MessageRequest
+
+
+class TasksUpdate(CamelCaseModel):
+    """Update several tasks of a plan, like the batch PATCH"""
+    type: Literal["tasks.update"]
+    id: str
+    conversation_id: str
+    version: Optional[int] = None
+    updates: List[TaskUpdate] = Field(..., min_length=1, max_length=500)
+
+
+class HistorySync(CamelCaseModel):
+    """Get the history, or only the conversations after `since`"""
+    type: Literal["history.sync"]
+    id: str
+    since: Optional[str] = None
+    limit: Optional[int] = Field(None, ge=1, le=MAX_PAGE_SIZE)
+    view: Literal["full", "summary"] = "full"
+
+
+class ClearConversations(CamelCaseModel):
+    type: Literal["conversations.clear"]
+    id: str
+
+
+class Ping(CamelCaseModel):
+    type: Literal["ping"]
+    id: str
+
+
+client_message = TypeAdapter(Annotated[
+    Union[ChatSend, TasksUpdate, HistorySync, ClearConversations, Ping],
+    Field(discriminator="type")
+])
+
+
+def result_frame(request_id: str, data: str = "{}") -> str:
+    """Reply to a request, `data` is serialized JSON"""
+    return '{"type":"result","id":' + json.dumps(request_id) + ',"data":' + data + '}'
+
+
+def error_frame(request_id: Optional[str], status: int, detail, retry_after: Optional[int] = None) -> str:
+    frame = {"type": "error", "id": request_id, "status": status, "detail": detail}
+    if retry_after is not None:
+        frame["retryAfter"] = retry_after
+    return json.dumps(frame)
+
+
+async def chat_send(connection: Connection, session_id: str, request: ChatSend):
+    check_attachments(request.message, session_id)
+    prefix = '{"type":"chat.event","id":' + json.dumps(request.id) + ',"event":'
+    async for event in message_service.stream_user_message(request.message, user=session_id):
+        await connection.queue.put(prefix + json.dumps(event) + '}')
+    await connection.queue.put(result_frame(request.id))
+
+
+async def tasks_update(connection: Connection, session_id: str, request: TasksUpdate):
+    try:
+        version = await message_service.update_tasks(
+            conversation_id=request.conversation_id,
+            user=session_id,
+            updates=[(u.time_block_index, u.task_index, u.completed) for u in request.updates],
+            expected_version=request.version
+        )
+    except PlanVersionConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Plan was modified", "currentVersion": e.current_version}
+        )
+    if version is None:
+        raise HTTPException(status_code=404, detail="Conversation or task not found")
+    await connection.queue.put(result_frame(request.id, json.dumps({"version": version})))
+
+
+async def history_sync(connection: Connection, session_id: str, request: HistorySync):
+    if request.since is None and request.limit is None:
+        conversations, has_more = await message_service.get_conversations(user=session_id), False
+    else:
+        page = await message_service.get_conversation_page(
+            session_id, request.limit or MAX_PAGE_SIZE, since=request.since
+        )
+        if page is None:
+            raise HTTPException(status_code=400, detail="Unknown cursor")
+        conversations, has_more = page
+    data = message_service.serializer.dumps_list(conversations, request.view).decode("utf-8")
+    await connection.queue.put(result_frame(
+        request.id, '{"conversations":' + data + ',"hasMore":' + json.dumps(has_more) + '}'
+    ))
+
+
+async def handle(connection: Connection, session_id: str, request):
+    """Run one client request and reply with its result or an error frame"""
+    try:
+        if isinstance(request, ChatSend):
+            await chat_send(connection, session_id, request)
+        elif isinstance(request, TasksUpdate):
+            await tasks_update(connection, session_id, request)
+        elif isinstance(request, HistorySync):
+            await history_sync(connection, session_id, request)
+        elif isinstance(request, ClearConversations):
+            await message_service.clear_user_conversations(user=session_id)
+            await connection.queue.put(result_frame(request.id))
+        else:
+            await connection.queue.put('{"type":"pong","id":' + json.dumps(request.id) + '}')
+    except HTTPException as e:
+        await connection.queue.put(error_frame(request.id, e.status_code, e.detail))
+    except AdmissionRejected as e:
+        await connection.queue.put(error_frame(request.id, 429, e.reason, e.retry_after))
+    except Exception as e:
+        print(f"WebSocket request {request.type} failed: {e}")
+        await connection.queue.put(error_frame(request.id, 500, "Internal server error"))
+
+
+async def write_frames(websocket: WebSocket, connection: Connection):
+    """Send queued frames in order; close the socket if the client fell behind"""
+    try:
+        while True:
+            frame = await connection.queue.get()
+            if connection.overflowed:
+                # Pushed events were lost, the client resyncs its history after reconnecting
+                await websocket.close(code=1013, reason="Client too slow")
+                return
+            await websocket.send_text(frame)
+    except (WebSocketDisconnect, RuntimeError):
+        # The client is gone, the receive loop ends the connection
+        pass
+
+
+@router.websocket("/ws")
+async def session_socket(websocket: WebSocket):
+    """One connection for chat, task updates and history sync of a session.
+
+    The session cookie is checked once on connect. Client messages carry a
+    `type` and an `id` that is echoed in the replies, so requests can run
+    concurrently. Changes made from other connections or HTTP requests of
+    the same session are pushed as they happen.
+    """
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in ALLOWED_ORIGINS:
+        await websocket.close(code=4403, reason="Origin not allowed")
+        return
+    if websocket.state.new_session:
+        # A new session would not be the one of the page, and the cookie cannot be set from here
+        await websocket.close(code=4401, reason="No session")
+        return
+
+    await websocket.accept()
+    session_id = websocket.state.session_id
+    connection = message_service.events.connect(session_id)
+    # Requests of this connection do not echo their own changes back to it
+    event_origin.set(connection)
+    writer = asyncio.create_task(write_frames(websocket, connection))
+    slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+    tasks = set()
+
+    def finished(task: asyncio.Task):
+        tasks.discard(task)
+        slots.release()
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                request = client_message.validate_json(message.get("text") or message.get("bytes") or b"")
+            except ValidationError as e:
+                await connection.queue.put(error_frame(None, 400, e.errors(include_url=False, include_context=False, include_input=False)))
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(handle(connection, session_id, request))
+            tasks.add(task)
+            task.add_done_callback(finished)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        message_service.events.disconnect(connection)
+        writer.cancel()
+        for task in list(tasks):
+            task.cancel()
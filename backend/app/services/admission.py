@@ -0,0 +1,138 @@
+"""Admission control for upstream LLM calls"""
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+
+# Lower value is admitted first: follow-up chat is short and interactive,
+# detailed plans are the most expensive requests
+PRIORITIES: Dict[str, int] = {
+    "conversation": 0,
+    "basic": 1,
+    "detailed": 2,
+}
+
+
+class AdmissionRejected(Exception):
+    """The request could not be admitted, the client should retry later"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bound the number of concurrent upstream calls.
+
+    At most `max_concurrency` calls run at once. Further requests wait in a
+    priority queue of at most `max_queue` entries for up to `queue_timeout`
+    seconds; requests beyond that are rejected immediately so the client can
+    back off instead of timing out slowly.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64, queue_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        # (priority, sequence, future), the sequence keeps FIFO order within a priority
+        self._waiters: List[tuple[int, int, asyncio.Future]] = []
+        self._waiting = 0
+        self._sequence = itertools.count()
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._avg_hold_seconds = 1.0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, request_class: str = "basic") -> AsyncIterator[None]:
+        """Hold a concurrency slot for the duration of the block"""
+        await self.acquire(request_class)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_hold_seconds += 0.1 * (time.monotonic() - started - self._avg_hold_seconds)
+            self.release()
+
+    async def acquire(self, request_class: str = "basic"):
+        """Wait for a concurrency slot, raise AdmissionRejected if none frees up in time"""
+        if self._active < self.max_concurrency and not self._waiting:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if self._waiting >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected("Too many requests in progress", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES.get(request_class, 1), next(self._sequence), future))
+        self._waiting += 1
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._waiting)
+        started = time.monotonic()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over while we gave up, pass it on
+                self.release()
+            else:
+                future.cancel()
+                self._waiting -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected_timeout += 1
+                raise AdmissionRejected("Timed out waiting for capacity", self.retry_after()) from None
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.admitted += 1
+
+    def release(self):
+        """Free a slot, handing it directly to the highest-priority waiter"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot stays taken, it now belongs to the waiter
+                self._waiting -= 1
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the queue is likely to have drained"""
+        backlog = (self._waiting + 1) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(backlog * self._avg_hold_seconds))
+
+    def stats(self) -> dict:
+        """Queue depth and wait time counters for tuning the limits"""
+        return {
+            "active": self._active,
+            "queueDepth": self._waiting,
+            "maxConcurrency": self.max_concurrency,
+            "maxQueue": self.max_queue,
+            "queueTimeoutSeconds": self.queue_timeout,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejectedQueueFull": self.rejected_full,
+            "rejectedTimeout": self.rejected_timeout,
+            "maxQueueDepth": self.max_queue_depth,
+            "avgWaitMs": round(self.total_wait_seconds / self.queued * 1000, 2) if self.queued else 0.0,
+            "maxWaitMs": round(self.max_wait_seconds * 1000, 2),
+            "avgHoldMs": round(self._avg_hold_seconds * 1000, 2)
+        }
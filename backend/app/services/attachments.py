@@ -0,0 +1,230 @@
+"""Text extraction from uploaded files in a process pool"""
+from app.models.chat import FileType, FileUpload
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+from xml.etree import ElementTree
+import asyncio
+import re
+import zipfile
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+# Characters of raw text a worker collects before it stops parsing
+EXTRACT_MAX_CHARS = 200_000
+# Pages of a PDF a worker reads at most
+EXTRACT_MAX_PAGES = 50
+
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _extract_pdf(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return ""
+    parts: List[str] = []
+    length = 0
+    for page in PdfReader(path).pages[:EXTRACT_MAX_PAGES]:
+        text = page.extract_text() or ""
+        parts.append(text)
+        length += len(text)
+        if length >= EXTRACT_MAX_CHARS:
+            break
+    return "\n".join(parts)
+
+
+def _extract_docx(path: str) -> str:
+    paragraphs: List[str] = []
+    length = 0
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        # Paragraphs are streamed so large documents are never fully parsed
+        for _, element in ElementTree.iterparse(document):
+            if element.tag != f"{_WORD_NAMESPACE}p":
+                continue
+            text = "".join(node.text or "" for node in element.iter(f"{_WORD_NAMESPACE}t"))
+            element.clear()
+            if text:
+                paragraphs.append(text)
+                length += len(text)
+                if length >= EXTRACT_MAX_CHARS:
+                    break
+    return "\n".join(paragraphs)
+
+
+def _extract_plain(path: str) -> str:
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        return file.read(EXTRACT_MAX_CHARS)
+
+
+def extract_text(path: str, file_type: str, content_type: str, filename: str) -> str:
+    """Raw text of a file, empty if the format is not supported. Runs in a worker process."""
+    if file_type == FileType.PDF.value:
+        return _extract_pdf(path)
+    if file_type == FileType.WORD.value:
+        # Legacy binary .doc files are not supported
+        return _extract_docx(path) if zipfile.is_zipfile(path) else ""
+    if content_type.startswith("text/") or filename.lower().endswith((".txt", ".md", ".csv", ".json")):
+        return _extract_plain(path)
+    # Images would need OCR, only their name is passed to the model
+    return ""
+
+
+def condense(text: str, max_chars: int) -> str:
+    """Collapse whitespace and cut the text to `max_chars`, keeping its start and end"""
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r"\s*\n\s*", "\n", text).strip()
+    if len(text) <= max_chars:
+        return text
+    marker = "\n[...]\n"
+    # Specs usually lead with the essentials, so the start gets most of the space
+    head = text[:max_chars * 3 // 4].rsplit(" ", 1)[0]
+    tail = text[-(max_chars - len(head) - len(marker)):].split(" ", 1)[-1]
+    return head + marker + tail
+
+
+class AttachmentExtractor:
+    """Extract size-bounded text excerpts from uploaded files.
+
+    Parsers run in a process pool so PDF and DOCX parsing never blocks the
+    event loop. Excerpts are cached by content hash and concurrent requests
+    for the same content share one extraction. At most `max_pending`
+    extractions are queued or running; beyond that, and after `timeout`
+    seconds, the attachment is passed without an excerpt instead of
+    delaying the chat request. An extraction still running after
+    `worker_timeout` seconds is given up on and the pool is replaced, so a
+    hung file cannot keep a worker busy forever.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_pending: int = 8,
+        timeout: float = 5.0,
+        excerpt_chars: int = 4000,
+        max_cached: int = 256,
+        worker_timeout: float = 30.0
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.worker_timeout = worker_timeout
+        self.excerpt_chars = excerpt_chars
+        self.max_cached = max_cached
+        self._executor: Optional["ProcessPoolExecutor"] = None
+        self._pending = 0
+        # sha256 -> excerpt
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.recycles = 0
+
+    def _pool(self) -> "ProcessPoolExecutor":
+        if self._executor is None:
+            # Imported here, most processes never extract an attachment
+            from concurrent.futures import ProcessPoolExecutor
+            import multiprocessing
+            # Forking a process with a running event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def excerpt(self, file: FileUpload, path: Path) -> Optional[str]:
+        """Excerpt of a file's text, None if it has no text or could not be extracted in time"""
+        cached = self._cache.get(file.sha256)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(file.sha256)
+            return cached or None
+
+        future = self._inflight.get(file.sha256)
+        if future is None:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return None
+            self.misses += 1
+            # Counted before the task starts, so a burst of misses in one tick cannot pass the cap
+            self._pending += 1
+            future = asyncio.ensure_future(self._extract(file, path))
+            self._inflight[file.sha256] = future
+
+            def done(finished: asyncio.Future):
+                self._pending -= 1
+                self._inflight.pop(file.sha256, None)
+                # Retrieved here, the requests that reported it may have given up already
+                if not finished.cancelled():
+                    finished.exception()
+
+            future.add_done_callback(done)
+
+        try:
+            # Shielded so a timed-out request does not cancel the extraction for others
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout) or None
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return None
+        except Exception as e:
+            self.failures += 1
+            print(f"Failed to extract text from {file.filename}: {e}")
+            return None
+
+    async def _extract(self, file: FileUpload, path: Path) -> str:
+        from concurrent.futures.process import BrokenProcessPool
+        executor = self._pool()
+        try:
+            text = await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(
+                    executor, extract_text, str(path), file.type.value, file.content_type, file.filename
+                ),
+                self.worker_timeout
+            )
+        except asyncio.TimeoutError:
+            # The worker is stuck on this file and cannot be cancelled; replace the pool
+            print(f"Text extraction of {file.filename} overran {self.worker_timeout:.0f}s")
+            self._recycle(executor)
+            raise
+        except BrokenProcessPool:
+            # A worker crashed, e.g. on a malformed file; start a fresh pool next time
+            self._recycle(executor)
+            raise
+        excerpt = condense(text, self.excerpt_chars)
+        self._cache[file.sha256] = excerpt
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return excerpt
+
+    def _recycle(self, executor: "ProcessPoolExecutor"):
+        """Stop a broken or stuck pool, unless it was already replaced"""
+        if executor is not self._executor:
+            return
+        self.recycles += 1
+        # Running tasks are not cancelled by shutdown, stop their processes as well
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        self.shutdown()
+        for process in processes:
+            process.terminate()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "recycles": self.recycles,
+            "cached": len(self._cache)
+        }
@@ -0,0 +1,230 @@
+from app.models.chat import Conversation
+from app.prompts.system_prompts import SystemPrompt
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import json
+import time
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate, about 4 characters per token for English and JSON"""
+    return len(text) // 4 + 1
+
+
+def stable_json(data) -> str:
+    """Compact JSON whose bytes only depend on the data, so repeated prompts share a prefix"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+# Task completion changes often, so it is left out of past turns and sent at the end instead
+_EXCLUDE_COMPLETED = {"timeline": {"__all__": {"tasks": {"__all__": {"completed"}}}}}
+
+
+class ContextBuilder:
+    """Assemble the chat context for a completion, ordered for provider prefix caching.
+
+    Messages are laid out from most to least stable: the versioned system
+    prompt, past exchanges serialized exactly as the model produced them
+    (byte-stable, cached per conversation), then the current plan state
+    and the new message. The oldest exchange of a session's window stays
+    fixed until the token budget forces it forward, and then it jumps by
+    half the budget, so consecutive requests keep sharing their prefix.
+    """
+
+    def __init__(self, token_budget: int = 8000, max_cached: int = 4096):
+        self.token_budget = token_budget
+        self.max_cached = max_cached
+        # conversation_id -> (serialized assistant message, token estimate)
+        self._assistant_cache: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        # conversation_id -> (plan_version, serialized plan with completion, token estimate)
+        self._plan_cache: OrderedDict[str, tuple[int, str, int]] = OrderedDict()
+        # session -> id of the oldest conversation in its context window
+        self._window_starts: OrderedDict[str, str] = OrderedDict()
+        # prompt id -> [requests, prompt tokens, cached prompt tokens]
+        self._usage: Dict[str, List[int]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.window_moves = 0
+        self.builds = 0
+        self.total_build_seconds = 0.0
+        self.last_prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.last_history_exchanges = 0
+
+    def assistant_message(self, conversation: Conversation) -> tuple[str, int]:
+        """Serialized assistant message for a conversation and its token estimate.
+
+        Conversations refined by a patch are serialized with the patch, as the
+        model produced them. Task completion is not included, so the bytes
+        never change once the conversation exists.
+        """
+        cached = self._assistant_cache.get(conversation.id)
+        if cached is not None:
+            self.cache_hits += 1
+            self._assistant_cache.move_to_end(conversation.id)
+            return cached
+
+        self.cache_misses += 1
+        # Build assistant response in unified JSON format
+        if conversation.plan_patch:
+            assistant_json = {
+                "message": conversation.bot_response,
+                "patch": [op.model_dump(by_alias=True, exclude_none=True) for op in conversation.plan_patch]
+            }
+        else:
+            assistant_json = {
+                "message": conversation.bot_response,
+                "projectPlan": conversation.project_plan.model_dump(
+                    by_alias=True, exclude=_EXCLUDE_COMPLETED
+                ) if conversation.project_plan else None
+            }
+        content = stable_json(assistant_json)
+        entry = (content, estimate_tokens(content))
+
+        self._assistant_cache[conversation.id] = entry
+        if len(self._assistant_cache) > self.max_cached:
+            self._assistant_cache.popitem(last=False)
+        return entry
+
+    def plan_state(self, pinned: Conversation, in_history: bool) -> tuple[Optional[str], int]:
+        """Message describing the current plan and its token estimate.
+
+        If the plan appears verbatim in the history, only the completed tasks
+        are listed; otherwise the whole plan is included.
+        """
+        if in_history and not pinned.plan_patch:
+            completed = [
+                [block_index, task_index]
+                for block_index, time_block in enumerate(pinned.project_plan.timeline)
+                for task_index, task in enumerate(time_block.tasks)
+                if task.completed
+            ]
+            if not completed:
+                return None, 0
+            content = f"Completed tasks of the current plan as [blockIndex, taskIndex]: {stable_json(completed)}"
+            return content, estimate_tokens(content)
+
+        cached = self._plan_cache.get(pinned.id)
+        if cached is None or cached[0] != pinned.plan_version:
+            plan = stable_json(pinned.project_plan.model_dump(by_alias=True))
+            content = f'Current project plan, "completed" marks finished tasks: {plan}'
+            cached = (pinned.plan_version, content, estimate_tokens(content))
+            self._plan_cache[pinned.id] = cached
+            if len(self._plan_cache) > self.max_cached:
+                self._plan_cache.popitem(last=False)
+        self._plan_cache.move_to_end(pinned.id)
+        return cached[1], cached[2]
+
+    def _window_start(self, session: Optional[str], costs: List[int], ids: List[str], available: int) -> int:
+        """Index of the oldest exchange to include"""
+        start_id = self._window_starts.get(session) if session else None
+        start = ids.index(start_id) if start_id in ids else None
+        if start is None and start_id is None:
+            # No window yet, try the whole history
+            start = 0
+        if start is not None and sum(costs[start:]) <= available:
+            return start
+
+        # Move the window: keep the newest exchanges within half the budget and
+        # half the history, so the start stays put for the next requests
+        target, max_count = available // 2, max(1, len(ids) // 2)
+        start, total = len(ids), 0
+        while start > 0 and len(ids) - start < max_count and total + costs[start - 1] <= target:
+            start -= 1
+            total += costs[start]
+        return start
+
+    def build(
+        self,
+        system_prompt: SystemPrompt,
+        history: List[Conversation],
+        user_message: str,
+        pinned: Optional[Conversation] = None,
+        session: Optional[str] = None
+    ) -> List[dict]:
+        """Build chat messages: system prompt, history window (oldest first), plan state and the new message.
+
+        `pinned` is the conversation with the current plan; its state is always
+        included, even when it is older than the history window. `session`
+        keeps the window start stable across requests of the same user.
+        """
+        start = time.perf_counter()
+
+        base = estimate_tokens(system_prompt.text) + estimate_tokens(user_message)
+        entries = [self.assistant_message(conversation) for conversation in history]
+        costs = [
+            estimate_tokens(conversation.user_message) + tokens
+            for conversation, (_, tokens) in zip(history, entries)
+        ]
+        ids = [conversation.id for conversation in history]
+
+        state, state_tokens = (None, 0)
+        window = len(history)
+        if pinned is not None:
+            # Assume the plan is in the window, include the whole plan if it is not
+            state, state_tokens = self.plan_state(pinned, in_history=True)
+            window = self._window_start(session, costs, ids, self.token_budget - base - state_tokens)
+            if pinned.id not in ids[window:] or pinned.plan_patch:
+                state, state_tokens = self.plan_state(pinned, in_history=False)
+                window = self._window_start(session, costs, ids, self.token_budget - base - state_tokens)
+        else:
+            window = self._window_start(session, costs, ids, self.token_budget - base)
+
+        if session and window < len(ids):
+            if self._window_starts.get(session, ids[window]) != ids[window]:
+                self.window_moves += 1
+            self._window_starts[session] = ids[window]
+            self._window_starts.move_to_end(session)
+            if len(self._window_starts) > self.max_cached:
+                self._window_starts.popitem(last=False)
+
+        messages = [{"role": "system", "content": system_prompt.text}]
+        for conversation, (content, _) in zip(history[window:], entries[window:]):
+            messages.append({"role": "user", "content": conversation.user_message})
+            messages.append({"role": "assistant", "content": content})
+        if state:
+            messages.append({"role": "system", "content": state})
+        messages.append({"role": "user", "content": user_message})
+
+        used = base + state_tokens + sum(costs[window:])
+        self.builds += 1
+        self.total_build_seconds += time.perf_counter() - start
+        self.last_prompt_tokens = used
+        self.max_prompt_tokens = max(self.max_prompt_tokens, used)
+        self.last_history_exchanges = len(history) - window
+        return messages
+
+    def record_usage(self, prompt_id: str, usage) -> None:
+        """Count prompt and cached prompt tokens reported for a request with the given system prompt"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+        totals = self._usage.setdefault(prompt_id, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += usage.prompt_tokens or 0
+        totals[2] += cached or 0
+
+    def stats(self) -> dict:
+        """Prompt size, build time and prefix cache counters"""
+        return {
+            "tokenBudget": self.token_budget,
+            "builds": self.builds,
+            "avgBuildMs": round(self.total_build_seconds / self.builds * 1000, 3) if self.builds else 0.0,
+            "lastPromptTokens": self.last_prompt_tokens,
+            "maxPromptTokens": self.max_prompt_tokens,
+            "lastHistoryExchanges": self.last_history_exchanges,
+            "windowMoves": self.window_moves,
+            "cachedMessages": len(self._assistant_cache),
+            "cacheHits": self.cache_hits,
+            "cacheMisses": self.cache_misses,
+            "promptCache": {
+                prompt_id: {
+                    "requests": requests,
+                    "promptTokens": prompt_tokens,
+                    "cachedTokens": cached_tokens,
+                    "hitRate": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0
+                }
+                for prompt_id, (requests, prompt_tokens, cached_tokens) in self._usage.items()
+            }
+        }
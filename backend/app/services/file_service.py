@@ -1,74 +1,181 @@
 from app.models.chat import FileUpload, FileType, FileReference
-from typing import Optional
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+import asyncio
+import hashlib
+import json
+import os
 import uuid
 
 
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the size limit"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum size of {max_size} bytes")
+        self.max_size = max_size
+
+
 class FileService:
-    def __init__(self):
-        # In-memory storage (simulated file uploads)
-        self.files: dict[str, FileUpload] = {}
-    
-    def upload_file(self, filename: str, size: int, content_type: str) -> FileUpload:
-        """Simulate file upload (fictitious)"""
+    """Content-addressed file storage on disk.
+
+    Uploads are streamed to a temporary file while being hashed, then moved
+    to `blobs/<sha256[:2]>/<sha256>`, so identical uploads are stored once.
+    Each upload gets its own id and a small metadata file; a blob is removed
+    when the last file referencing it is deleted.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_size: Optional[int] = None):
+        self.root = Path(root or os.getenv("UPLOAD_DIR", "data/uploads"))
+        self.max_size = max_size if max_size is not None else int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+        self._blobs = self.root / "blobs"
+        self._meta = self.root / "files"
+        self._tmp = self.root / "tmp"
+        for directory in (self._blobs, self._meta, self._tmp):
+            directory.mkdir(parents=True, exist_ok=True)
+        # Metadata index: {file_id: (user_id, FileUpload)}
+        self.files: Dict[str, tuple[str, FileUpload]] = {}
+        # Number of files per blob
+        self._refs: Dict[str, int] = {}
+        # Running totals for stats, size of all files and of the distinct blobs
+        self._bytes = 0
+        self._stored_bytes = 0
+        self._load()
+
+    def _load(self):
+        """Rebuild the index from the metadata files"""
+        for path in self._meta.glob("*.json"):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                file = FileUpload.model_validate(data["file"])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping unreadable file metadata {path.name}: {e}")
+                continue
+            self.files[file.id] = (data["user"], file)
+            self._add_ref(file)
+        # Leftovers of interrupted uploads
+        for path in self._tmp.iterdir():
+            path.unlink(missing_ok=True)
+
+    async def save_upload(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        content_type: str,
+        user: str
+    ) -> FileUpload:
+        """Stream an upload to disk, hashing while writing.
+
+        Raises FileTooLargeError as soon as the size limit is exceeded, in
+        which case nothing is stored.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self._tmp / uuid.uuid4().hex
+        handle = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_size:
+                    raise FileTooLargeError(self.max_size)
+                digest.update(chunk)
+                await asyncio.to_thread(handle.write, chunk)
+            await asyncio.to_thread(handle.close)
+        except BaseException:
+            handle.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        sha256 = digest.hexdigest()
+        blob_path = self.blob_path(sha256)
+        if blob_path.exists():
+            # Already stored by an earlier upload
+            tmp_path.unlink()
+        else:
+            blob_path.parent.mkdir(exist_ok=True)
+            os.replace(tmp_path, blob_path)
+
         file_id = str(uuid.uuid4())
-        
-        # Determine file type based on content type or extension
-        file_type = self._determine_file_type(filename, content_type)
-        
-        # Simulate file path
-        file_path = f"/uploads/{file_id}/{filename}"
-        
         file_upload = FileUpload(
             id=file_id,
-            path=file_path,
-            type=file_type,
+            path=f"/api/files/{file_id}/content",
+            type=self._determine_file_type(filename, content_type),
             filename=filename,
-            size=size
+            size=size,
+            content_type=content_type,
+            sha256=sha256
         )
-        
-        self.files[file_id] = file_upload
+        self.files[file_id] = (user, file_upload)
+        self._add_ref(file_upload)
+        metadata = json.dumps({"user": user, "file": file_upload.model_dump(mode="json")})
+        await asyncio.to_thread((self._meta / f"{file_id}.json").write_text, metadata, "utf-8")
         return file_upload
-    
-    def get_file(self, file_id: str) -> Optional[FileUpload]:
-        """Get file information by ID"""
-        return self.files.get(file_id)
-    
-    def get_file_reference(self, file_id: str) -> Optional[FileReference]:
+
+    def _add_ref(self, file: FileUpload):
+        refs = self._refs.get(file.sha256, 0)
+        self._refs[file.sha256] = refs + 1
+        self._bytes += file.size
+        if refs == 0:
+            self._stored_bytes += file.size
+
+    def blob_path(self, sha256: str) -> Path:
+        return self._blobs / sha256[:2] / sha256
+
+    def get_file(self, file_id: str, user: Optional[str] = None) -> Optional[FileUpload]:
+        """Get file information by ID, optionally only if it belongs to the user"""
+        entry = self.files.get(file_id)
+        if not entry or (user is not None and entry[0] != user):
+            return None
+        return entry[1]
+
+    def get_file_reference(self, file_id: str, user: Optional[str] = None) -> Optional[FileReference]:
         """Get file reference for storage in conversation"""
-        file = self.files.get(file_id)
+        file = self.get_file(file_id, user)
         if not file:
             return None
-        
+
         return FileReference(
             id=file.id,
             path=file.path,
             type=file.type,
             filename=file.filename
         )
-    
-    def delete_file(self, file_id: str) -> bool:
-        """Delete a file by ID"""
-        if file_id in self.files:
-            del self.files[file_id]
-            return True
-        return False
-    
+
+    def delete_file(self, file_id: str, user: Optional[str] = None) -> bool:
+        """Delete a file by ID, and its content once no other file uses it"""
+        file = self.get_file(file_id, user)
+        if not file:
+            return False
+        del self.files[file_id]
+        (self._meta / f"{file_id}.json").unlink(missing_ok=True)
+        self._refs[file.sha256] -= 1
+        self._bytes -= file.size
+        if self._refs[file.sha256] <= 0:
+            del self._refs[file.sha256]
+            self._stored_bytes -= file.size
+            self.blob_path(file.sha256).unlink(missing_ok=True)
+        return True
+
+    def stats(self) -> dict:
+        """Files and deduplicated storage size"""
+        return {"files": len(self.files), "blobs": len(self._refs), "bytes": self._bytes, "storedBytes": self._stored_bytes}
+
     def _determine_file_type(self, filename: str, content_type: str) -> FileType:
         """Determine file type from filename or content type"""
         filename_lower = filename.lower()
-        
+
         # Check image types
         if content_type.startswith('image/') or filename_lower.endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg')):
             return FileType.IMAGE
-        
+
         # Check PDF
         if 'pdf' in content_type or filename_lower.endswith('.pdf'):
             return FileType.PDF
-        
+
         # Check Word documents
         if 'word' in content_type or filename_lower.endswith(('.doc', '.docx')):
             return FileType.WORD
-        
+
         return FileType.OTHER
 
 
@@ -0,0 +1,204 @@
+"""Asynchronous plan generation jobs with idempotency keys"""
+from app.models.chat import Conversation, JobStatus, MessageRequest
+from app.services.admission import AdmissionRejected
+from app.services.message_service import message_service
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+
+
+class IdempotencyKeyReused(Exception):
+    """An idempotency key was sent again with a different request body"""
+
+
+class Job:
+    """A queued or finished message request"""
+    __slots__ = (
+        "id", "user", "key", "fingerprint", "request", "status", "conversation",
+        "error", "created_at", "finished_at", "done"
+    )
+
+    def __init__(self, user: str, request: MessageRequest, key: Optional[str], fingerprint: str):
+        self.id = str(uuid.uuid4())
+        self.user = user
+        self.key = key
+        self.fingerprint = fingerprint
+        self.request = request
+        self.status = "queued"
+        self.conversation: Optional[Conversation] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_status(self) -> JobStatus:
+        return JobStatus(
+            id=self.id,
+            status=self.status,
+            conversation_id=self.conversation.id if self.conversation else None,
+            conversation=self.conversation.model_dump() if self.conversation else None,
+            error=self.error,
+            created_at=self.created_at,
+            finished_at=self.finished_at
+        )
+
+
+class JobManager:
+    """Run message requests in a bounded worker pool, detached from the HTTP request.
+
+    Jobs are queued up to `max_queue` and processed by `max_workers` workers;
+    the result is stored as a normal conversation. A job submitted again
+    with the same idempotency key by the same user returns the existing
+    job. Finished jobs are kept for `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[MessageRequest, str], Awaitable[Conversation]],
+        max_workers: int = 4,
+        max_queue: int = 100,
+        ttl: float = 3600,
+        max_admission_retries: int = 5
+    ):
+        self.run = run
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self.max_admission_retries = max_admission_retries
+        self._jobs: Dict[str, Job] = {}
+        # (expires_at, job id) of finished jobs, in finishing order
+        self._expiry: deque[tuple[float, str]] = deque()
+        # (user, idempotency key) -> job id
+        self._keys: Dict[tuple[str, str], str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.submitted = 0
+        self.deduplicated = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def submit(self, message_data: MessageRequest, user: str, idempotency_key: Optional[str] = None) -> tuple[Job, bool]:
+        """Queue a job, or return the existing job for the idempotency key. Returns (job, created).
+
+        Raises IdempotencyKeyReused if the key was used for a different request
+        and AdmissionRejected if the queue is full.
+        """
+        self._expire()
+        fingerprint = hashlib.sha256(message_data.model_dump_json().encode("utf-8")).hexdigest()
+        if idempotency_key:
+            job_id = self._keys.get((user, idempotency_key))
+            if job_id is not None:
+                job = self._jobs[job_id]
+                if job.fingerprint != fingerprint:
+                    raise IdempotencyKeyReused("Idempotency key was already used for a different request")
+                self.deduplicated += 1
+                return job, False
+
+        self._start_workers()
+        job = Job(user, message_data, idempotency_key, fingerprint)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise AdmissionRejected("Too many queued jobs", retry_after=5)
+        self._jobs[job.id] = job
+        if idempotency_key:
+            self._keys[(user, idempotency_key)] = job.id
+        self.submitted += 1
+        return job, True
+
+    def get(self, job_id: str, user: str) -> Optional[Job]:
+        """A job of the user by id"""
+        # Also expired here, a server that is only polled would otherwise keep finished jobs
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is None or job.user != user:
+            return None
+        return job
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        """Wait up to `timeout` seconds for the job to finish"""
+        if not job.finished and timeout > 0:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def _start_workers(self):
+        if self._queue is None:
+            # Created lazily, inside the running event loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            try:
+                job.conversation = await self._run(job)
+                job.status = "succeeded"
+                self.succeeded += 1
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                self.failed += 1
+            finally:
+                job.finished_at = datetime.now()
+                self._expiry.append((time.monotonic() + self.ttl, job.id))
+                job.done.set()
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> Conversation:
+        # Nobody is waiting on the HTTP side, so wait for upstream capacity instead of failing
+        for attempt in range(self.max_admission_retries + 1):
+            try:
+                return await self.run(job.request, job.user)
+            except AdmissionRejected as e:
+                if attempt == self.max_admission_retries:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    def _expire(self):
+        """Drop finished jobs past their retention"""
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] <= now:
+            job = self._jobs.pop(self._expiry.popleft()[1])
+            if job.key:
+                self._keys.pop((job.user, job.key), None)
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "maxQueue": self.max_queue,
+            "jobs": len(self._jobs),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "succeeded": self.succeeded,
+            "failed": self.failed
+        }
+
+
+# Singleton instance
+job_manager = JobManager(
+    message_service.process_user_message,
+    max_workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queue=int(os.getenv("JOB_MAX_QUEUE", "100")),
+    ttl=float(os.getenv("JOB_TTL_SECONDS", "3600"))
+)
@@ -0,0 +1,139 @@
+"""Single-pass JSON object extraction from model output"""
+from typing import Optional
+import json
+import re
+
+
+# Tokens that matter inside a JSON object: a whole string literal (closing
+# quote optional when it is not received yet) or a brace. A backtick outside
+# a string can never be valid JSON, so it marks a false start such as a brace
+# in prose before a ```json fence.
+_OBJECT_TOKEN = re.compile(r'"[^"\\]*(?:\\[\s\S][^"\\]*)*(")?|[{}`]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JsonExtractor:
+    """Find the first complete, valid JSON object in model output.
+
+    Makes a single linear pass over the content and skips braces inside
+    string literals. Content can be fed in chunks as it is streamed; the
+    parsed object is available in `result` as soon as it is complete.
+    Surrounding prose and markdown fences are ignored.
+    """
+
+    def __init__(self):
+        self.result: Optional[dict] = None
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+
+    @property
+    def done(self) -> bool:
+        """True once a complete JSON object has been found"""
+        return self.result is not None
+
+    def feed(self, chunk: str) -> Optional[dict]:
+        """Consume a chunk of content and return the object once it is complete"""
+        if self.result is not None or not chunk:
+            return self.result
+
+        self._buffer += chunk
+        buffer = self._buffer
+        pos = self._pos
+
+        while pos < len(buffer):
+            if self._depth == 0:
+                # Outside any object: jump to the next opening brace
+                start = buffer.find('{', pos)
+                if start == -1:
+                    # Nothing useful yet, drop the scanned prose
+                    self._buffer = buffer = ''
+                    pos = 0
+                    break
+                # Keep only the candidate object in the buffer
+                self._buffer = buffer = buffer[start:]
+                self._depth = 1
+                pos = 1
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if not match:
+                    pos = len(buffer)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buffer):
+                        # Escape split across chunks, wait for more input
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+
+            pos = self._scan_object(buffer, pos)
+            if self.result is not None:
+                self._buffer = ''
+                self._pos = 0
+                return self.result
+
+        self._pos = pos
+        return None
+
+    def _scan_object(self, buffer: str, pos: int) -> int:
+        """Scan tokens inside the candidate object and return where scanning stopped"""
+        depth = self._depth
+        for match in _OBJECT_TOKEN.finditer(buffer, pos):
+            char = buffer[match.start()]
+            if char == '"':
+                # Strings are skipped whole; an unterminated one continues in the next chunk
+                if match.group(1) is None:
+                    self._in_string = True
+                    self._depth = depth
+                    return match.end()
+            elif char == '{':
+                depth += 1
+            elif char == '`':
+                # Not JSON, restart the search after the false start
+                self._depth = 0
+                return match.end()
+            else:
+                depth -= 1
+                if depth == 0:
+                    self._depth = 0
+                    self.result = _loads_object(buffer[:match.end()])
+                    return match.end()
+        self._depth = depth
+        return len(buffer)
+
+
+def extract_json(content: str) -> Optional[dict]:
+    """Extract the first complete JSON object from content, or None"""
+    if not content:
+        return None
+
+    # Fast path: usually the span between the outermost braces is the object.
+    # If it parses it is exactly what the scanner would find, without the scan.
+    start = content.find('{')
+    end = content.rfind('}')
+    if start != -1 and end > start:
+        data = _loads_object(content[start:end + 1])
+        if data is not None:
+            return data
+
+    extractor = JsonExtractor()
+    return extractor.feed(content)
+
+
+def _loads_object(candidate: str) -> Optional[dict]:
+    """Parse a balanced candidate, tolerating raw control characters in strings.
+
+    Empty objects are rejected since they are usually braces quoted in prose.
+    """
+    try:
+        data = json.loads(candidate, strict=False)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) and data else None
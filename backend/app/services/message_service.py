@@ -1,198 +1,711 @@
-from app.models.chat import Conversation, MessageRequest, ProjectPlan
-from app.prompts.system_prompts import WEEKEND_PLANNER_BASIC_PROMPT, WEEKEND_PLANNER_DETAILED_PROMPT, CONVERSATION_PROMPT
+from app.models.chat import (
+    Conversation, FileReference, MessageRequest, PlanPatchOperation, PlanSearchResult, ProjectPlan
+)
+from app.services.admission import AdmissionController, AdmissionRejected
+from app.prompts.system_prompts import SYSTEM_PROMPTS, SystemPrompt
+from app.services.attachments import AttachmentExtractor
+from app.services.context_builder import ContextBuilder
+from app.services.file_service import file_service
+from app.services.json_extractor import JsonExtractor, extract_json
+from app.services.metrics import RequestTimer, metrics
+from app.services.plan_index import PlanIndex
+from app.services.plan_patch import apply_plan_patch
+from app.services.plan_stream import PlanStreamParser
+from app.services.realtime import SessionHub
+from app.services.response_cache import ResponseCache, SharedStream
+from app.services.serialization import ConversationSerializer
+from app.services.structured_output import StructuredOutput
+from app.services.upstream import UpstreamClient
+from app.storage import ConversationStore, TaskUpdate, create_conversation_store
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import AsyncIterator, List, Optional
+import asyncio
+import hashlib
 import uuid
 import os
 import json
-from openai import AsyncOpenAI
+import time
+
+
+# Upper bound of past exchanges considered for the context, the token budget decides the rest
+CONTEXT_MAX_HISTORY = 20
+# Conversations serialized per export chunk before other requests get a turn
+EXPORT_CHUNK_SIZE = 100
+# Stored plans indexed at startup before other requests get a turn
+PLAN_INDEX_CHUNK_SIZE = 200
+# Task completion fields of a plan, dropped when reusing a plan of another session
+_TASK_COMPLETION = {"timeline": {"__all__": {"tasks": {"__all__": {"completed"}}}}}
+PLAN_REUSE_MODES = ("off", "serve", "seed")
 
 
 class MessageService:
-    def __init__(self):
-        # In-memory storage (can be replaced with DB)
-        # Dict indexed by user_id: {user_id: [Conversation, ...]}
-        self.conversations: Dict[str, List[Conversation]] = {}
-        # Initialize OpenAI client
-        open_api_key = os.getenv("OPENAI_API_KEY")
-        print(f"OpenAI API Key: {open_api_key}")
-        self.openai_client = AsyncOpenAI(api_key=open_api_key)
-    
-    def _extract_json_string(self, content: str) -> Optional[str]:
-        """Extract JSON string from content that may be wrapped in markdown code blocks"""
-        if not content:
-            return None
-        
-        # Try different patterns in order of specificity
-        
-        # 1. Look for ```json ... ``` pattern
-        if '```json' in content:
-            json_start = content.find('```json') + 7
-            json_end = content.find('```', json_start)
-            if json_end != -1:
-                return content[json_start:json_end].strip()
-        
-        # 2. Look for ``` ... ``` (generic code block)
-        if '```' in content:
-            first_triple = content.find('```')
-            # Skip the opening ``` and any language identifier
-            json_start = content.find('\n', first_triple) + 1
-            json_end = content.find('```', json_start)
-            if json_end != -1:
-                potential_json = content[json_start:json_end].strip()
-                # Verify it starts with { and ends with }
-                if potential_json.startswith('{') and potential_json.endswith('}'):
-                    return potential_json
-        
-        # 3. Try to find JSON object by matching braces (more robust)
-        # Find first { and matching closing }
-        json_start = content.find('{')
-        if json_start != -1:
-            brace_count = 0
-            json_end = json_start
-            for i in range(json_start, len(content)):
-                if content[i] == '{':
-                    brace_count += 1
-                elif content[i] == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        json_end = i + 1
-                        break
-            
-            if json_end > json_start:
-                return content[json_start:json_end]
-        
-        return None
+    def __init__(self, upstream: Optional[UpstreamClient] = None):
+        # Conversation storage, in-memory or SQLite depending on CONVERSATION_STORE
+        self.store: ConversationStore = create_conversation_store()
+        # OpenAI client with pooled connections, per-mode deadlines, retries, hedging and model routing
+        self.upstream = upstream or UpstreamClient()
+        # Token-budgeted context with cached serialized history
+        self.context_builder = ContextBuilder(
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+        )
+        # Follow-ups refine the latest plan with a compact patch instead of regenerating it
+        self.plan_refinement = os.getenv("PLAN_REFINEMENT_ENABLED", "true").lower() == "true"
+        # Cache for first-message plans, which only depend on mode and message
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+        )
+        # Cached JSON bytes of conversations for API responses
+        self.serializer = ConversationSerializer(
+            max_entries=int(os.getenv("SERIALIZER_CACHE_MAX_ENTRIES", "4096"))
+        )
+        # Revision counters restart with the process, so ETags include a process epoch
+        self._etag_epoch = uuid.uuid4().hex
+        # Bounded concurrency for upstream calls, excess requests queue by priority or get a 429
+        self.admission = AdmissionController(
+            max_concurrency=int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16")),
+            max_queue=int(os.getenv("UPSTREAM_MAX_QUEUE", "64")),
+            queue_timeout=float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "10"))
+        )
+        # Attachment text extraction in worker processes, cached by content hash
+        self.attachments = AttachmentExtractor(
+            max_workers=int(os.getenv("ATTACHMENT_WORKERS", "2")),
+            max_pending=int(os.getenv("ATTACHMENT_MAX_PENDING", "8")),
+            timeout=float(os.getenv("ATTACHMENT_TIMEOUT_SECONDS", "5")),
+            excerpt_chars=int(os.getenv("ATTACHMENT_EXCERPT_CHARS", "4000")),
+            worker_timeout=float(os.getenv("ATTACHMENT_WORKER_TIMEOUT_SECONDS", "30"))
+        )
+        # Schema-constrained responses parsed straight into models, heuristic extraction as fallback
+        self.structured_output = StructuredOutput(
+            enabled=os.getenv("STRUCTURED_OUTPUT_ENABLED", "false").lower() == "true"
+        )
+        # History changes pushed to the session's open WebSocket connections
+        self.events = SessionHub(max_queue=int(os.getenv("WS_MAX_QUEUE", "256")))
+        # Inverted index over stored plans for search and reuse of similar plans
+        self.plan_index = PlanIndex()
+        # The store is loaded and its plans are indexed in the background after startup, see start()
+        self._loading: Optional[asyncio.Task] = None
+        self._indexing: Optional[asyncio.Task] = None
+        # "serve" answers a first message with a highly similar stored plan, "seed" adapts one instead of generating from scratch
+        self.plan_reuse = os.getenv("PLAN_REUSE_MODE", "off").lower()
+        if self.plan_reuse not in PLAN_REUSE_MODES:
+            raise ValueError(f"Unknown PLAN_REUSE_MODE: {self.plan_reuse}")
+        self.plan_reuse_min_similarity = float(os.getenv("PLAN_REUSE_MIN_SIMILARITY", "0.8"))
+        self.plans_served = 0
+        self.plans_seeded = 0
     
     async def process_user_message(self, message_data: MessageRequest, user: str) -> Conversation:
         """Process user message and generate bot response"""
         
         # Get mode from message_data, default to 'basic' if not present
         mode = getattr(message_data, 'mode', 'basic')
+        timer = self._request_timer(user, mode)
+        
+        try:
+            attachments, attachment_context = await self._attachment_context(message_data.attachments, user, timer)
+            cache_key = self._plan_cache_key(message_data.message, user, mode, attachments)
+            if cache_key:
+                reuse_key = self._system_prompt(user, mode).version_key
+                # Identical first messages share one cached (or in-flight) generation
+                bot_response, plan_json = await self.response_cache.get_or_create(
+                    cache_key,
+                    lambda: self._generate_cacheable_response(message_data.message, user, mode, timer, reuse_key),
+                    cacheable=lambda value: value[1] is not None
+                )
+                with timer.stage("plan_validation"):
+                    project_plan = ProjectPlan.model_validate_json(plan_json) if plan_json else None
+                with timer.stage("storage"):
+                    return self._store_conversation(
+                        user, message_data.message, bot_response, project_plan, reuse_key=reuse_key
+                    )
+            
+            # Generate AI response with conversation context and mode
+            base = self._refinement_base(user)
+            bot_response, project_plan, plan_patch = await self._generate_bot_response(
+                message_data.message, user, mode, base, timer, attachment_context
+            )
+            
+            with timer.stage("storage"):
+                return self._store_conversation(
+                    user, message_data.message, bot_response, project_plan, plan_patch, base, attachments
+                )
+        except AdmissionRejected:
+            timer.outcome = "rejected"
+            raise
+        finally:
+            timer.finish()
+    
+    async def stream_user_message(self, message_data: MessageRequest, user: str) -> AsyncIterator[dict]:
+        """Process user message and yield response events while the model is generating.
+        
+        Yields "message" events with text deltas, a "timeBlock" event for every
+        completed time block of the project plan, a "patch" event when the plan
+        was refined and a final "done" event with the stored conversation.
+        AdmissionRejected is raised before the first event if there is no capacity.
+        """
+        mode = getattr(message_data, 'mode', 'basic')
+        timer = self._request_timer(user, mode)
+        base = self._refinement_base(user)
+        plan_patch = None
+        
+        try:
+            attachments, attachment_context = await self._attachment_context(message_data.attachments, user, timer)
+            cache_key = self._plan_cache_key(message_data.message, user, mode, attachments)
+            if cache_key:
+                reuse_key = self._system_prompt(user, mode).version_key
+                # Identical first messages share one cached or in-flight generation, joiners replay its events
+                cached, shared = self.response_cache.stream(
+                    cache_key,
+                    lambda shared: self._stream_cacheable_response(shared, message_data.message, user, mode, timer, reuse_key),
+                    cacheable=lambda value: value[1] is not None
+                )
+                if shared is not None:
+                    async for event in shared.follow():
+                        yield event
+                    bot_response, plan_json = await shared.value()
+                else:
+                    bot_response, plan_json = cached
+                    for event in self._plan_events(bot_response, plan_json):
+                        yield event
+                with timer.stage("plan_validation"):
+                    project_plan = ProjectPlan.model_validate_json(plan_json) if plan_json else None
+                with timer.stage("storage"):
+                    conversation = self._store_conversation(
+                        user, message_data.message, bot_response, project_plan, reuse_key=reuse_key
+                    )
+                yield {"type": "done", "conversation": conversation.model_dump(mode="json", by_alias=True)}
+                return
+            
+            try:
+                async for event in self._stream_response(message_data.message, user, mode, timer, base, attachment_context):
+                    if event["type"] == "response":
+                        bot_response, project_plan, plan_patch = event["response"]
+                    else:
+                        yield event
+                timer.outcome = "upstream"
+            
+            except AdmissionRejected:
+                raise
+            except Exception as e:
+                bot_response = f"Sorry, an error occurred while processing your request: {str(e)}"
+                project_plan = None
+                timer.outcome = "error"
+                yield {"type": "error", "message": bot_response}
+            
+            with timer.stage("storage"):
+                conversation = self._store_conversation(
+                    user, message_data.message, bot_response, project_plan, plan_patch, base, attachments
+                )
+            yield {"type": "done", "conversation": conversation.model_dump(mode="json", by_alias=True)}
+        except AdmissionRejected:
+            timer.outcome = "rejected"
+            raise
+        finally:
+            timer.finish()
+    
+    async def _stream_response(
+        self,
+        user_message: str,
+        user: str,
+        mode: str,
+        timer: RequestTimer,
+        base: Optional[Conversation] = None,
+        attachment_context: Optional[str] = None,
+        seed: Optional[Conversation] = None
+    ) -> AsyncIterator[dict]:
+        """Stream a response from the model as events.
+        
+        The last event has type "response" and holds the parsed
+        (bot_response, project_plan, plan_patch) instead of being sent to the client.
+        """
+        parser = PlanStreamParser()
+        extractor = JsonExtractor()
+        with timer.stage("prompt"):
+            messages, max_tokens, system_prompt = self._build_messages(
+                user_message, user, mode, attachment_context, seed
+            )
+        
+        request_class = self._request_class(user, mode)
+        waiting = time.perf_counter()
+        # The slot is held until the whole response has been streamed
+        async with self.admission.slot(request_class):
+            started = time.perf_counter()
+            timer.observe("admission", started - waiting)
+            stream = self.upstream.stream(
+                request_class,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                stream_options={"include_usage": True},
+                **self._response_format(system_prompt)
+            )
+            
+            first_token = True
+            extraction_seconds = 0.0
+            async for chunk in stream:
+                if chunk.usage:
+                    timer.record_usage(chunk.usage)
+                    self.context_builder.record_usage(system_prompt.id, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if first_token and delta:
+                    timer.observe("upstream_first_token", time.perf_counter() - started)
+                    first_token = False
+                extraction_started = time.perf_counter()
+                extractor.feed(delta)
+                extraction_seconds += time.perf_counter() - extraction_started
+                for event in parser.feed(delta):
+                    yield event
+            timer.observe("upstream_total", time.perf_counter() - started)
         
-        # Generate AI response with conversation context and mode
-        bot_response, project_plan = await self._generate_bot_response(message_data.message, user, mode)
+        timer.observe("json_extraction", extraction_seconds)
+        bot_response, project_plan, plan_patch = self._parse_response(
+            parser.text, timer, extractor.result, seed or base, system_prompt
+        )
+        if seed is not None:
+            # The adapted seed is a new plan of this session, not a refinement of its history
+            project_plan, plan_patch = self._seeded_plan(seed, project_plan), None
+            for index, time_block in enumerate(project_plan.timeline):
+                yield {"type": "timeBlock", "index": index, "timeBlock": time_block.model_dump(by_alias=True)}
+        if plan_patch:
+            yield {"type": "patch", "operations": [op.model_dump(by_alias=True, exclude_none=True) for op in plan_patch]}
+        yield {"type": "response", "response": (bot_response, project_plan, plan_patch)}
+    
+    async def _stream_cacheable_response(
+        self,
+        shared: SharedStream,
+        user_message: str,
+        user: str,
+        mode: str,
+        timer: RequestTimer,
+        reuse_key: str
+    ) -> tuple[str, Optional[str]]:
+        """Stream a first-message response to every request following `shared`, return it with the plan serialized.
         
+        Like `_generate_cacheable_response`, a similar stored plan may be
+        served or adapted instead. Errors are emitted as an event and
+        returned as the response, so all followers store the same answer.
+        """
+        seed = self._similar_plan(user_message, reuse_key)
+        if seed is not None and self.plan_reuse == "serve":
+            bot_response, plan_json = self._served_plan(seed, timer)
+            for event in self._plan_events(bot_response, plan_json):
+                shared.emit(event)
+            return bot_response, plan_json
+        try:
+            async for event in self._stream_response(user_message, user, mode, timer, seed=seed):
+                if event["type"] == "response":
+                    bot_response, project_plan, _ = event["response"]
+                else:
+                    shared.emit(event)
+            timer.outcome = "upstream"
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            bot_response = f"Sorry, an error occurred while processing your request: {str(e)}"
+            timer.outcome = "error"
+            shared.emit({"type": "error", "message": bot_response})
+            return bot_response, None
+        return bot_response, project_plan.model_dump_json() if project_plan else None
+    
+    def _plan_events(self, bot_response: str, plan_json: Optional[str]) -> List[dict]:
+        """Events of a complete response, for a plan that was not streamed from the model"""
+        events = [{"type": "message", "delta": bot_response}]
+        if plan_json:
+            project_plan = ProjectPlan.model_validate_json(plan_json)
+            for index, time_block in enumerate(project_plan.timeline):
+                events.append({"type": "timeBlock", "index": index, "timeBlock": time_block.model_dump(by_alias=True)})
+        return events
+    
+    def _store_conversation(
+        self,
+        user: str,
+        user_message: str,
+        bot_response: str,
+        project_plan: Optional[ProjectPlan],
+        plan_patch: Optional[List[PlanPatchOperation]] = None,
+        base: Optional[Conversation] = None,
+        attachments: Optional[List[FileReference]] = None,
+        reuse_key: Optional[str] = None
+    ) -> Conversation:
+        """Create and store a conversation for the user.
+
+        `reuse_key` marks a first-message plan that may be reused for similar
+        first messages of other sessions with the same system prompt.
+        """
         conversation = Conversation(
             id=str(uuid.uuid4()),
-            user_message=message_data.message,
+            user_message=user_message,
             bot_response=bot_response,
             project_plan=project_plan,
+            plan_patch=plan_patch,
+            base_conversation_id=base.id if plan_patch and base else None,
+            attachments=attachments,
             timestamp=datetime.now()
         )
         
-        # Initialize user conversation list if not present
-        if user not in self.conversations:
-            self.conversations[user] = []
-        
-        self.conversations[user].append(conversation)
+        self.store.add(user, conversation)
+        self.plan_index.add(user, conversation, reuse_key)
+        if self.events.has_connections(user):
+            # Built from the cached bytes the HTTP response uses as well
+            self.events.publish(
+                user,
+                '{"type":"conversation.created","conversation":' + self.serializer.dumps(conversation).decode("utf-8") + '}'
+            )
         return conversation
     
-    async def _generate_bot_response(self, user_message: str, user: str, mode: str = 'basic') -> tuple[str, Optional[ProjectPlan]]:
-        """Generate a response using OpenAI API and parse the project plan"""
+    def _plan_cache_key(
+        self,
+        user_message: str,
+        user: str,
+        mode: str,
+        attachments: Optional[List[FileReference]] = None
+    ) -> Optional[str]:
+        """Cache key for a first-message plan, or None if the response depends on history or files"""
+        if self.response_cache.max_entries <= 0 or attachments or self.store.count(user):
+            return None
+        prompt = self._system_prompt(user, mode)
+        return ResponseCache.make_key(prompt.name, prompt.version_key, user_message)
+    
+    async def _generate_cacheable_response(
+        self,
+        user_message: str,
+        user: str,
+        mode: str,
+        timer: RequestTimer,
+        reuse_key: Optional[str] = None
+    ) -> tuple[str, Optional[str]]:
+        """Generate a response with the plan serialized, so cached plans are never shared objects.
+
+        With plan reuse enabled, a highly similar stored plan is served
+        as is or sent to the model to adapt, instead of a cold generation.
+        """
+        seed = self._similar_plan(user_message, reuse_key) if reuse_key else None
+        if seed is not None and self.plan_reuse == "serve":
+            return self._served_plan(seed, timer)
+        bot_response, project_plan, _ = await self._generate_bot_response(
+            user_message, user, mode, timer=timer, seed=seed
+        )
+        if seed is not None and timer.outcome != "error":
+            project_plan = self._seeded_plan(seed, project_plan)
+        return bot_response, project_plan.model_dump_json() if project_plan else None
+    
+    def _similar_plan(self, user_message: str, reuse_key: str) -> Optional[Conversation]:
+        """A stored first-message plan similar enough to reuse, None if reuse is off or there is none"""
+        if self.plan_reuse == "off":
+            return None
+        conversation_id = self.plan_index.similar(user_message, reuse_key, self.plan_reuse_min_similarity)
+        conversation = self.store.get(conversation_id) if conversation_id else None
+        if conversation is None or conversation.project_plan is None:
+            return None
+        # Tasks completed in the other session start open
+        plan = ProjectPlan.model_validate_json(conversation.project_plan.model_dump_json(exclude=_TASK_COMPLETION))
+        return conversation.model_copy(update={"project_plan": plan, "plan_patch": None})
+    
+    def _served_plan(self, similar: Conversation, timer: RequestTimer) -> tuple[str, str]:
+        """Response and plan JSON of a similar stored plan, answered without an upstream call"""
+        self.plans_served += 1
+        timer.outcome = "reused"
+        return similar.bot_response, similar.project_plan.model_dump_json()
+    
+    def _seeded_plan(self, seed: Conversation, project_plan: Optional[ProjectPlan]) -> ProjectPlan:
+        """The plan of a seeded response: the patched seed, or the seed itself if the model kept it"""
+        self.plans_seeded += 1
+        return project_plan or seed.project_plan
+    
+    async def _attachment_context(
+        self,
+        file_ids: List[str],
+        user: str,
+        timer: RequestTimer
+    ) -> tuple[Optional[List[FileReference]], Optional[str]]:
+        """References to the user's attached files and their text excerpts for the prompt"""
+        files = [file for file in (file_service.get_file(file_id, user) for file_id in dict.fromkeys(file_ids)) if file]
+        if not files:
+            return None, None
         
-        try:
-            # Determine if this is a planning request or a conversation
-            user_conversations = self.conversations.get(user, [])
-            has_existing_plan = any(conv.project_plan for conv in user_conversations)
-            
-            # Choose the appropriate system prompt based on mode and context
-            if has_existing_plan:
-                system_prompt = CONVERSATION_PROMPT
-            else:
-                # Use mode to determine which planning prompt
-                if mode == 'detailed':
-                    system_prompt = WEEKEND_PLANNER_DETAILED_PROMPT
-                else:
-                    system_prompt = WEEKEND_PLANNER_BASIC_PROMPT
-            
-            # Build message history for context
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add conversation history (last 10 exchanges to keep context manageable)
-            for conv in user_conversations[-10:]:
-                messages.append({"role": "user", "content": conv.user_message})
-                
-                # Build assistant response in unified JSON format
-                assistant_json = {
-                    "message": conv.bot_response,
-                    "projectPlan": conv.project_plan.model_dump(by_alias=True) if conv.project_plan else None
-                }
-                
-                messages.append({"role": "assistant", "content": json.dumps(assistant_json)})
-            
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
-            
-            # Set max_tokens based on prompt type and mode
-            if has_existing_plan:
-                max_tokens = 2000  # Conversation mode
+        with timer.stage("attachments"):
+            excerpts = await asyncio.gather(*(
+                self.attachments.excerpt(file, file_service.blob_path(file.sha256)) for file in files
+            ))
+        
+        sections = []
+        for file, excerpt in zip(files, excerpts):
+            if excerpt:
+                sections.append(f'Attached file "{file.filename}":\n{excerpt}')
             else:
-                # Planning mode - check mode for token allocation
-                max_tokens = 6000 if mode == 'detailed' else 3000  # Double tokens for detailed mode
-            
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                temperature=0.7, # Creativity level (0.7-0.9 for planning)
-                max_tokens=max_tokens
+                sections.append(f'Attached file "{file.filename}" ({file.type.value}, no text available)')
+        references = [file_service.get_file_reference(file.id) for file in files]
+        return references, "\n\n".join(sections)
+    
+    def _refinement_base(self, user: str) -> Optional[Conversation]:
+        """The conversation whose plan a follow-up patch applies to, if refinement is used"""
+        if not self.plan_refinement:
+            return None
+        return self.store.latest_plan(user)
+    
+    def _request_timer(self, user: str, mode: str) -> RequestTimer:
+        """Metrics timer labelled with the plan mode and planning vs conversation"""
+        return metrics.timer(
+            'detailed' if mode == 'detailed' else 'basic',
+            'conversation' if self.store.has_plan(user) else 'planning'
+        )
+    
+    def _request_class(self, user: str, mode: str) -> str:
+        """Admission priority class: follow-up chat, or the plan mode of a new plan"""
+        if self.store.has_plan(user):
+            return "conversation"
+        return 'detailed' if mode == 'detailed' else 'basic'
+    
+    def _build_messages(
+        self,
+        user_message: str,
+        user: str,
+        mode: str,
+        attachment_context: Optional[str] = None,
+        seed: Optional[Conversation] = None
+    ) -> tuple[List[dict], int, SystemPrompt]:
+        """Build the chat messages, max_tokens and system prompt for the next completion.
+        
+        With a `seed`, the model is asked to adapt that plan with a patch
+        instead of writing a new one.
+        """
+        # Completion budget of the route: conversation, basic or detailed plan
+        max_tokens = self.upstream.router.max_tokens(self._request_class(user, mode))
+        if seed is not None:
+            system_prompt = SYSTEM_PROMPTS['refinement']
+            messages = self.context_builder.build(
+                system_prompt, [], f"Adapt the current plan to this new project idea: {user_message}", pinned=seed
             )
+            return messages, max_tokens, system_prompt
+        
+        system_prompt = self._system_prompt(user, mode)
+        
+        # Recent history within the token budget, always keeping the latest plan
+        messages = self.context_builder.build(
+            system_prompt,
+            self.store.recent(user, CONTEXT_MAX_HISTORY),
+            f"{user_message}\n\n{attachment_context}" if attachment_context else user_message,
+            pinned=self.store.latest_plan(user),
+            session=user
+        )
+        
+        return messages, max_tokens, system_prompt
+    
+    def _system_prompt(self, user: str, mode: str) -> SystemPrompt:
+        """System prompt for planning in the given mode, or for a follow-up"""
+        if self.store.has_plan(user):
+            return SYSTEM_PROMPTS['refinement' if self.plan_refinement else 'conversation']
+        return SYSTEM_PROMPTS['detailed' if mode == 'detailed' else 'basic']
+    
+    def _response_format(self, system_prompt: SystemPrompt) -> dict:
+        """Extra completion arguments for a schema-constrained response, empty if disabled"""
+        response_format = self.structured_output.response_format(system_prompt)
+        return {"response_format": response_format} if response_format else {}
+    
+    def _parse_response(
+        self,
+        content: str,
+        timer: RequestTimer,
+        response_data: Optional[dict] = None,
+        base: Optional[Conversation] = None,
+        system_prompt: Optional[SystemPrompt] = None
+    ) -> tuple[str, Optional[ProjectPlan], Optional[List[PlanPatchOperation]]]:
+        """Parse the unified JSON response format into message, project plan and patch.
+        
+        `response_data` can be passed when the JSON object was already extracted
+        incrementally while streaming. A "patch" in the response is applied to the
+        plan of `base`, and the patched plan is returned with the operations.
+        If the response was requested with the schema of `system_prompt`, it is
+        validated directly and extracted heuristically only if that fails.
+        """
+        project_plan = None
+        plan_patch = None
+        bot_response = content  # Fallback to raw content if parsing fails
+        
+        if system_prompt is not None and self.structured_output.response_format(system_prompt):
+            with timer.stage("plan_validation"):
+                reply = self.structured_output.parse(system_prompt, content)
+            if reply is not None:
+                bot_response = reply.message
+                project_plan = getattr(reply, "project_plan", None)
+                patch = getattr(reply, "patch", None)
+                if patch and base is not None and base.project_plan:
+                    try:
+                        project_plan = apply_plan_patch(base.project_plan, patch)
+                        plan_patch = patch
+                    except (TypeError, ValueError) as e:
+                        print(f"Failed to apply plan patch: {e}")
+                return bot_response, project_plan, plan_patch
+        
+        if response_data is None:
+            with timer.stage("json_extraction"):
+                response_data = extract_json(content)
+        
+        if response_data is None:
+            print("Failed to parse JSON response: no complete JSON object found")
+            return bot_response, project_plan, plan_patch
+        
+        try:
+            # Extract message
+            bot_response = response_data.get('message', content)
             
-            content = response.choices[0].message.content
+            # Extract project plan if present
+            plan_data = response_data.get('projectPlan')
+            patch_data = response_data.get('patch')
+            with timer.stage("plan_validation"):
+                if plan_data:
+                    project_plan = ProjectPlan(**plan_data)
+                elif patch_data and base is not None and base.project_plan:
+                    operations = [PlanPatchOperation(**op) for op in patch_data]
+                    project_plan = apply_plan_patch(base.project_plan, operations)
+                    plan_patch = operations
+                
+        except (TypeError, ValueError) as e:
+            # If the plan or patch is invalid, use the message without a plan
+            print(f"Failed to parse JSON response: {e}")
+        
+        return bot_response, project_plan, plan_patch
+    
+    async def _generate_bot_response(
+        self,
+        user_message: str,
+        user: str,
+        mode: str = 'basic',
+        base: Optional[Conversation] = None,
+        timer: Optional[RequestTimer] = None,
+        attachment_context: Optional[str] = None,
+        seed: Optional[Conversation] = None
+    ) -> tuple[str, Optional[ProjectPlan], Optional[List[PlanPatchOperation]]]:
+        """Generate a response using OpenAI API and parse the project plan or patch.
+        
+        `attachment_context` holds excerpts of attached files and is sent with the user message.
+        A `seed` plan is adapted with a patch instead of generating a plan from scratch.
+        """
+        timer = timer or self._request_timer(user, mode)
+        
+        try:
+            with timer.stage("prompt"):
+                messages, max_tokens, system_prompt = self._build_messages(
+                    user_message, user, mode, attachment_context, seed
+                )
             
-            # Parse the unified JSON response format
-            project_plan = None
-            bot_response = content  # Fallback to raw content if parsing fails
+            request_class = self._request_class(user, mode)
+            waiting = time.perf_counter()
+            async with self.admission.slot(request_class):
+                started = time.perf_counter()
+                timer.observe("admission", started - waiting)
+                response = await self.upstream.complete(
+                    request_class,
+                    messages=messages,
+                    temperature=0.7, # Creativity level (0.7-0.9 for planning)
+                    max_tokens=max_tokens,
+                    **self._response_format(system_prompt)
+                )
+                timer.observe("upstream_total", time.perf_counter() - started)
             
-            try:
-                json_str = self._extract_json_string(content)
-                
-                if json_str:
-                    response_data = json.loads(json_str)
-                    
-                    # Extract message
-                    bot_response = response_data.get('message', content)
-                    
-                    # Extract project plan if present
-                    plan_data = response_data.get('projectPlan')
-                    if plan_data:
-                        project_plan = ProjectPlan(**plan_data)
-                        
-            except (json.JSONDecodeError, ValueError) as e:
-                # If JSON parsing fails, use the full response as text
-                print(f"Failed to parse JSON response: {e}")
-                bot_response = content
+            timer.record_usage(response.usage)
+            self.context_builder.record_usage(system_prompt.id, response.usage)
+            message = response.choices[0].message
+            # Schema-constrained requests can be refused instead of answered
+            content = message.content if message.content is not None else getattr(message, "refusal", None) or ""
+            timer.outcome = "upstream"
             
-            return bot_response, project_plan
+            return self._parse_response(content, timer, base=seed or base, system_prompt=system_prompt)
         
+        except AdmissionRejected:
+            # Surfaced to the client as 429 with Retry-After
+            raise
         except Exception as e:
             # In case of error, return a fallback message
-            return f"Sorry, an error occurred while processing your request: {str(e)}", None
-    
-    async def get_conversations(self, user: Optional[str] = None) -> List[Conversation]:
-        """Get all conversations, optionally filtered by user"""
-        if user:
-            return self.conversations.get(user, [])
-        # Restituisci tutte le conversazioni di tutti gli utenti
-        all_conversations = []
-        for user_conversations in self.conversations.values():
-            all_conversations.extend(user_conversations)
-        return all_conversations
-    
-    async def get_conversation_by_id(self, conversation_id: str) -> Optional[Conversation]:
-        """Get a specific conversation by ID"""
-        for user_conversations in self.conversations.values():
-            for conv in user_conversations:
-                if conv.id == conversation_id:
-                    return conv
-        return None
+            timer.outcome = "error"
+            return f"Sorry, an error occurred while processing your request: {str(e)}", None, None
+    
+    async def get_conversations(self, user: str) -> List[Conversation]:
+        """Get all conversations of a user"""
+        return self.store.list(user)
+
+    async def export_conversations(
+        self,
+        user: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> AsyncIterator[bytes]:
+        """NDJSON chunks of conversations, one {"sessionId", "conversation"} object per line.
+
+        Conversations are read from the store lazily and serialized in
+        chunks, so memory does not grow with the number exported.
+        """
+        lines = []
+        for owner, conversation in self.store.iter_conversations(user, since, until):
+            # Bypasses the serializer cache, a full export would evict the hot set
+            lines.append(
+                b'{"sessionId":' + json.dumps(owner).encode("utf-8")
+                + b',"conversation":' + self.serializer.dumps_uncached(conversation) + b'}\n'
+            )
+            if len(lines) >= EXPORT_CHUNK_SIZE:
+                yield b"".join(lines)
+                lines = []
+                # Let other requests run between chunks of a long export
+                await asyncio.sleep(0)
+        if lines:
+            yield b"".join(lines)
+
+    async def import_conversations(self, entries: List[tuple[str, Conversation]]) -> int:
+        """Add a batch of (session, conversation) pairs, skipping ids that exist; return how many were added"""
+        added = self.store.import_conversations(entries)
+        for owner, conversation in entries:
+            # Skips ids that are already indexed, like the store
+            self.plan_index.add(owner, conversation)
+        return added
+    
+    async def get_conversation_page(
+        self,
+        user: str,
+        limit: int,
+        before: Optional[str] = None,
+        since: Optional[str] = None
+    ) -> Optional[tuple[List[Conversation], bool]]:
+        """A page of the user's history and whether more exist, None for an unknown cursor"""
+        return self.store.page(user, limit, before, since)
+    
+    def history_etag(self, user: str, variant: str = '') -> str:
+        """Strong ETag of a user's history, `variant` distinguishes representations.
+        
+        Based on the store's revision counter, so no serialization is needed
+        to answer a conditional request.
+        """
+        key = f"{self._etag_epoch}:{self.store.revision(user)}:{variant}"
+        return '"' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:20] + '"'
+    
+    async def search_plans(self, user: str, query: str, limit: int) -> List[PlanSearchResult]:
+        """The user's plans ranked by how well they match the query"""
+        return [
+            PlanSearchResult(
+                conversation_id=hit.conversation_id,
+                score=round(hit.score, 4),
+                project_overview=hit.plan.overview,
+                tech_stack=hit.plan.tech_stack,
+                completed_tasks=hit.plan.completed_tasks,
+                total_tasks=hit.plan.total_tasks,
+                timestamp=hit.plan.timestamp
+            )
+            for hit in self.plan_index.search(query, user=user, limit=limit)
+        ]
+    
+    async def get_conversation_by_id(self, conversation_id: str, user: str) -> Optional[Conversation]:
+        """Get a specific conversation by ID, None if it belongs to another user"""
+        return self.store.get_for_user(conversation_id, user)
     
     async def clear_user_conversations(self, user: str) -> bool:
         """Clear all conversations for a specific user"""
-        if user in self.conversations:
-            self.conversations[user] = []
-            return True
-        return False
+        conversation_ids = self.store.conversation_ids(user)
+        self.serializer.invalidate_many(conversation_ids)
+        self.plan_index.remove_many(conversation_ids)
+        cleared = self.store.clear(user)
+        self.events.publish(user, {"type": "conversations.cleared"})
+        return cleared
     
     async def update_task_completion(
         self, 
@@ -201,21 +714,88 @@ class MessageService:
         time_block_index: int, 
         task_index: int, 
         completed: bool
-    ) -> bool:
-        """Update the completion status of a specific task in a conversation"""
-        user_conversations = self.conversations.get(user, [])
-        
-        # Find the conversation
-        for conv in user_conversations:
-            if conv.id == conversation_id and conv.project_plan:
-                # Validate indices
-                if (0 <= time_block_index < len(conv.project_plan.timeline) and
-                    0 <= task_index < len(conv.project_plan.timeline[time_block_index].tasks)):
-                    # Update the task completion status
-                    conv.project_plan.timeline[time_block_index].tasks[task_index].completed = completed
-                    return True
-        
-        return False
+    ) -> Optional[int]:
+        """Update the completion status of a specific task, return the new plan version"""
+        return await self.update_tasks(conversation_id, user, [(time_block_index, task_index, completed)])
+    
+    async def update_tasks(
+        self,
+        conversation_id: str,
+        user: str,
+        updates: List[TaskUpdate],
+        expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        """Atomically update several tasks of a plan, return the new plan version.
+        
+        Returns None if the conversation or a task is not found and raises
+        PlanVersionConflict if `expected_version` is outdated.
+        """
+        version = self.store.update_tasks(conversation_id, user, updates, expected_version)
+        if version is not None:
+            # The plan changed, its JSON bytes are stale; the context only holds completion per plan version
+            self.serializer.invalidate(conversation_id)
+            self.plan_index.update_tasks(conversation_id, updates)
+            self.events.publish(user, {
+                "type": "tasks.updated",
+                "conversationId": conversation_id,
+                "version": version,
+                "updates": [
+                    {"timeBlockIndex": block, "taskIndex": task, "completed": completed}
+                    for block, task, completed in updates
+                ]
+            })
+        return version
+    
+    async def prewarm(self):
+        """Build the OpenAI client, open a connection and build response schemas before the first request"""
+        if self.structured_output.enabled:
+            self.structured_output.prewarm()
+        await self.upstream.prewarm()
+    
+    def start(self):
+        """Load the store and index its plans in the background, so startup and health checks are not delayed"""
+        if self._loading is None:
+            self._loading = asyncio.create_task(self._load_store())
+    
+    async def _load_store(self):
+        # In a thread, the event loop keeps answering health checks meanwhile
+        await asyncio.to_thread(self.store.load)
+        self._indexing = asyncio.create_task(self._index_stored_plans())
+    
+    async def wait_until_loaded(self):
+        """Wait for the store to be loaded at startup, re-raising the error if loading failed"""
+        if self._loading is not None:
+            await asyncio.shield(self._loading)
+    
+    @property
+    def store_state(self) -> str:
+        """State of the startup load of the store: loading, ready or failed"""
+        if self._loading is None:
+            return "ready"
+        if not self._loading.done():
+            return "loading"
+        return "failed" if self._loading.cancelled() or self._loading.exception() else "ready"
+    
+    async def _index_stored_plans(self):
+        self.plan_index.building = True
+        try:
+            for count, (owner, record) in enumerate(self.store.iter_plan_records(), 1):
+                # The mode of stored plans is not known, so they are searchable but not reused
+                self.plan_index.add_record(owner, record)
+                if count % PLAN_INDEX_CHUNK_SIZE == 0:
+                    # Requests are served while indexing, plans stored meanwhile are indexed by them
+                    await asyncio.sleep(0)
+        finally:
+            self.plan_index.building = False
+    
+    async def close(self):
+        """Close upstream connections and flush pending storage writes"""
+        for task in (self._loading, self._indexing):
+            if task is not None:
+                task.cancel()
+        await self.upstream.close()
+        self.attachments.shutdown()
+        self.store.close()
 
 
 # Singleton instance
@@ -0,0 +1,170 @@
+"""In-process metrics exported in the Prometheus text format"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+import time
+
+
+# Seconds, from local work (prompt assembly, parsing) up to slow detailed plans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(labels[name] for name in self.label_names)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Histogram with fixed buckets and labels"""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(labels[name] for name in self.label_names)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        # Counts are stored per bucket and accumulated when rendered
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class RequestTimer:
+    """Per-stage timings and token usage of one message request.
+
+    `mode` is the plan mode ("basic" or "detailed") and `kind` is "planning"
+    for a new plan or "conversation" for a follow-up.
+    """
+
+    def __init__(self, metrics: "Metrics", mode: str, kind: str):
+        self.metrics = metrics
+        self.mode = mode
+        self.kind = kind
+        # "upstream", "cache" (cached or coalesced), "error" or "rejected"
+        self.outcome = "cache"
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block as the given stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, stage: str, seconds: float):
+        self.metrics.stage_seconds.observe(seconds, stage=stage, mode=self.mode, kind=self.kind)
+
+    def record_usage(self, usage) -> None:
+        """Count prompt, completion and cached prompt tokens from an OpenAI usage object"""
+        if usage is None:
+            return
+        labels = {"mode": self.mode, "kind": self.kind}
+        self.metrics.tokens.inc(usage.prompt_tokens or 0, type="prompt", **labels)
+        self.metrics.tokens.inc(usage.completion_tokens or 0, type="completion", **labels)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+        self.metrics.tokens.inc(cached or 0, type="cached", **labels)
+
+    def finish(self):
+        """Record the duration and outcome of the whole request"""
+        self.observe("total", time.perf_counter() - self.started)
+        self.metrics.messages.inc(mode=self.mode, kind=self.kind, outcome=self.outcome)
+
+
+class Metrics:
+    """Metrics of the message pipeline"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "weekend_ship_stage_seconds",
+            "Time spent per stage of a message request",
+            ("stage", "mode", "kind")
+        )
+        self.tokens = Counter(
+            "weekend_ship_tokens_total",
+            "OpenAI tokens used, by type (prompt, completion, cached prompt tokens)",
+            ("type", "mode", "kind")
+        )
+        self.messages = Counter(
+            "weekend_ship_messages_total",
+            "Processed message requests by outcome",
+            ("mode", "kind", "outcome")
+        )
+        self._metrics = [self.stage_seconds, self.tokens, self.messages]
+
+    def timer(self, mode: str, kind: str) -> RequestTimer:
+        return RequestTimer(self, mode, kind)
+
+    def render(self, extra: Optional[List[str]] = None) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(extra or [])
+        return "\n".join(lines) + "\n"
+
+
+def sample_lines(name: str, description: str, value: float, metric_type: str = "gauge") -> List[str]:
+    """Exposition lines for a single unlabelled value kept elsewhere, e.g. in a stats() dict"""
+    return [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}", f"{name} {_number(value)}"]
+
+
+# Singleton instance
+metrics = Metrics()
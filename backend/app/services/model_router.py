@@ -0,0 +1,253 @@
+"""Per request class model selection with rolling health and failover"""
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+import os
+import time
+
+
+LATENCY_WINDOW = 500
+
+
+class LatencyTracker:
+    """Rolling window of latencies"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def clear(self):
+        self._samples.clear()
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        """Sample count and p50/p95 in milliseconds"""
+        return {
+            "samples": len(self),
+            "p50Ms": round(self.percentile(50) * 1000, 1) if len(self) else None,
+            "p95Ms": round(self.percentile(95) * 1000, 1) if len(self) else None,
+        }
+
+
+class ModelRoute:
+    """Models of a request class in order of preference, and its completion budget"""
+    __slots__ = ("request_class", "models", "max_tokens")
+
+    def __init__(self, request_class: str, models: List[str], max_tokens: int):
+        if not models:
+            raise ValueError(f"No model configured for {request_class} requests")
+        self.request_class = request_class
+        self.models = models
+        self.max_tokens = max_tokens
+
+
+class ModelHealth:
+    """Recent outcomes and first-token latencies of one model, across request classes"""
+    __slots__ = ("errors", "first_token", "degraded_until")
+
+    def __init__(self, window: int):
+        self.errors: Deque[bool] = deque(maxlen=window)
+        self.first_token = LatencyTracker(window)
+        self.degraded_until = 0.0
+
+    def error_rate(self) -> float:
+        return sum(self.errors) / len(self.errors) if self.errors else 0.0
+
+
+class RouteStats:
+    """Requests, latency and token counters of one model on one route"""
+    __slots__ = ("requests", "errors", "first_token", "full", "prompt_tokens", "completion_tokens", "cached_tokens")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.first_token = LatencyTracker()
+        self.full = LatencyTracker()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+
+
+class ModelRouter:
+    """Pick the model and max_tokens for each request class.
+
+    Each route lists models in order of preference. A model whose error
+    rate or p95 first-token latency over its last `window` attempts passes
+    the limit is degraded for `cooldown` seconds and requests go to the
+    next model of the route. After the cooldown its history starts over,
+    so it gets traffic again and is degraded again if it still fails.
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, ModelRoute],
+        window: int = 50,
+        min_samples: int = 10,
+        max_error_rate: float = 0.5,
+        max_first_token: float = 10.0,
+        cooldown: float = 30.0
+    ):
+        self.routes = routes
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_first_token = max_first_token
+        self.cooldown = cooldown
+        self._health: Dict[str, ModelHealth] = {}
+        # (request class, model) -> counters
+        self._stats: Dict[tuple[str, str], RouteStats] = {}
+        self.failovers = 0
+        self.degradations = 0
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Routes from MODEL_<CLASS> (comma-separated, preferred first) and MODEL_<CLASS>_MAX_TOKENS"""
+        # Follow-up turns prefer the faster model, plans the larger one
+        defaults = {
+            "conversation": ("gpt-4o-mini,gpt-4o", 2000),
+            "basic": ("gpt-4o,gpt-4o-mini", 3000),
+            "detailed": ("gpt-4o,gpt-4o-mini", 6000)
+        }
+        routes = {}
+        for request_class, (default_models, max_tokens) in defaults.items():
+            name = f"MODEL_{request_class.upper()}"
+            models = [model.strip() for model in os.getenv(name, default_models).split(",") if model.strip()]
+            routes[request_class] = ModelRoute(
+                request_class, models, int(os.getenv(f"{name}_MAX_TOKENS", str(max_tokens)))
+            )
+        return cls(
+            routes,
+            window=int(os.getenv("MODEL_HEALTH_WINDOW", "50")),
+            min_samples=int(os.getenv("MODEL_HEALTH_MIN_SAMPLES", "10")),
+            max_error_rate=float(os.getenv("MODEL_MAX_ERROR_RATE", "0.5")),
+            max_first_token=float(os.getenv("MODEL_MAX_FIRST_TOKEN_SECONDS", "10")),
+            cooldown=float(os.getenv("MODEL_COOLDOWN_SECONDS", "30"))
+        )
+
+    def route(self, request_class: str) -> ModelRoute:
+        return self.routes.get(request_class) or self.routes["basic"]
+
+    def max_tokens(self, request_class: str) -> int:
+        return self.route(request_class).max_tokens
+
+    def select(self, request_class: str, exclude: Iterable[str] = ()) -> str:
+        """The first healthy model of the route that has not failed for this request yet.
+
+        If every model is degraded or excluded, the preferred one that was
+        not excluded (or else the primary) is used anyway.
+        """
+        route = self.route(request_class)
+        now = time.monotonic()
+        candidates = [model for model in route.models if model not in exclude] or route.models[:1]
+        for model in candidates:
+            health = self._health.get(model)
+            if health is None or health.degraded_until <= now:
+                break
+        else:
+            model = candidates[0]
+        if model != route.models[0]:
+            self.failovers += 1
+        self._route_stats(request_class, model).requests += 1
+        return model
+
+    def record_success(self, request_class: str, model: str, seconds: float, streamed: bool):
+        """Record an attempt that got a response, `seconds` to the first chunk if `streamed`"""
+        health = self._model_health(model)
+        health.errors.append(False)
+        stats = self._route_stats(request_class, model)
+        if streamed:
+            health.first_token.add(seconds)
+            stats.first_token.add(seconds)
+        else:
+            stats.full.add(seconds)
+        self._check(model, health)
+
+    def record_stream_end(self, request_class: str, model: str, seconds: float):
+        """Record the total duration of a completed stream"""
+        self._route_stats(request_class, model).full.add(seconds)
+
+    def record_error(self, request_class: str, model: str):
+        health = self._model_health(model)
+        health.errors.append(True)
+        self._route_stats(request_class, model).errors += 1
+        self._check(model, health)
+
+    def record_usage(self, request_class: str, model: str, usage):
+        if usage is None:
+            return
+        stats = self._route_stats(request_class, model)
+        stats.prompt_tokens += usage.prompt_tokens or 0
+        stats.completion_tokens += usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        stats.cached_tokens += (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    def _check(self, model: str, health: ModelHealth):
+        """Degrade a model whose recent error rate or first-token latency is over the limit"""
+        if len(health.errors) < self.min_samples:
+            return
+        p95 = health.first_token.percentile(95) if len(health.first_token) >= self.min_samples else None
+        error_rate = health.error_rate()
+        if error_rate < self.max_error_rate and (p95 is None or p95 < self.max_first_token):
+            return
+        print(f"Model {model} degraded for {self.cooldown:.0f}s: error rate {error_rate:.0%}, first token p95 {p95}")
+        self.degradations += 1
+        health.degraded_until = time.monotonic() + self.cooldown
+        health.errors.clear()
+        health.first_token.clear()
+
+    def _model_health(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth(self.window)
+        return health
+
+    def _route_stats(self, request_class: str, model: str) -> RouteStats:
+        key = (request_class, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = RouteStats()
+        return stats
+
+    def stats(self) -> dict:
+        """Routes, model health and per route latency and token counters"""
+        now = time.monotonic()
+        return {
+            "routes": {
+                request_class: {"models": route.models, "maxTokens": route.max_tokens}
+                for request_class, route in self.routes.items()
+            },
+            "failovers": self.failovers,
+            "degradations": self.degradations,
+            "models": {
+                model: {
+                    "degraded": health.degraded_until > now,
+                    "errorRate": round(health.error_rate(), 4),
+                    "firstToken": health.first_token.summary()
+                }
+                for model, health in self._health.items()
+            },
+            "traffic": [
+                {
+                    "requestClass": request_class,
+                    "model": model,
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "firstToken": stats.first_token.summary(),
+                    "full": stats.full.summary(),
+                    "promptTokens": stats.prompt_tokens,
+                    "completionTokens": stats.completion_tokens,
+                    "cachedTokens": stats.cached_tokens
+                }
+                for (request_class, model), stats in self._stats.items()
+            ]
+        }
@@ -0,0 +1,307 @@
+"""Incrementally maintained inverted index over project plans, with BM25 ranking"""
+from app.models.chat import Conversation
+from app.storage.compact import CompactConversation
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+import math
+import heapq
+import re
+
+
+# Words with an optional version or suffix, so "c++", "c#", "node.js" and "3.11" stay one term
+_TERM = re.compile(r"[a-z0-9]+(?:[+#]+|(?:\.[a-z0-9]+)+)?")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have i in into is it its me my of on or so that the "
+    "then this to up use using want we with will you your".split()
+)
+
+# Term frequency weight per field, a tech stack match says more than a word in a task
+FIELD_WEIGHTS = {"tech_stack": 3, "overview": 2, "message": 2, "tasks": 1}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [term for term in _TERM.findall(text.lower()) if term not in STOPWORDS]
+
+
+def plan_terms(user_message: str, overview: str, tech_stack: Iterable[str], tasks: Iterable[str]) -> Dict[str, int]:
+    """Field-weighted term frequencies of a conversation's message and plan"""
+    weights: Dict[str, int] = {}
+
+    def add(text: str, weight: int):
+        for term in tokenize(text):
+            weights[term] = weights.get(term, 0) + weight
+
+    add(user_message, FIELD_WEIGHTS["message"])
+    add(overview, FIELD_WEIGHTS["overview"])
+    # One pass per field, the separator never joins two terms
+    add("\n".join(tech_stack), FIELD_WEIGHTS["tech_stack"])
+    add("\n".join(tasks), FIELD_WEIGHTS["tasks"])
+    return weights
+
+
+class IndexedPlan:
+    """Metadata of an indexed plan; its terms are kept to remove it again, the weights live in the postings"""
+    __slots__ = (
+        "user", "terms", "length", "overview", "tech_stack", "timestamp",
+        "total_tasks", "completed", "reuse_key", "message_terms"
+    )
+
+    def __init__(
+        self,
+        user: str,
+        weights: Dict[str, int],
+        user_message: str,
+        overview: str,
+        tech_stack: List[str],
+        timestamp: datetime,
+        task_states: List[List[bool]],
+        reuse_key: Optional[str]
+    ):
+        self.user = user
+        self.terms = tuple(weights)
+        self.length = sum(weights.values())
+        self.overview = overview
+        self.tech_stack = tech_stack
+        self.timestamp = timestamp
+        self.total_tasks = sum(len(states) for states in task_states)
+        # (time block index, task index) of completed tasks, None until a task is completed
+        self.completed: Optional[Set[tuple[int, int]]] = None
+        for block_index, states in enumerate(task_states):
+            for task_index, completed in enumerate(states):
+                if completed:
+                    self.set_completed(block_index, task_index, True)
+        # Set for first-message plans that may be reused for other sessions
+        self.reuse_key = reuse_key
+        self.message_terms: Optional[FrozenSet[str]] = frozenset(tokenize(user_message)) if reuse_key else None
+
+    @property
+    def completed_tasks(self) -> int:
+        return len(self.completed) if self.completed else 0
+
+    def set_completed(self, block_index: int, task_index: int, completed: bool):
+        if completed:
+            if self.completed is None:
+                self.completed = set()
+            self.completed.add((block_index, task_index))
+        elif self.completed:
+            self.completed.discard((block_index, task_index))
+
+
+class PlanSearchHit:
+    __slots__ = ("conversation_id", "score", "plan")
+
+    def __init__(self, conversation_id: str, score: float, plan: IndexedPlan):
+        self.conversation_id = conversation_id
+        self.score = score
+        self.plan = plan
+
+
+class PlanIndex:
+    """Inverted index from terms to plans, ranked with BM25.
+
+    Plans are added when their conversation is stored and removed when
+    the history is cleared; task completion only updates the metadata.
+    Searches are usually scoped to one session. `similar` looks across
+    sessions, but only at plans that were generated for a first message
+    without attachments, the same ones the response cache shares.
+    """
+
+    def __init__(self):
+        # term -> {conversation_id: weighted term frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        # Message terms of reusable plans: term -> conversation ids
+        self._message_postings: Dict[str, Set[str]] = {}
+        self._plans: Dict[str, IndexedPlan] = {}
+        # Indexed conversation ids per user, scoped searches only score these
+        self._by_user: Dict[str, Set[str]] = {}
+        self._total_length = 0.0
+        self._posting_count = 0
+        self._reusable = 0
+        # True while stored plans are added at startup, searches may miss some of them
+        self.building = False
+        self.searches = 0
+        self.similar_lookups = 0
+        self.similar_found = 0
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def add(self, user: str, conversation: Conversation, reuse_key: Optional[str] = None):
+        """Index the plan of a conversation; conversations without a plan or already indexed are ignored"""
+        plan = conversation.project_plan
+        if plan is None or conversation.id in self._plans:
+            return
+        self._add(
+            user,
+            conversation.id,
+            conversation.user_message,
+            plan.project_overview,
+            plan.tech_stack,
+            conversation.timestamp,
+            (task.task for time_block in plan.timeline for task in time_block.tasks),
+            [[task.completed for task in time_block.tasks] for time_block in plan.timeline],
+            reuse_key
+        )
+
+    def add_record(self, user: str, record: CompactConversation):
+        """Index a stored plan from its compact record, reading its JSON without building the model"""
+        if not record.has_plan or record.id in self._plans:
+            return
+        data = record.json_data()
+        plan = data["project_plan"]
+        offsets = record.block_offsets
+        self._add(
+            user,
+            record.id,
+            data["user_message"],
+            plan["project_overview"],
+            plan["tech_stack"],
+            datetime.fromisoformat(data["timestamp"]),
+            (task["task"] for time_block in plan["timeline"] for task in time_block["tasks"]),
+            # The flags in the JSON are those at creation, the record holds the current ones
+            [
+                [record.is_completed(index) for index in range(offsets[block_index], offsets[block_index + 1])]
+                for block_index in range(len(offsets) - 1)
+            ],
+            None
+        )
+
+    def _add(
+        self,
+        user: str,
+        conversation_id: str,
+        user_message: str,
+        overview: str,
+        tech_stack: List[str],
+        timestamp: datetime,
+        tasks: Iterable[str],
+        task_states: List[List[bool]],
+        reuse_key: Optional[str]
+    ):
+        weights = plan_terms(user_message, overview, tech_stack, tasks)
+        plan = IndexedPlan(user, weights, user_message, overview, tech_stack, timestamp, task_states, reuse_key)
+        self._plans[conversation_id] = plan
+        self._by_user.setdefault(user, set()).add(conversation_id)
+        self._total_length += plan.length
+        self._posting_count += len(plan.terms)
+        self._reusable += 1 if reuse_key else 0
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+            postings[conversation_id] = weight
+        for term in plan.message_terms or ():
+            self._message_postings.setdefault(term, set()).add(conversation_id)
+
+    def remove(self, conversation_id: str):
+        plan = self._plans.pop(conversation_id, None)
+        if plan is None:
+            return
+        user_plans = self._by_user[plan.user]
+        user_plans.discard(conversation_id)
+        if not user_plans:
+            del self._by_user[plan.user]
+        self._total_length -= plan.length
+        self._posting_count -= len(plan.terms)
+        self._reusable -= 1 if plan.reuse_key else 0
+        for term in plan.terms:
+            postings = self._postings[term]
+            del postings[conversation_id]
+            if not postings:
+                del self._postings[term]
+        for term in plan.message_terms or ():
+            message_postings = self._message_postings[term]
+            message_postings.discard(conversation_id)
+            if not message_postings:
+                del self._message_postings[term]
+
+    def remove_many(self, conversation_ids: Iterable[str]):
+        for conversation_id in conversation_ids:
+            self.remove(conversation_id)
+
+    def update_tasks(self, conversation_id: str, updates: Iterable[tuple[int, int, bool]]):
+        """Track task completion changes of an indexed plan"""
+        plan = self._plans.get(conversation_id)
+        if plan is None:
+            return
+        for block_index, task_index, completed in updates:
+            plan.set_completed(block_index, task_index, completed)
+
+    def search(self, query: str, user: Optional[str] = None, limit: int = 10) -> List[PlanSearchHit]:
+        """Plans matching any term of the query, best first, limited to the plans of `user` if given"""
+        self.searches += 1
+        terms = set(tokenize(query))
+        if not terms or not self._plans:
+            return []
+        count = len(self._plans)
+        average_length = self._total_length / count
+        scores: Dict[str, float] = {}
+
+        def score(conversation_id: str, plan: IndexedPlan, frequency: float, idf: float):
+            norm = K1 * (1 - B + B * plan.length / average_length)
+            scores[conversation_id] = scores.get(conversation_id, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            if user is not None:
+                # A session has few plans, look them up instead of walking postings of all sessions
+                for conversation_id in self._by_user.get(user, ()):
+                    frequency = postings.get(conversation_id)
+                    if frequency:
+                        score(conversation_id, self._plans[conversation_id], frequency, idf)
+                continue
+            for conversation_id, frequency in postings.items():
+                score(conversation_id, self._plans[conversation_id], frequency, idf)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [PlanSearchHit(conversation_id, score, self._plans[conversation_id]) for conversation_id, score in best]
+
+    def similar(self, message: str, reuse_key: str, min_similarity: float) -> Optional[str]:
+        """Id of a reusable plan whose message terms overlap `message` by at least `min_similarity` (Jaccard).
+
+        A match shares at least min_similarity * |terms| terms with the
+        message, so it contains one of the |terms| - that + 1 rarest
+        terms; only their postings are read to find candidates.
+        """
+        self.similar_lookups += 1
+        terms = frozenset(tokenize(message))
+        if not terms or min_similarity <= 0:
+            return None
+        by_rarity = sorted(terms, key=lambda term: len(self._message_postings.get(term, ())))
+        # The epsilon keeps float error (0.7 * 10 > 7) from shortening the prefix
+        prefix = len(terms) - math.ceil(min_similarity * len(terms) - 1e-9) + 1
+        candidates: Set[str] = set()
+        for term in by_rarity[:prefix]:
+            candidates.update(self._message_postings.get(term, ()))
+
+        best_id, best_similarity = None, min_similarity
+        for conversation_id in candidates:
+            plan = self._plans[conversation_id]
+            if plan.reuse_key != reuse_key:
+                continue
+            other = plan.message_terms
+            similarity = len(terms & other) / len(terms | other)
+            if similarity >= best_similarity:
+                best_id, best_similarity = conversation_id, similarity
+        if best_id is not None:
+            self.similar_found += 1
+        return best_id
+
+    def stats(self) -> dict:
+        return {
+            "plans": len(self._plans),
+            "building": self.building,
+            "reusablePlans": self._reusable,
+            "terms": len(self._postings),
+            "postings": self._posting_count,
+            "searches": self.searches,
+            "similarLookups": self.similar_lookups,
+            "similarFound": self.similar_found
+        }
@@ -0,0 +1,112 @@
+from app.models.chat import PlanPatchOperation, ProjectPlan, Task, TimeBlock
+from pydantic import ValidationError
+from typing import List, Optional
+
+
+class PlanPatchError(ValueError):
+    """Raised when a patch operation cannot be applied to a plan"""
+
+
+def apply_plan_patch(plan: ProjectPlan, operations: List[PlanPatchOperation]) -> ProjectPlan:
+    """Apply patch operations in order to a copy of the plan.
+
+    Tasks keep their `completed` state unless they are removed. The
+    original plan is never modified, so a failing patch leaves it intact.
+    """
+    patched = plan.model_copy(deep=True)
+    for position, operation in enumerate(operations):
+        try:
+            _apply_operation(patched, operation)
+        except (PlanPatchError, ValidationError) as e:
+            raise PlanPatchError(f"Operation {position} ({operation.op}) failed: {e}") from e
+    return patched
+
+
+def _block(plan: ProjectPlan, index: Optional[int]) -> TimeBlock:
+    if index is None or not 0 <= index < len(plan.timeline):
+        raise PlanPatchError(f"time block index {index} out of range")
+    return plan.timeline[index]
+
+
+def _task_index(block: TimeBlock, index: Optional[int]) -> int:
+    if index is None or not 0 <= index < len(block.tasks):
+        raise PlanPatchError(f"task index {index} out of range")
+    return index
+
+
+def _insert_index(items: list, index: Optional[int]) -> int:
+    """Insert position, appending when no index is given"""
+    if index is None:
+        return len(items)
+    if not 0 <= index <= len(items):
+        raise PlanPatchError(f"insert index {index} out of range")
+    return index
+
+
+def _string_list(value) -> List[str]:
+    if not isinstance(value, list):
+        raise PlanPatchError("value must be a list of strings")
+    return value
+
+
+def _apply_operation(plan: ProjectPlan, operation: PlanPatchOperation):
+    op = operation.op
+
+    if op == 'addTask':
+        block = _block(plan, operation.block_index)
+        if not operation.task or not operation.estimated_time:
+            raise PlanPatchError("addTask requires task and estimatedTime")
+        task = Task(
+            task=operation.task,
+            essential=True if operation.essential is None else operation.essential,
+            estimated_time=operation.estimated_time
+        )
+        block.tasks.insert(_insert_index(block.tasks, operation.task_index), task)
+
+    elif op == 'updateTask':
+        block = _block(plan, operation.block_index)
+        task = block.tasks[_task_index(block, operation.task_index)]
+        if operation.task is not None:
+            task.task = operation.task
+        if operation.essential is not None:
+            task.essential = operation.essential
+        if operation.estimated_time is not None:
+            task.estimated_time = operation.estimated_time
+
+    elif op == 'removeTask':
+        block = _block(plan, operation.block_index)
+        del block.tasks[_task_index(block, operation.task_index)]
+
+    elif op == 'moveTask':
+        source = _block(plan, operation.block_index)
+        target = _block(plan, operation.to_block_index)
+        task = source.tasks.pop(_task_index(source, operation.task_index))
+        target.tasks.insert(_insert_index(target.tasks, operation.to_task_index), task)
+
+    elif op == 'addTimeBlock':
+        if not operation.name:
+            raise PlanPatchError("addTimeBlock requires name")
+        plan.timeline.insert(
+            _insert_index(plan.timeline, operation.block_index),
+            TimeBlock(time_block=operation.name, tasks=[])
+        )
+
+    elif op == 'renameTimeBlock':
+        if not operation.name:
+            raise PlanPatchError("renameTimeBlock requires name")
+        _block(plan, operation.block_index).time_block = operation.name
+
+    elif op == 'removeTimeBlock':
+        _block(plan, operation.block_index)
+        del plan.timeline[operation.block_index]
+
+    elif op == 'setOverview':
+        if not isinstance(operation.value, str):
+            raise PlanPatchError("value must be a string")
+        plan.project_overview = operation.value
+
+    elif op == 'setTechStack':
+        plan.tech_stack = _string_list(operation.value)
+
+    elif op == 'setTips':
+        plan.tips = _string_list(operation.value)
@@ -0,0 +1,198 @@
+"""Incremental parser for streamed planner responses"""
+from app.models.chat import TimeBlock
+from pydantic import ValidationError
+from typing import List, Optional
+import json
+import re
+
+
+# Characters that change parser state outside / inside a JSON string
+_STRUCTURAL = re.compile(r'[{}\[\]":,]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class _Frame:
+    """An open JSON object or array"""
+    __slots__ = ('kind', 'start', 'key', 'expect_key', 'index')
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.key: Optional[str] = None
+        self.expect_key = kind == '{'
+        self.index = 0
+
+
+class PlanStreamParser:
+    """Parse the unified JSON response format while it is being streamed.
+
+    Emits the top-level "message" text as it arrives and every entry of
+    "projectPlan.timeline" as soon as its closing brace has been received.
+    The full raw content is kept in `text` for the final parse.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._done = False
+        # String state
+        self._in_string = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._streaming_message = False
+        self._message_emitted = 0  # Raw offset already emitted for "message"
+
+    @property
+    def done(self) -> bool:
+        """True once the root JSON object has been closed"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Consume a chunk of content and return the events it completes"""
+        events: List[dict] = []
+        if not chunk:
+            return events
+
+        self.text += chunk
+        text = self.text
+        pos = self._pos
+
+        while pos < len(text) and not self._done:
+            if not self._started:
+                # Skip any preamble such as a ```json fence
+                brace = text.find('{', pos)
+                if brace == -1:
+                    pos = len(text)
+                    break
+                self._started = True
+                self._stack.append(_Frame('{', brace))
+                pos = brace + 1
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, pos)
+                if not match:
+                    pos = len(text)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(text):
+                        # Escape split across chunks, wait for more input
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._close_string(match.start(), events)
+                pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(text, pos)
+            if not match:
+                pos = len(text)
+                break
+            char = match.group()
+            pos = match.end()
+            frame = self._stack[-1]
+
+            if char == '"':
+                self._open_string(pos, frame)
+            elif char == ':':
+                frame.expect_key = False
+            elif char == ',':
+                if frame.kind == '{':
+                    frame.expect_key = True
+                    frame.key = None
+                else:
+                    frame.index += 1
+            elif char in '{[':
+                self._stack.append(_Frame(char, match.start()))
+            else:
+                self._close_container(match.end(), events)
+
+        self._pos = pos
+
+        if self._streaming_message:
+            self._emit_message(len(text), events)
+
+        return events
+
+    def _open_string(self, start: int, frame: _Frame):
+        self._in_string = True
+        self._string_start = start
+        self._string_is_key = frame.kind == '{' and frame.expect_key
+        self._streaming_message = (
+            not self._string_is_key
+            and len(self._stack) == 1
+            and frame.key == 'message'
+        )
+        self._message_emitted = start
+
+    def _close_string(self, end: int, events: List[dict]):
+        self._in_string = False
+        if self._streaming_message:
+            self._emit_message(end, events)
+            self._streaming_message = False
+        elif self._string_is_key:
+            self._stack[-1].key = json.loads(self.text[self._string_start - 1:end + 1], strict=False)
+
+    def _close_container(self, end: int, events: List[dict]):
+        frame = self._stack.pop()
+        if not self._stack:
+            self._done = True
+            return
+
+        # projectPlan -> timeline -> [ {timeBlock} ]
+        if (
+            frame.kind == '{'
+            and len(self._stack) == 3
+            and self._stack[0].key == 'projectPlan'
+            and self._stack[1].key == 'timeline'
+            and self._stack[2].kind == '['
+        ):
+            try:
+                time_block = TimeBlock(**json.loads(self.text[frame.start:end], strict=False))
+            except (json.JSONDecodeError, ValidationError, TypeError):
+                return
+            events.append({
+                "type": "timeBlock",
+                "index": self._stack[2].index,
+                "timeBlock": time_block.model_dump(by_alias=True)
+            })
+
+    def _emit_message(self, end: int, events: List[dict]):
+        """Emit decoded "message" text between the last emitted offset and `end`"""
+        end = _escape_boundary(self.text, self._message_emitted, end)
+        if end <= self._message_emitted:
+            return
+        raw = self.text[self._message_emitted:end]
+        try:
+            # Models sometimes write raw newlines or tabs inside strings, like the extractor accept them
+            delta = json.loads(f'"{raw}"', strict=False)
+        except json.JSONDecodeError:
+            return
+        self._message_emitted = end
+        if delta:
+            events.append({"type": "message", "delta": delta})
+
+
+def _escape_boundary(text: str, start: int, end: int) -> int:
+    """Move `end` back so it does not split an escape sequence or surrogate pair"""
+    i = text.find('\\', start, end)
+    while i != -1:
+        if i + 1 >= end:
+            return i
+        if text[i + 1] != 'u':
+            i = text.find('\\', i + 2, end)
+            continue
+        if i + 6 > end:
+            return i
+        try:
+            code = int(text[i + 2:i + 6], 16)
+        except ValueError:
+            return end
+        # A high surrogate must be decoded together with its low surrogate
+        if 0xD800 <= code <= 0xDBFF and i + 12 > end:
+            return i
+        i = text.find('\\', i + 6, end)
+    return end
@@ -0,0 +1,90 @@
+"""Push session events to open WebSocket connections"""
+from contextvars import ContextVar
+from typing import Dict, Optional, Set
+import asyncio
+import json
+
+
+class Connection:
+    """Outgoing frames of one WebSocket connection"""
+    __slots__ = ("session", "queue", "overflowed")
+
+    def __init__(self, session: str, max_queue: int):
+        self.session = session
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # Set when a pushed event was dropped; the connection must be closed so the client resyncs
+        self.overflowed = False
+
+    def push(self, frame: str) -> bool:
+        """Queue a frame without waiting, False if the client is too far behind"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+
+# Connection whose request caused the current event; it gets the result as a reply instead
+event_origin: ContextVar[Optional[Connection]] = ContextVar("event_origin", default=None)
+
+
+class SessionHub:
+    """Fan out events to every open connection of a session, e.g. several browser tabs.
+
+    Publishing never waits: each connection has a bounded queue and a
+    connection that falls behind is marked as overflowed instead of
+    slowing down the request that caused the event.
+    """
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._connections: Dict[str, Set[Connection]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def connect(self, session: str) -> Connection:
+        connection = Connection(session, self.max_queue)
+        self._connections.setdefault(session, set()).add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection):
+        connections = self._connections.get(connection.session)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._connections[connection.session]
+
+    def has_connections(self, session: str) -> bool:
+        """Check before building an expensive event"""
+        return session in self._connections
+
+    def publish(self, session: str, event) -> int:
+        """Send an event (a dict or a serialized JSON string) to the session's connections.
+
+        The connection the event originates from is skipped. Returns the
+        number of connections the event was queued for.
+        """
+        connections = self._connections.get(session)
+        if not connections:
+            return 0
+        frame = event if isinstance(event, str) else json.dumps(event)
+        origin = event_origin.get()
+        sent = 0
+        for connection in connections:
+            if connection is origin:
+                continue
+            if connection.push(frame):
+                sent += 1
+            else:
+                self.dropped += 1
+        self.published += sent
+        return sent
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._connections),
+            "connections": sum(len(connections) for connections in self._connections.values()),
+            "published": self.published,
+            "dropped": self.dropped
+        }
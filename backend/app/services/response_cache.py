@@ -0,0 +1,198 @@
+"""LRU + TTL cache for generated plans with single-flight request coalescing"""
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import time
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a user message so trivially different requests share a key"""
+    return ' '.join(message.lower().split()).rstrip('.!?')
+
+
+class SharedStream:
+    """Events of one in-flight generation, replayed to every request that follows it"""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.task: Optional[asyncio.Future] = None
+        self._update = asyncio.get_running_loop().create_future()
+
+    def emit(self, event: Any):
+        self.events.append(event)
+        self._notify()
+
+    def _notify(self):
+        update, self._update = self._update, asyncio.get_running_loop().create_future()
+        update.set_result(None)
+
+    async def follow(self) -> AsyncIterator[Any]:
+        """All events from the first one, then new ones until the generation has finished"""
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.task.done():
+                return
+            # Shielded, a follower that disconnects must not cancel the wake-up of the others
+            await asyncio.shield(self._update)
+
+    async def value(self) -> Any:
+        """The result of the generation, re-raising its error"""
+        return await asyncio.shield(self.task)
+
+
+class ResponseCache:
+    """Bounded cache of upstream responses.
+
+    Entries expire after `ttl_seconds` and the least recently used entry is
+    evicted once `max_entries` is reached. Concurrent requests for the same
+    key share a single upstream call, which runs on even if the request
+    that started it is cancelled. Streamed generations are shared the
+    same way, later requests replay the events emitted so far.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, value), ordered from least to most recently used
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Streamed generations, their tasks are in _inflight as well
+        self._streams: Dict[str, SharedStream] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(mode: str, prompt_version: str, user_message: str) -> str:
+        """Build the cache key from mode, prompt version and normalized message"""
+        message_hash = hashlib.sha256(normalize_message(user_message).encode('utf-8')).hexdigest()
+        return f"{mode}:{prompt_version}:{message_hash}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a cached value and mark it as recently used, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def lookup(self, key: str) -> Optional[Any]:
+        """Like get, but counts the lookup as a hit or miss"""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store a value, evicting the least recently used entries if full"""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_create(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> Any:
+        """Return the cached value for key or compute it once for all concurrent callers"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        return await asyncio.shield(self._start(key, factory, cacheable))
+
+    def stream(
+        self,
+        key: str,
+        produce: Callable[[SharedStream], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> tuple[Optional[Any], Optional[SharedStream]]:
+        """Return (cached value, None), or (None, stream) of the generation in flight for key.
+
+        If none is in flight, `produce` is started with a new stream to emit
+        its events to, and its return value is cached like `get_or_create`'s.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, None
+
+        shared = self._streams.get(key)
+        if shared is not None:
+            self.coalesced += 1
+            return None, shared
+
+        self.misses += 1
+        shared = SharedStream()
+        self._streams[key] = shared
+        shared.task = self._start(key, lambda: produce(shared), cacheable)
+        return None, shared
+
+    def _start(self, key: str, factory: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> asyncio.Future:
+        # A separate task, so a cancelled request does not fail the others waiting for it
+        task = asyncio.ensure_future(self._create(key, factory, cacheable))
+        self._inflight[key] = task
+
+        def done(finished: asyncio.Future):
+            # A streamed and a plain generation of the same key may overlap, only remove this one
+            if self._inflight.get(key) is finished:
+                del self._inflight[key]
+            shared = self._streams.get(key)
+            if shared is not None and shared.task is finished:
+                del self._streams[key]
+                # Followers waiting for the next event see the stream has ended
+                shared._notify()
+            # Waiters re-raise the error, mark it as retrieved in case all of them left
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(done)
+        return task
+
+    async def _create(self, key: str, factory: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> Any:
+        value = await factory()
+        if cacheable(value):
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Remove all cached entries"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Cache counters for sizing the cache"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            "inflight": len(self._inflight),
+            "hitRate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+        }
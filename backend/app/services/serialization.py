@@ -0,0 +1,93 @@
+"""Fast JSON serialization of conversations with cached bytes"""
+from app.models.chat import Conversation, ConversationSummary
+from collections import OrderedDict
+from fastapi import Response
+from pydantic import TypeAdapter
+from typing import Iterable, List
+
+
+_conversation_adapter = TypeAdapter(Conversation)
+_summary_adapter = TypeAdapter(ConversationSummary)
+
+
+class JSONBytesResponse(Response):
+    """Response for a body that is already serialized JSON"""
+    media_type = "application/json"
+
+
+class ConversationSerializer:
+    """Serialize conversations to camelCase JSON without revalidation.
+
+    Conversations are immutable apart from task completion, which bumps
+    `plan_version`. The JSON bytes of each conversation are therefore cached
+    by id and plan version, and list responses are built by joining cached
+    bytes instead of serializing every plan again.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        # (conversation_id, view) -> (plan_version, JSON bytes)
+        self._entries: OrderedDict[tuple[str, str], tuple[int, bytes]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def dumps(self, conversation: Conversation, view: str = 'full') -> bytes:
+        """JSON bytes of one conversation, 'full' or 'summary'"""
+        key = (conversation.id, view)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == conversation.plan_version:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        if view == 'summary':
+            data = _summary_adapter.dump_json(summarize(conversation), by_alias=True)
+        else:
+            data = _conversation_adapter.dump_json(conversation, by_alias=True)
+        if self.max_entries > 0:
+            self._entries[key] = (conversation.plan_version, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def dumps_list(self, conversations: Iterable[Conversation], view: str = 'full') -> bytes:
+        """JSON array of conversations, built from cached bytes"""
+        return b"[" + b",".join(self.dumps(conversation, view) for conversation in conversations) + b"]"
+
+    def dumps_uncached(self, conversation: Conversation) -> bytes:
+        """JSON bytes of a modified copy that must not be cached"""
+        return _conversation_adapter.dump_json(conversation, by_alias=True)
+
+    def invalidate(self, conversation_id: str):
+        """Drop cached bytes of a conversation"""
+        self._entries.pop((conversation_id, 'full'), None)
+        self._entries.pop((conversation_id, 'summary'), None)
+
+    def invalidate_many(self, conversation_ids: List[str]):
+        for conversation_id in conversation_ids:
+            self.invalidate(conversation_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def summarize(conversation: Conversation) -> ConversationSummary:
+    """Summary of a conversation without its plan"""
+    return ConversationSummary(
+        id=conversation.id,
+        user_message=conversation.user_message,
+        bot_response=conversation.bot_response,
+        has_plan=conversation.project_plan is not None,
+        plan_version=conversation.plan_version,
+        base_conversation_id=conversation.base_conversation_id,
+        timestamp=conversation.timestamp
+    )
@@ -0,0 +1,120 @@
+"""Strict JSON schema response formats generated from the plan models"""
+from app.models.chat import CamelCaseModel, PlanPatchOperation, ProjectPlan
+from app.prompts.system_prompts import SystemPrompt
+from pydantic import ValidationError
+from typing import Dict, List, Optional, Type
+import copy
+
+
+class PlanReply(CamelCaseModel):
+    """Response to a first message: always a plan"""
+    message: str
+    project_plan: ProjectPlan
+
+
+class ConversationReply(CamelCaseModel):
+    """Follow-up response, with the full updated plan if it changed"""
+    message: str
+    project_plan: Optional[ProjectPlan]
+
+
+class RefinementReply(CamelCaseModel):
+    """Follow-up response, with patch operations if the plan changed"""
+    message: str
+    patch: Optional[List[PlanPatchOperation]]
+
+
+# Response model of each system prompt
+REPLY_MODELS: Dict[str, Type[CamelCaseModel]] = {
+    "basic": PlanReply,
+    "detailed": PlanReply,
+    "conversation": ConversationReply,
+    "refinement": RefinementReply,
+}
+
+# Fields the model must not produce: completion is tracked by the user
+EXCLUDED_FIELDS = {"completed"}
+
+
+def strict_schema(model: Type[CamelCaseModel]) -> dict:
+    """JSON schema of a model in the subset accepted by strict structured outputs.
+
+    Every object lists all of its properties as required and forbids
+    additional ones; optional fields stay nullable instead. Defaults and
+    titles are dropped, as strict mode does not support them.
+    """
+    schema = copy.deepcopy(model.model_json_schema(by_alias=True))
+
+    def visit(node):
+        if isinstance(node, dict):
+            node.pop("title", None)
+            node.pop("default", None)
+            properties = node.get("properties")
+            if properties is not None:
+                for name in EXCLUDED_FIELDS:
+                    properties.pop(name, None)
+                node["required"] = list(properties)
+                node["additionalProperties"] = False
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+
+    visit(schema)
+    return schema
+
+
+class StructuredOutput:
+    """Ask for schema-constrained responses and parse them straight into models.
+
+    The schemas are built once, on first use. When a response does not
+    validate (e.g. it was cut off by max_tokens, or the endpoint ignored the
+    response format), the caller falls back to the heuristic JSON extraction.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._formats: Optional[Dict[str, dict]] = None
+        self.parsed = 0
+        self.fallbacks = 0
+
+    def response_format(self, system_prompt: SystemPrompt) -> Optional[dict]:
+        """The `response_format` request parameter, None if disabled"""
+        if not self.enabled:
+            return None
+        return self.prewarm().get(system_prompt.name)
+
+    def prewarm(self) -> Dict[str, dict]:
+        """Build the response formats of all system prompts"""
+        if self._formats is None:
+            self._formats = {
+                name: {
+                    "type": "json_schema",
+                    "json_schema": {"name": f"{name}_reply", "strict": True, "schema": strict_schema(model)}
+                }
+                for name, model in REPLY_MODELS.items()
+            }
+        return self._formats
+
+    def parse(self, system_prompt: SystemPrompt, content: Optional[str]) -> Optional[CamelCaseModel]:
+        """Validate a schema-constrained response, None if it does not match"""
+        model = REPLY_MODELS.get(system_prompt.name)
+        if model is None or not content:
+            self.fallbacks += 1
+            return None
+        try:
+            reply = model.model_validate_json(content)
+        except ValidationError as e:
+            print(f"Structured response did not match the schema, extracting JSON instead: {e.error_count()} errors")
+            self.fallbacks += 1
+            return None
+        self.parsed += 1
+        return reply
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "parsed": self.parsed,
+            "fallbacks": self.fallbacks
+        }
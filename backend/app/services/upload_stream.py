@@ -0,0 +1,102 @@
+"""Incremental multipart/form-data parsing of a single file field"""
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+from typing import AsyncIterator, Dict, List, Optional
+
+
+class UploadFormError(ValueError):
+    """The request body is not a multipart form with the expected file field"""
+
+
+class MultipartFileStream:
+    """Read one file field of a multipart request as it arrives.
+
+    Unlike UploadFile, nothing is spooled: `start()` reads until the part
+    headers of the file field are parsed, then `chunks()` yields its bytes
+    straight from the request stream. Other fields are skipped.
+    """
+
+    def __init__(self, request: Request, field_name: str = "file"):
+        self.field_name = field_name.encode("utf-8")
+        self.filename: Optional[str] = None
+        self.content_type = "application/octet-stream"
+        self._body = request.stream().__aiter__()
+        self._pending: List[bytes] = []
+        self._in_file = False
+        self._file_done = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise UploadFormError("Expected a multipart/form-data body")
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    async def start(self):
+        """Read until the file field begins, raise UploadFormError if there is none"""
+        while self.filename is None:
+            if not await self._read():
+                raise UploadFormError(f"Missing file field '{self.field_name.decode()}'")
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Bytes of the file field, in the order they arrive"""
+        while True:
+            if self._pending:
+                pending, self._pending = self._pending, []
+                for chunk in pending:
+                    yield chunk
+            if self._file_done:
+                return
+            if not await self._read():
+                raise UploadFormError("Request body ended inside the file field")
+
+    async def _read(self) -> bool:
+        try:
+            chunk = await self._body.__anext__()
+        except StopAsyncIteration:
+            return False
+        if chunk:
+            self._parser.write(chunk)
+        return True
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if self.filename is None and options.get(b"name") == self.field_name and b"filename" in options:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            content_type = self._headers.get(b"content-type")
+            if content_type:
+                self.content_type = content_type.decode("latin-1")
+            self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._file_done = True
@@ -0,0 +1,335 @@
+"""OpenAI client with a tuned transport, deadlines, jittered retries, hedged requests and model routing"""
+from app.services.model_router import LatencyTracker, ModelRouter
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import os
+import random
+import threading
+import time
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+# Samples needed before the first-token percentile is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+
+
+def create_openai_client(read_timeout: float = 120.0) -> "AsyncOpenAI":
+    """AsyncOpenAI client on a shared, explicitly sized keep-alive connection pool"""
+    # openai and httpx take a large share of the startup time, so they are imported on first use
+    from openai import AsyncOpenAI
+    import httpx
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "30"))
+        ),
+        timeout=httpx.Timeout(
+            read_timeout,
+            connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+        )
+    )
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=http_client,
+        # Retries are handled by UpstreamClient within the request deadline
+        max_retries=0
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection problems, rate limits and server errors are worth another attempt"""
+    import openai
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class UpstreamClient:
+    """Chat completions with per-class deadlines, retries and optional hedging.
+
+    Each request class ("conversation", "basic", "detailed") has its own
+    deadline covering retries and, for streams, the whole response. Failed
+    attempts are retried with full-jitter exponential backoff while the
+    deadline allows. With hedging enabled, an attempt that has not produced
+    its first token by the configured percentile of recent first-token
+    latencies is raced against a second attempt. Unless a model is given,
+    each attempt goes to the model the router picks for the request class,
+    skipping models that already failed for the same request.
+    """
+
+    def __init__(
+        self,
+        client: Optional["AsyncOpenAI"] = None,
+        deadlines: Optional[Dict[str, float]] = None,
+        max_retries: Optional[int] = None,
+        retry_base_delay: Optional[float] = None,
+        hedge_enabled: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_delay: Optional[float] = None,
+        router: Optional[ModelRouter] = None
+    ):
+        self.deadlines = deadlines or {
+            "conversation": float(os.getenv("UPSTREAM_DEADLINE_CONVERSATION_SECONDS", "30")),
+            "basic": float(os.getenv("UPSTREAM_DEADLINE_BASIC_SECONDS", "60")),
+            "detailed": float(os.getenv("UPSTREAM_DEADLINE_DETAILED_SECONDS", "120")),
+        }
+        # Built on first use or by prewarm(), not at import time
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.router = router or ModelRouter.from_env()
+        if max_retries is None:
+            max_retries = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+        if retry_base_delay is None:
+            retry_base_delay = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY_MS", "250")) / 1000
+        if hedge_enabled is None:
+            hedge_enabled = os.getenv("UPSTREAM_HEDGE_ENABLED", "false").lower() == "true"
+        if hedge_percentile is None:
+            hedge_percentile = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95"))
+        if hedge_min_delay is None:
+            hedge_min_delay = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY_MS", "500")) / 1000
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = 4.0
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        # "<request class>:<stream|full>" -> first-token (or full response) latencies
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        if self._client is None:
+            # prewarm() may be building it in a worker thread at the same time
+            with self._client_lock:
+                if self._client is None:
+                    self._client = create_openai_client(read_timeout=max(self.deadlines.values()))
+        return self._client
+
+    @client.setter
+    def client(self, client: "AsyncOpenAI"):
+        self._client = client
+
+    async def prewarm(self):
+        """Build the client in a worker thread and open a pooled connection to the API"""
+        client = await asyncio.to_thread(lambda: self.client)
+        try:
+            async with asyncio.timeout(self.deadlines["conversation"]):
+                await client.models.list()
+        except Exception as e:
+            print(f"Upstream prewarm request failed: {e}")
+
+    async def complete(self, request_class: str, **kwargs) -> Any:
+        """Create a chat completion within the deadline of the request class"""
+        self.requests += 1
+        deadline = self._deadline(request_class)
+        try:
+            async with asyncio.timeout_at(deadline):
+                model, response = await self._with_retries(
+                    f"{request_class}:full",
+                    self._routed(request_class, kwargs, lambda arguments: self.client.chat.completions.create(**arguments)),
+                    deadline
+                )
+        except TimeoutError:
+            self.deadline_exceeded += 1
+            raise
+        self.router.record_usage(request_class, model, getattr(response, "usage", None))
+        return response
+
+    async def stream(self, request_class: str, **kwargs) -> AsyncIterator[Any]:
+        """Stream chat completion chunks within the deadline of the request class.
+
+        Attempts are retried or hedged only until the first chunk arrives,
+        after that the stream is committed to one upstream response.
+        """
+        self.requests += 1
+        started = time.monotonic()
+        deadline = self._deadline(request_class)
+        try:
+            async with asyncio.timeout_at(deadline):
+                model, (stream, iterator, first_chunk) = await self._with_retries(
+                    f"{request_class}:stream",
+                    self._routed(request_class, kwargs, self._open_stream, streamed=True),
+                    deadline,
+                    discard=lambda result: result[1][0].close()
+                )
+        except TimeoutError:
+            self.deadline_exceeded += 1
+            raise
+
+        try:
+            if first_chunk is None:
+                return
+            yield first_chunk
+            while True:
+                # No yield inside the timeout scope, the consumer's time does not count
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    self.router.record_stream_end(request_class, model, time.monotonic() - started)
+                    return
+                except TimeoutError:
+                    self.deadline_exceeded += 1
+                    raise
+                if getattr(chunk, "usage", None):
+                    self.router.record_usage(request_class, model, chunk.usage)
+                yield chunk
+        finally:
+            await stream.close()
+
+    async def _open_stream(self, kwargs: dict) -> tuple[Any, AsyncIterator[Any], Any]:
+        """Start a streamed completion and wait for its first chunk"""
+        stream = await self.client.chat.completions.create(stream=True, **kwargs)
+        iterator = stream.__aiter__()
+        try:
+            first_chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+        except BaseException:
+            await stream.close()
+            raise
+        return stream, iterator, first_chunk
+
+    def _routed(
+        self,
+        request_class: str,
+        kwargs: dict,
+        create: Callable[[dict], Awaitable[Any]],
+        streamed: bool = False
+    ) -> Callable[[], Awaitable[tuple[str, Any]]]:
+        """An attempt factory that sends each attempt to a routed model and returns (model, result)"""
+        failed: Set[str] = set()
+
+        async def attempt() -> tuple[str, Any]:
+            model = kwargs.get("model") or self.router.select(request_class, exclude=failed)
+            started = time.monotonic()
+            try:
+                result = await create({**kwargs, "model": model})
+            except Exception as e:
+                # Client errors such as an invalid request say nothing about the model's health
+                if is_retryable(e):
+                    # A retry, if any, goes to the next model of the route
+                    failed.add(model)
+                    self.router.record_error(request_class, model)
+                raise
+            self.router.record_success(request_class, model, time.monotonic() - started, streamed)
+            return model, result
+
+        return attempt
+
+    async def _with_retries(
+        self,
+        key: str,
+        attempt: Callable[[], Awaitable[Any]],
+        deadline: float,
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Any:
+        """Run (hedged) attempts, retrying retryable errors with full-jitter backoff"""
+        loop = asyncio.get_running_loop()
+        for retry in range(self.max_retries + 1):
+            try:
+                return await self._hedged(key, attempt, discard)
+            except Exception as e:
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** retry))
+                if retry == self.max_retries or not is_retryable(e) or loop.time() + delay >= deadline:
+                    raise
+                print(f"Upstream request failed, retrying in {delay:.2f}s: {e}")
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def _hedged(
+        self,
+        key: str,
+        attempt: Callable[[], Awaitable[Any]],
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Any:
+        """Run an attempt, racing a second one if the first is slower than usual"""
+        latencies = self._latencies.setdefault(key, LatencyTracker())
+        primary = asyncio.create_task(self._timed(latencies, attempt))
+        delay = self._hedge_delay(latencies)
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except BaseException:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        hedge = asyncio.create_task(self._timed(latencies, attempt))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedge:
+                        self.hedge_wins += 1
+                    # The other attempt lost the race, close its response if it has one
+                    for other in done - {task}:
+                        if discard and other.exception() is None:
+                            await discard(other.result())
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _timed(self, latencies: LatencyTracker, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await attempt()
+        latencies.add(time.monotonic() - started)
+        return result
+
+    def _hedge_delay(self, latencies: LatencyTracker) -> Optional[float]:
+        """How long to wait before hedging, or None if hedging is off or not calibrated yet"""
+        if not self.hedge_enabled or len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.hedge_min_delay, latencies.percentile(self.hedge_percentile))
+
+    def _deadline(self, request_class: str) -> float:
+        timeout = self.deadlines.get(request_class, self.deadlines["basic"])
+        return asyncio.get_running_loop().time() + timeout
+
+    async def close(self):
+        """Close the pooled connections"""
+        if self._client is not None:
+            await self._client.close()
+
+    def stats(self) -> dict:
+        """Retry, hedging and first-token latency counters"""
+        latencies = {}
+        for key, tracker in self._latencies.items():
+            latencies[key] = {
+                **tracker.summary(),
+                "p99Ms": round(tracker.percentile(99) * 1000, 1) if len(tracker) else None,
+            }
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedgeWins": self.hedge_wins,
+            "deadlineExceeded": self.deadline_exceeded,
+            "hedgeEnabled": self.hedge_enabled,
+            "hedgePercentile": self.hedge_percentile,
+            "deadlinesSeconds": self.deadlines,
+            "firstTokenLatency": latencies
+        }
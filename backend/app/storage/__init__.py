@@ -0,0 +1,23 @@
+from app.storage.base import ConversationStore, PlanVersionConflict, TaskUpdate
+from app.storage.memory_store import InMemoryConversationStore
+import os
+
+
+def create_conversation_store() -> ConversationStore:
+    """Create the conversation store selected by the CONVERSATION_STORE env var"""
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    # Conversations kept as pydantic models, the rest are stored compactly
+    max_materialized = int(os.getenv("STORE_MATERIALIZED_MAX_ENTRIES", "1024"))
+
+    if backend == "sqlite":
+        from app.storage.sqlite_store import SQLiteConversationStore
+        return SQLiteConversationStore(
+            path=os.getenv("SQLITE_PATH", "data/conversations.db"),
+            batch_size=int(os.getenv("SQLITE_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("SQLITE_FLUSH_INTERVAL_MS", "50")) / 1000,
+            max_materialized=max_materialized
+        )
+
+    if backend != "memory":
+        raise ValueError(f"Unknown CONVERSATION_STORE: {backend}")
+    return InMemoryConversationStore(max_materialized)
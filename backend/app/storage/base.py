@@ -0,0 +1,137 @@
+from abc import ABC, abstractmethod
+from app.models.chat import Conversation
+from app.storage.compact import CompactConversation
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+
+# (time_block_index, task_index, completed)
+TaskUpdate = tuple[int, int, bool]
+
+
+class PlanVersionConflict(Exception):
+    """Raised when a plan update is based on an outdated plan version"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Plan version conflict, current version is {current_version}")
+        self.current_version = current_version
+
+
+class ConversationStore(ABC):
+    """Storage interface for conversations.
+
+    Implementations keep an id index for O(1) lookups and a per-user index
+    ordered by insertion, so routes scale with the size of a lookup instead
+    of the total history.
+    """
+
+    @abstractmethod
+    def add(self, user: str, conversation: Conversation) -> None:
+        """Append a conversation to the user's history"""
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Get a conversation by id"""
+
+    @abstractmethod
+    def get_for_user(self, conversation_id: str, user: str) -> Optional[Conversation]:
+        """Get a conversation by id if it belongs to the user"""
+
+    @abstractmethod
+    def list(self, user: str) -> List[Conversation]:
+        """All conversations of a user, oldest first"""
+
+    @abstractmethod
+    def recent(self, user: str, limit: int) -> List[Conversation]:
+        """The last `limit` conversations of a user, oldest first"""
+
+    @abstractmethod
+    def page(
+        self,
+        user: str,
+        limit: int,
+        before: Optional[str] = None,
+        since: Optional[str] = None
+    ) -> Optional[tuple[List[Conversation], bool]]:
+        """A page of a user's conversations, oldest first, and whether more exist.
+
+        Without a cursor this is the newest `limit` conversations. `before`
+        pages backwards from a conversation id, `since` returns conversations
+        newer than it. Returns None if the cursor is not one of the user's
+        conversations.
+        """
+
+    def conversation_ids(self, user: str) -> List[str]:
+        """Ids of a user's conversations, oldest first"""
+        return [conversation.id for conversation in self.list(user)]
+
+    @abstractmethod
+    def revision(self, user: str) -> int:
+        """Counter that changes whenever the user's history changes"""
+
+    @abstractmethod
+    def count(self, user: str) -> int:
+        """Number of conversations of a user"""
+
+    @abstractmethod
+    def has_plan(self, user: str) -> bool:
+        """True if any conversation of the user has a project plan"""
+
+    @abstractmethod
+    def latest_plan(self, user: str) -> Optional[Conversation]:
+        """The most recent conversation of the user that has a project plan"""
+
+    @abstractmethod
+    def iter_conversations(
+        self,
+        user: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[tuple[str, Conversation]]:
+        """Lazily iterate over (user, conversation) pairs, oldest first per user.
+
+        Optionally limited to one user and to conversations created at or
+        after `since` and before `until`. Conversations filtered out are not
+        materialized.
+        """
+
+    @abstractmethod
+    def iter_plan_records(self) -> Iterator[tuple[str, CompactConversation]]:
+        """Lazily iterate over (user, compact record) of conversations with a plan.
+
+        For building indexes without materializing every conversation. A
+        record removed while iterating is not yielded anymore.
+        """
+
+    @abstractmethod
+    def import_conversations(self, entries: List[tuple[str, Conversation]]) -> int:
+        """Add (user, conversation) pairs whose conversation id is not stored yet.
+
+        Conversations that already exist are left untouched, so importing
+        the same data again is a no-op. Returns the number added.
+        """
+
+    @abstractmethod
+    def clear(self, user: str) -> bool:
+        """Remove all conversations of a user, False if the user is unknown"""
+
+    @abstractmethod
+    def update_tasks(
+        self,
+        conversation_id: str,
+        user: str,
+        updates: List[TaskUpdate],
+        expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        """Atomically apply task completion updates and return the new plan version.
+
+        Returns None if the conversation or any task is not found, in which
+        case nothing is applied. Raises PlanVersionConflict if
+        `expected_version` does not match the current plan version.
+        """
+
+    def load(self) -> None:
+        """Read persisted conversations into the indexes, once at startup before requests use the store"""
+
+    def close(self) -> None:
+        """Flush pending writes and release resources"""
@@ -0,0 +1,104 @@
+from app.models.chat import Conversation
+from array import array
+from typing import List, Optional
+import json
+import zlib
+
+
+class CompactConversation:
+    """A conversation at rest: its compressed JSON plus a task completion bitmap.
+
+    A pydantic Conversation with a plan is a tree of hundreds of objects;
+    this keeps one bytes object and two small arrays instead. Task
+    completion lives in `completed`, one bit per task in timeline order,
+    so it can change without re-serializing the plan. The completion flags
+    inside `data` are those at creation time and are overridden on
+    materialization.
+    """
+    __slots__ = ("id", "timestamp", "data", "block_offsets", "completed", "plan_version")
+
+    def __init__(self, conversation: Conversation):
+        self.id = conversation.id
+        # Creation time as a POSIX timestamp, for time range filters without decompressing
+        self.timestamp = conversation.timestamp.timestamp()
+        # Fastest zlib level, plans are repetitive JSON and compress well anyway
+        self.data = zlib.compress(conversation.model_dump_json().encode("utf-8"), 1)
+        self.plan_version = conversation.plan_version
+        plan = conversation.project_plan
+        self._set_tasks(
+            [[task.completed for task in time_block.tasks] for time_block in plan.timeline] if plan else None
+        )
+
+    @classmethod
+    def from_json(cls, data: str, timestamp: float) -> "CompactConversation":
+        """A record from a conversation's model_dump_json output, without validating it into a model"""
+        values = json.loads(data)
+        record = cls.__new__(cls)
+        record.id = values["id"]
+        record.timestamp = timestamp
+        record.data = zlib.compress(data.encode("utf-8"), 1)
+        record.plan_version = values.get("plan_version", 0)
+        plan = values.get("project_plan")
+        record._set_tasks(
+            [[task.get("completed", False) for task in time_block["tasks"]] for time_block in plan["timeline"]]
+            if plan else None
+        )
+        return record
+
+    def _set_tasks(self, task_states: Optional[List[List[bool]]]):
+        """Build the block offsets and completion bitmap from the completed flags per time block"""
+        self.block_offsets: Optional[array] = None
+        self.completed: Optional[bytearray] = None
+        if task_states is None:
+            return
+        # block_offsets[i] is the index of the first task of time block i
+        offsets = array("I", [0])
+        for states in task_states:
+            offsets.append(offsets[-1] + len(states))
+        self.block_offsets = offsets
+        self.completed = bytearray((offsets[-1] + 7) // 8)
+        index = 0
+        for states in task_states:
+            for completed in states:
+                if completed:
+                    self.completed[index >> 3] |= 1 << (index & 7)
+                index += 1
+
+    @property
+    def has_plan(self) -> bool:
+        return self.block_offsets is not None
+
+    def task_index(self, time_block_index: int, task_index: int) -> Optional[int]:
+        """Bit index of a task, None if it does not exist"""
+        offsets = self.block_offsets
+        if offsets is None or not 0 <= time_block_index < len(offsets) - 1:
+            return None
+        index = offsets[time_block_index] + task_index
+        if not offsets[time_block_index] <= index < offsets[time_block_index + 1]:
+            return None
+        return index
+
+    def is_completed(self, index: int) -> bool:
+        return bool(self.completed[index >> 3] & (1 << (index & 7)))
+
+    def set_completed(self, index: int, completed: bool):
+        if completed:
+            self.completed[index >> 3] |= 1 << (index & 7)
+        else:
+            self.completed[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def json_data(self) -> dict:
+        """The stored JSON as plain data, much cheaper than materializing; completion flags are those at creation"""
+        return json.loads(zlib.decompress(self.data))
+
+    def materialize(self) -> Conversation:
+        """Build the pydantic Conversation with the current completion state"""
+        conversation = Conversation.model_validate_json(zlib.decompress(self.data))
+        conversation.plan_version = self.plan_version
+        if conversation.project_plan:
+            index = 0
+            for time_block in conversation.project_plan.timeline:
+                for task in time_block.tasks:
+                    task.completed = self.is_completed(index)
+                    index += 1
+        return conversation
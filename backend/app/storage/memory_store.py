@@ -0,0 +1,238 @@
+from app.models.chat import Conversation
+from app.storage.base import ConversationStore, PlanVersionConflict, TaskUpdate
+from app.storage.compact import CompactConversation
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Indexed in-memory conversation store (data is lost on restart).
+
+    Conversations are kept as CompactConversation records and materialized
+    as pydantic models on read. The most recently used models are cached,
+    so hot histories are not parsed on every request.
+    """
+
+    def __init__(self, max_materialized: int = 1024):
+        # Id index: {conversation_id: (user_id, CompactConversation)}
+        self._by_id: Dict[str, tuple[str, CompactConversation]] = {}
+        # Per-user index ordered by insertion: {user_id: [CompactConversation, ...]}
+        self._by_user: Dict[str, List[CompactConversation]] = {}
+        # Number of conversations with a project plan per user
+        self._plan_counts: Dict[str, int] = {}
+        # Most recent conversation with a project plan per user
+        self._latest_plans: Dict[str, CompactConversation] = {}
+        # Position of each conversation in its user's list, for cursors
+        self._positions: Dict[str, int] = {}
+        # History revision per user, bumped on every change and kept across clears
+        self._revisions: Dict[str, int] = {}
+        # Recently used pydantic models: {conversation_id: Conversation}
+        self.max_materialized = max_materialized
+        self._materialized: OrderedDict[str, Conversation] = OrderedDict()
+
+    def _materialize(self, record: CompactConversation) -> Conversation:
+        conversation = self._materialized.get(record.id)
+        if conversation is not None:
+            self._materialized.move_to_end(record.id)
+            return conversation
+        conversation = record.materialize()
+        self._cache_materialized(conversation)
+        return conversation
+
+    def _materialize_all(self, records: List[CompactConversation]) -> List[Conversation]:
+        return [self._materialize(record) for record in records]
+
+    def _cache_materialized(self, conversation: Conversation):
+        if self.max_materialized <= 0:
+            return
+        self._materialized[conversation.id] = conversation
+        self._materialized.move_to_end(conversation.id)
+        while len(self._materialized) > self.max_materialized:
+            self._materialized.popitem(last=False)
+
+    def add(self, user: str, conversation: Conversation) -> None:
+        self._add_record(user, CompactConversation(conversation))
+        # The new conversation is about to be returned and used as context
+        self._cache_materialized(conversation)
+
+    def _add_record(self, user: str, record: CompactConversation):
+        self._by_id[record.id] = (user, record)
+        user_conversations = self._by_user.setdefault(user, [])
+        self._positions[record.id] = len(user_conversations)
+        user_conversations.append(record)
+        self._bump_revision(user)
+        if record.has_plan:
+            self._plan_counts[user] = self._plan_counts.get(user, 0) + 1
+            self._latest_plans[user] = record
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        entry = self._by_id.get(conversation_id)
+        return self._materialize(entry[1]) if entry else None
+
+    def get_for_user(self, conversation_id: str, user: str) -> Optional[Conversation]:
+        entry = self._by_id.get(conversation_id)
+        if entry and entry[0] == user:
+            return self._materialize(entry[1])
+        return None
+
+    def list(self, user: str) -> List[Conversation]:
+        return self._materialize_all(self._by_user.get(user, []))
+
+    def recent(self, user: str, limit: int) -> List[Conversation]:
+        if limit <= 0:
+            return []
+        return self._materialize_all(self._by_user.get(user, [])[-limit:])
+
+    def page(
+        self,
+        user: str,
+        limit: int,
+        before: Optional[str] = None,
+        since: Optional[str] = None
+    ) -> Optional[tuple[List[Conversation], bool]]:
+        conversations = self._by_user.get(user, [])
+        if before is not None:
+            end = self._position(before, user)
+            if end is None:
+                return None
+            start = max(0, end - limit)
+            return self._materialize_all(conversations[start:end]), start > 0
+        if since is not None:
+            position = self._position(since, user)
+            if position is None:
+                return None
+            end = position + 1 + limit
+            return self._materialize_all(conversations[position + 1:end]), end < len(conversations)
+        start = max(0, len(conversations) - limit)
+        return self._materialize_all(conversations[start:]), start > 0
+
+    def conversation_ids(self, user: str) -> List[str]:
+        return [record.id for record in self._by_user.get(user, [])]
+
+    def _position(self, conversation_id: str, user: str) -> Optional[int]:
+        entry = self._by_id.get(conversation_id)
+        if not entry or entry[0] != user:
+            return None
+        return self._positions[conversation_id]
+
+    def revision(self, user: str) -> int:
+        return self._revisions.get(user, 0)
+
+    def _bump_revision(self, user: str):
+        self._revisions[user] = self._revisions.get(user, 0) + 1
+
+    def count(self, user: str) -> int:
+        return len(self._by_user.get(user, []))
+
+    def has_plan(self, user: str) -> bool:
+        return self._plan_counts.get(user, 0) > 0
+
+    def latest_plan(self, user: str) -> Optional[Conversation]:
+        record = self._latest_plans.get(user)
+        return self._materialize(record) if record else None
+
+    def iter_conversations(
+        self,
+        user: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[tuple[str, Conversation]]:
+        start = since.timestamp() if since else None
+        end = until.timestamp() if until else None
+        # Users are listed up front, the consumer may add conversations between items
+        users = [user] if user is not None else list(self._by_user)
+        for owner in users:
+            # A clear replaces the list, so this keeps iterating over the old one
+            for record in self._by_user.get(owner, []):
+                if (start is not None and record.timestamp < start) or (end is not None and record.timestamp >= end):
+                    continue
+                # Not cached, a full scan would evict the hot set
+                yield owner, self._materialized.get(record.id) or record.materialize()
+
+    def iter_plan_records(self) -> Iterator[tuple[str, CompactConversation]]:
+        for owner in list(self._by_user):
+            for record in self._by_user.get(owner, []):
+                # The consumer may pause between items, skip records cleared in the meantime
+                if record.has_plan and self._by_id.get(record.id, (None, None))[1] is record:
+                    yield owner, record
+
+    def import_conversations(self, entries: List[tuple[str, Conversation]]) -> int:
+        return len(self._import(entries))
+
+    def _import(self, entries: List[tuple[str, Conversation]]) -> List[tuple[str, Conversation]]:
+        """Add the conversations that are not stored yet and return them"""
+        added = []
+        unordered = set()
+        for user, conversation in entries:
+            if conversation.id in self._by_id:
+                continue
+            # Not materialized, a bulk import would evict the hot set
+            record = CompactConversation(conversation)
+            records = self._by_user.get(user)
+            if records and records[-1].timestamp > record.timestamp:
+                unordered.add(user)
+            self._add_record(user, record)
+            added.append((user, conversation))
+        for user in unordered:
+            self._sort_history(user)
+        return added
+
+    def _sort_history(self, user: str):
+        """Restore the oldest-first order of a history after older conversations were imported"""
+        # Stable, so conversations with equal timestamps keep their order, as in the SQLite load
+        records = sorted(self._by_user[user], key=lambda record: record.timestamp)
+        # Replaced rather than sorted in place, like clear(), for iterations in progress
+        self._by_user[user] = records
+        for position, record in enumerate(records):
+            self._positions[record.id] = position
+        latest = next((record for record in reversed(records) if record.has_plan), None)
+        if latest is not None:
+            self._latest_plans[user] = latest
+
+    def clear(self, user: str) -> bool:
+        if user not in self._by_user:
+            return False
+        for record in self._by_user[user]:
+            self._by_id.pop(record.id, None)
+            self._positions.pop(record.id, None)
+            self._materialized.pop(record.id, None)
+        self._by_user[user] = []
+        self._bump_revision(user)
+        self._plan_counts.pop(user, None)
+        self._latest_plans.pop(user, None)
+        return True
+
+    def update_tasks(
+        self,
+        conversation_id: str,
+        user: str,
+        updates: List[TaskUpdate],
+        expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        entry = self._by_id.get(conversation_id)
+        if not entry or entry[0] != user or not entry[1].has_plan:
+            return None
+        record = entry[1]
+        if expected_version is not None and expected_version != record.plan_version:
+            raise PlanVersionConflict(record.plan_version)
+
+        # Validate all indices before applying anything
+        indices = [record.task_index(time_block_index, task_index) for time_block_index, task_index, _ in updates]
+        if None in indices:
+            return None
+
+        for index, (_, _, completed) in zip(indices, updates):
+            record.set_completed(index, completed)
+        record.plan_version += 1
+
+        # Keep a cached model in step instead of dropping it
+        conversation = self._materialized.get(conversation_id)
+        if conversation is not None:
+            timeline = conversation.project_plan.timeline
+            for time_block_index, task_index, completed in updates:
+                timeline[time_block_index].tasks[task_index].completed = completed
+            conversation.plan_version = record.plan_version
+
+        self._bump_revision(user)
+        return record.plan_version
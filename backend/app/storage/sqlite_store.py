@@ -0,0 +1,271 @@
+from app.models.chat import Conversation
+from app.storage.base import TaskUpdate
+from app.storage.compact import CompactConversation
+from app.storage.memory_store import InMemoryConversationStore
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Rows read per fetch while loading or exporting the database
+LOAD_CHUNK_SIZE = 1000
+# Backoff between attempts to write a failed batch
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 5.0
+# Attempts per batch after close() before its writes are given up
+STOP_RETRIES = 5
+# How long an export waits for queued writes before falling back to the in-memory records
+SYNC_TIMEOUT = 5.0
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp);
+"""
+
+
+class SQLiteConversationStore(InMemoryConversationStore):
+    """Persistent conversation store backed by SQLite in WAL mode.
+
+    Reads are served from the in-memory indexes, which `load` fills from
+    the database at startup, off the import path. Writes are queued and flushed by a background
+    thread in batched transactions, so request handlers never block on disk.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.05, max_materialized: int = 1024):
+        super().__init__(max_materialized)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._loaded = False
+        self.write_failures = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.executescript(_SCHEMA)
+        finally:
+            connection.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-conversation-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def load(self) -> None:
+        """Rebuild the in-memory indexes from the database.
+
+        Rows are fetched in chunks and turned into compact records straight
+        from their JSON, without building a pydantic model for each.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        connection = self._connect()
+        try:
+            self._load_rows(connection)
+        finally:
+            connection.close()
+
+    def _load_rows(self, connection: sqlite3.Connection):
+        cursor = connection.execute(
+            "SELECT user_id, timestamp, data FROM conversations ORDER BY user_id, timestamp, rowid"
+        )
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+            if not rows:
+                break
+            for user, timestamp, data in rows:
+                try:
+                    record = CompactConversation.from_json(data, timestamp)
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error("Skipping unreadable conversation row of %s: %s", user, e)
+                    continue
+                self._add_record(user, record)
+
+    def add(self, user: str, conversation: Conversation) -> None:
+        super().add(user, conversation)
+        self._enqueue_upsert(user, conversation)
+
+    def import_conversations(self, entries: List[tuple[str, Conversation]]) -> int:
+        added = self._import(entries)
+        for user, conversation in added:
+            self._enqueue_upsert(user, conversation)
+        return len(added)
+
+    def clear(self, user: str) -> bool:
+        cleared = super().clear(user)
+        if cleared:
+            self._queue.put(("delete_user", user))
+        return cleared
+
+    def update_tasks(
+        self,
+        conversation_id: str,
+        user: str,
+        updates: List[TaskUpdate],
+        expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        version = super().update_tasks(conversation_id, user, updates, expected_version)
+        if version is not None:
+            self._enqueue_upsert(user, self.get(conversation_id))
+        return version
+
+    def _enqueue_upsert(self, user: str, conversation: Conversation):
+        # Serialize now so the writer thread never touches live model objects
+        self._queue.put((
+            "upsert",
+            (conversation.id, user, conversation.timestamp.timestamp(), conversation.model_dump_json())
+        ))
+
+    def iter_conversations(
+        self,
+        user: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[tuple[str, Conversation]]:
+        """Filtered in SQL with the user and timestamp indexes, oldest first.
+
+        Queued writes are committed first; if the writer cannot catch up,
+        the in-memory records are scanned instead.
+        """
+        if not self._wait_for_writes(SYNC_TIMEOUT):
+            yield from super().iter_conversations(user, since, until)
+            return
+        conditions, parameters = [], []
+        if user is not None:
+            conditions.append("user_id = ?")
+            parameters.append(user)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            parameters.append(since.timestamp())
+        if until is not None:
+            conditions.append("timestamp < ?")
+            parameters.append(until.timestamp())
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        connection = self._connect()
+        try:
+            cursor = connection.execute(
+                f"SELECT id, user_id, data FROM conversations {where}ORDER BY timestamp, rowid", parameters
+            )
+            while True:
+                rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+                if not rows:
+                    break
+                for conversation_id, owner, data in rows:
+                    # Cleared while iterating, the delete may not be written yet
+                    if conversation_id not in self._by_id:
+                        continue
+                    yield owner, Conversation.model_validate_json(data)
+        finally:
+            connection.close()
+
+    def _wait_for_writes(self, timeout: float) -> bool:
+        """Block until the writes queued so far are committed, False on timeout or after close()"""
+        if self._closed:
+            return False
+        done = threading.Event()
+        self._queue.put(("sync", done))
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(("stop", None))
+        self._writer.join()
+
+    def _write_loop(self):
+        connection = self._connect()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                # Collect more writes until the batch is full or the interval has passed
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and batch[-1][0] not in ("sync", "stop"):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                self._write_with_retry(connection, batch)
+                if batch[-1][0] == "sync":
+                    batch[-1][1].set()
+                if batch[-1][0] == "stop":
+                    return
+        finally:
+            connection.close()
+
+    def _write_with_retry(self, connection: sqlite3.Connection, batch: List[tuple]):
+        """Write a batch, retrying with backoff until it is committed.
+
+        The writes were already acknowledged to clients, so a failing batch
+        is kept rather than dropped; later writes wait in the queue, in
+        order. Only once the store is closing is it given up after a few
+        attempts.
+        """
+        writes = sum(1 for op, _ in batch if op not in ("sync", "stop"))
+        delay = RETRY_BASE_DELAY
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self._write_batch(connection, batch)
+            except sqlite3.Error as e:
+                self.write_failures += 1
+                if self._closed and attempt >= STOP_RETRIES:
+                    logger.error("Giving up on %d conversation writes at shutdown after %d attempts: %s", writes, attempt, e)
+                    return
+                logger.warning("Failed to write %d conversation changes to SQLite, retrying in %.1fs: %s", writes, delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+                continue
+            if attempt > 1:
+                logger.warning("Wrote %d conversation changes to SQLite after %d attempts", writes, attempt)
+            return
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List[tuple]):
+        """Apply a batch of writes in a single transaction, in queue order"""
+        upserts: Dict[str, tuple] = {}
+
+        def flush_upserts():
+            if upserts:
+                connection.executemany(
+                    "INSERT INTO conversations (id, user_id, timestamp, data) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+                    list(upserts.values())
+                )
+                upserts.clear()
+
+        # Rolled back as a whole on error, so the batch can be written again
+        with connection:
+            for op, payload in batch:
+                if op == "upsert":
+                    # Repeated writes of the same conversation collapse to the last one
+                    upserts[payload[0]] = payload
+                elif op == "delete_user":
+                    flush_upserts()
+                    connection.execute("DELETE FROM conversations WHERE user_id = ?", (payload,))
+            flush_upserts()
@@ -0,0 +1,157 @@
+"""Cold start of the backend: import time, first healthy response and first plan.
+
+Every run starts a fresh interpreter, like a container scaled up from
+zero. Reported per run:
+- import: time to import app.main
+- health: from spawning uvicorn to the first 200 from /api/health
+- store ready: until /api/health reports the conversation store as loaded,
+  with --sqlite a copy of that database is loaded at every start
+- first plan: latency of the first message against the fake OpenAI
+  server, sent --delay-ms after the server became healthy (includes
+  building the OpenAI client unless it was prewarmed in that time)
+
+Run from the backend directory:
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --runs 10 --prewarm --delay-ms 500
+    python -m benchmarks.cold_start --runs 5 --sqlite data/conversations.db
+"""
+from benchmarks.load_test import percentile
+from typing import Dict, List, Optional
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+IMPORT_SCRIPT = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(port: int, method: str, path: str, body: Optional[dict] = None, headers: Optional[dict] = None):
+    """One HTTP request, (status, headers, body) or None if the server is not up yet"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body else None, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def measure_server(env: Dict[str, str], delay: float, timeout: float = 60.0) -> tuple[float, float, float]:
+    """Seconds from spawning the server to the first healthy response and to a loaded store, and of the first plan request"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            result = request(port, "GET", "/api/health")
+            if result and result[0] == 200:
+                health = time.perf_counter() - started
+                break
+            if time.perf_counter() - started > timeout or server.poll() is not None:
+                raise RuntimeError("Backend did not become healthy")
+            time.sleep(0.002)
+
+        while True:
+            result = request(port, "GET", "/api/health")
+            if result and result[0] == 200 and json.loads(result[2]).get("store") == "ready":
+                store_ready = time.perf_counter() - started
+                break
+            if time.perf_counter() - started > timeout or server.poll() is not None:
+                raise RuntimeError("Conversation store did not load")
+            time.sleep(0.002)
+
+        time.sleep(max(0.0, started + health + delay - time.perf_counter()))
+        sent = time.perf_counter()
+        result = request(port, "POST", "/api/conversations", {"message": "A habit tracker", "mode": "basic"},
+                         {"Content-Type": "application/json"})
+        if not result or result[0] != 200 or not json.loads(result[2]).get("projectPlan"):
+            raise RuntimeError(f"First message failed: {result[0] if result else 'no response'}")
+        first_plan = time.perf_counter() - sent
+        return health, store_ready, first_plan
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summary(values: List[float]) -> str:
+    ordered = sorted(values)
+    return (f"{percentile(ordered, 50) * 1000:>8.0f} {ordered[0] * 1000:>8.0f} {ordered[-1] * 1000:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--prewarm", action="store_true", help="Start the backend with STARTUP_PREWARM=true")
+    parser.add_argument("--delay-ms", type=float, default=0, help="Wait after the server is healthy before the first message")
+    parser.add_argument("--ttft-ms", type=float, default=0, help="Fake OpenAI time to first token")
+    parser.add_argument("--sqlite", help="Start with a copy of this SQLite conversation database")
+    args = parser.parse_args()
+
+    from benchmarks.load_test import start_fake_openai
+    fake_url = start_fake_openai(argparse.Namespace(ttft_ms=args.ttft_ms, tokens_per_sec=1e6, error_rate=0.0))
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": fake_url,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "fake"),
+        "SESSION_SECRET": "cold-start",
+        "STARTUP_PREWARM": "true" if args.prewarm else "false",
+        "PYTHONPATH": os.getcwd(),
+    }
+
+    workdir = tempfile.mkdtemp()
+    if args.sqlite:
+        env.update({"CONVERSATION_STORE": "sqlite", "SQLITE_PATH": os.path.join(workdir, "conversations.db")})
+    else:
+        env["CONVERSATION_STORE"] = "memory"
+
+    # One untimed run so the bytecode cache is written
+    measure_import(env)
+    imports, healths, stores, first_plans = [], [], [], []
+    try:
+        for _ in range(args.runs):
+            imports.append(measure_import(env))
+            if args.sqlite:
+                # A fresh copy each run, the first message of the previous run was written to it
+                shutil.copyfile(args.sqlite, env["SQLITE_PATH"])
+            health, store_ready, first_plan = measure_server(env, args.delay_ms / 1000)
+            healths.append(health)
+            stores.append(store_ready)
+            first_plans.append(first_plan)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.runs} runs, prewarm {'on' if args.prewarm else 'off'}, first message after {args.delay_ms:.0f} ms, "
+          f"store {args.sqlite or 'memory'}")
+    print(f"{'':<12} {'p50 ms':>8} {'min ms':>8} {'max ms':>8}")
+    print(f"{'import':<12} {summary(imports)}")
+    print(f"{'health':<12} {summary(healths)}")
+    print(f"{'store ready':<12} {summary(stores)}")
+    print(f"{'first plan':<12} {summary(first_plans)}")
+
+
+if __name__ == "__main__":
+    main()
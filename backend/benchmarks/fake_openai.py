@@ -0,0 +1,238 @@
+"""Local stand-in for the OpenAI chat completions API, for load tests without quota.
+
+Run from the backend directory and point the backend at it:
+    python -m benchmarks.fake_openai --port 8100 --ttft-ms 400 --tokens-per-sec 80
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+
+Responses are canned plans, patches or chat messages chosen from the system
+prompt of the request, streamed as server-sent events when requested.
+"""
+from app.prompts.system_prompts import (
+    CONVERSATION_PROMPT,
+    PLAN_REFINEMENT_PROMPT,
+    WEEKEND_PLANNER_DETAILED_PROMPT
+)
+from dataclasses import dataclass
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Set
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+
+# One token per word or punctuation character, close enough for pacing
+_TOKEN = re.compile(r'\s*\w+|\s*[^\w\s]|\s+')
+
+
+def _plan(blocks: int, tasks_per_block: int) -> dict:
+    names = ["Friday Evening", "Saturday Morning", "Saturday Afternoon", "Saturday Evening",
+             "Sunday Morning", "Sunday Afternoon", "Sunday Evening"]
+    return {
+        "message": "Here's a focused plan to get your project shipped this weekend!",
+        "projectPlan": {
+            "projectOverview": "A small web app with a FastAPI backend and a Svelte frontend.",
+            "techStack": ["Svelte", "FastAPI", "SQLite", "Docker"],
+            "timeline": [
+                {
+                    "timeBlock": names[b % len(names)],
+                    "tasks": [
+                        {
+                            "task": f"Step {t + 1} of {names[b % len(names)].lower()}: build and test one feature",
+                            "essential": t < 2,
+                            "estimatedTime": f"{t % 3 + 1} hours",
+                            "completed": False
+                        }
+                        for t in range(tasks_per_block)
+                    ]
+                }
+                for b in range(blocks)
+            ],
+            "tips": ["Ship the essential tasks first", "Deploy early", "Keep scope small"]
+        }
+    }
+
+
+DEFAULT_PAYLOADS: Dict[str, dict] = {
+    "basic": _plan(blocks=4, tasks_per_block=3),
+    "detailed": _plan(blocks=6, tasks_per_block=6),
+    "refinement": {
+        "message": "I moved the deployment to Sunday and added a testing task.",
+        "patch": [
+            {"op": "addTask", "blockIndex": 0, "task": "Write smoke tests", "essential": True, "estimatedTime": "1 hour"},
+            {"op": "updateTask", "blockIndex": 1, "taskIndex": 0, "estimatedTime": "2 hours"}
+        ]
+    },
+    "conversation": {
+        "message": "Good question! Focus on the essential tasks first and keep the rest optional.",
+        "projectPlan": None
+    }
+}
+
+
+@dataclass
+class FakeSettings:
+    ttft: float = 0.3  # Seconds until the first token
+    tokens_per_sec: float = 100.0
+    error_rate: float = 0.0  # Share of requests answered with a 500 or 429
+    fenced: bool = True  # Wrap JSON in a ```json fence like the real model often does
+
+
+def classify(messages: List[dict]) -> str:
+    """Pick the canned payload from the system prompt of the request"""
+    system = messages[0].get("content", "") if messages else ""
+    if system == PLAN_REFINEMENT_PROMPT:
+        return "refinement"
+    if system == CONVERSATION_PROMPT:
+        return "conversation"
+    if system == WEEKEND_PLANNER_DETAILED_PROMPT:
+        return "detailed"
+    return "basic"
+
+
+def tokenize(content: str) -> List[str]:
+    return _TOKEN.findall(content)
+
+
+def build_app(settings: Optional[FakeSettings] = None, payloads: Optional[Dict[str, dict]] = None) -> FastAPI:
+    settings = settings or FakeSettings()
+    payloads = {**DEFAULT_PAYLOADS, **(payloads or {})}
+    app = FastAPI(title="Fake OpenAI")
+    app.state.requests = 0
+
+    def render(kind: str, structured: bool = False) -> str:
+        if structured:
+            # Schema-constrained output is bare compact JSON
+            return json.dumps(payloads[kind])
+        content = json.dumps(payloads[kind], indent=2)
+        return f"```json\n{content}\n```" if settings.fenced else content
+
+    # Hashes of message prefixes seen before, like the provider's prompt cache
+    seen_prefixes: Set[int] = set()
+
+    def usage(messages: List[dict], tokens: int) -> dict:
+        # Cache hits are whole messages of an earlier prompt, from 1024 tokens on in steps of 128
+        prompt_tokens = 0
+        cached_tokens = 0
+        prefix: tuple = ()
+        for message in messages:
+            prompt_tokens += len(message.get("content") or "") // 4
+            prefix = (prefix, message.get("role"), message.get("content"))
+            if hash(prefix) in seen_prefixes:
+                cached_tokens = prompt_tokens
+            else:
+                seen_prefixes.add(hash(prefix))
+        cached_tokens = cached_tokens // 128 * 128 if cached_tokens >= 1024 else 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": tokens,
+            "total_tokens": prompt_tokens + tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        model = body.get("model", "gpt-4o")
+        messages = body.get("messages", [])
+
+        if settings.error_rate and random.random() < settings.error_rate:
+            status = random.choice((429, 500))
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": "Injected failure", "type": "server_error", "code": None}}
+            )
+
+        tokens = tokenize(render(classify(messages), structured="response_format" in body))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(settings.ttft + len(tokens) / settings.tokens_per_sec)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage(messages, len(tokens))
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def event(delta: dict, finish_reason: Optional[str] = None, **extra) -> str:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                **extra
+            }
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            await asyncio.sleep(settings.ttft)
+            yield event({"role": "assistant", "content": ""})
+            interval = 1 / settings.tokens_per_sec
+            started = time.monotonic()
+            for index, token in enumerate(tokens):
+                # Pace against the start time so sleep overhead does not accumulate
+                delay = started + index * interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield event({"content": token})
+            yield event({}, "stop")
+            if include_usage:
+                yield event(None, usage=usage(messages, len(tokens)))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "owned_by": "fake"}]}
+
+    return app
+
+
+def load_payloads(path: str) -> Dict[str, dict]:
+    """Payload overrides from a JSON file mapping basic/detailed/refinement/conversation to responses"""
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=300, help="Time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of failed requests, 0-1")
+    parser.add_argument("--no-fence", action="store_true", help="Return bare JSON without a markdown fence")
+    parser.add_argument("--payloads", help="JSON file overriding the canned responses")
+    args = parser.parse_args()
+
+    settings = FakeSettings(
+        ttft=args.ttft_ms / 1000,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        fenced=not args.no_fence
+    )
+    payloads = load_payloads(args.payloads) if args.payloads else None
+    uvicorn.run(build_app(settings, payloads), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
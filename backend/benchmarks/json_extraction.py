@@ -0,0 +1,175 @@
+"""Benchmark and fuzz the JSON extractor against the model output corpus.
+
+Run from the backend directory:
+    python -m benchmarks.json_extraction
+    python -m benchmarks.json_extraction --fuzz 2000
+"""
+from app.services.json_extractor import JsonExtractor, extract_json
+from pathlib import Path
+from typing import Callable, List, Optional
+import argparse
+import json
+import random
+import sys
+import time
+
+
+CORPUS_PATH = Path(__file__).parent / "corpus" / "model_outputs.jsonl"
+
+
+def load_corpus() -> List[dict]:
+    """Load the model output corpus"""
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def legacy_extract_json(content: str) -> Optional[dict]:
+    """The previous three-strategy extractor, kept for comparison"""
+    if not content:
+        return None
+
+    json_str = None
+    if '```json' in content:
+        json_start = content.find('```json') + 7
+        json_end = content.find('```', json_start)
+        if json_end != -1:
+            json_str = content[json_start:json_end].strip()
+
+    if json_str is None and '```' in content:
+        first_triple = content.find('```')
+        json_start = content.find('\n', first_triple) + 1
+        json_end = content.find('```', json_start)
+        if json_end != -1:
+            potential_json = content[json_start:json_end].strip()
+            if potential_json.startswith('{') and potential_json.endswith('}'):
+                json_str = potential_json
+
+    if json_str is None:
+        json_start = content.find('{')
+        if json_start != -1:
+            brace_count = 0
+            json_end = json_start
+            for i in range(json_start, len(content)):
+                if content[i] == '{':
+                    brace_count += 1
+                elif content[i] == '}':
+                    brace_count -= 1
+                    if brace_count == 0:
+                        json_end = i + 1
+                        break
+            if json_end > json_start:
+                json_str = content[json_start:json_end]
+
+    if json_str is None:
+        return None
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        return None
+
+
+def incremental_extract_json(content: str, chunk_size: int = 4) -> Optional[dict]:
+    """Feed content in small chunks, like a streamed response"""
+    extractor = JsonExtractor()
+    for i in range(0, len(content), chunk_size):
+        if extractor.feed(content[i:i + chunk_size]) is not None:
+            break
+    return extractor.result
+
+
+def outcome(data: Optional[dict]) -> str:
+    """Classify an extraction result the same way the corpus does"""
+    if not isinstance(data, dict):
+        return "none"
+    if data.get("projectPlan"):
+        return "plan"
+    return "message" if "message" in data else "none"
+
+
+def run_benchmark(corpus: List[dict], repeat: int):
+    extractors: List[tuple[str, Callable[[str], Optional[dict]]]] = [
+        ("legacy", legacy_extract_json),
+        ("single-pass", extract_json),
+        ("incremental", incremental_extract_json),
+    ]
+
+    print(f"{'extractor':<12} {'correct':>9} {'us/call':>10}")
+    for name, extract in extractors:
+        correct = 0
+        failures = []
+        for case in corpus:
+            if outcome(extract(case["content"])) == case["expect"]:
+                correct += 1
+            else:
+                failures.append(case["name"])
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for case in corpus:
+                extract(case["content"])
+        elapsed = time.perf_counter() - start
+        per_call = elapsed / (repeat * len(corpus)) * 1e6
+
+        print(f"{name:<12} {correct:>4}/{len(corpus):<4} {per_call:>10.1f}")
+        for failure in failures:
+            print(f"  - wrong result: {failure}")
+
+
+def run_fuzz(corpus: List[dict], iterations: int, seed: int) -> int:
+    """Check extractor invariants on mutated corpus entries, return the failure count"""
+    rng = random.Random(seed)
+    failures = 0
+
+    for _ in range(iterations):
+        case = rng.choice(corpus)
+        content = case["content"]
+        expected = extract_json(content)
+
+        # Chunked feeding must give the same result as one-shot extraction
+        chunk_size = rng.randint(1, 64)
+        if incremental_extract_json(content, chunk_size) != expected:
+            failures += 1
+            print(f"chunking mismatch: {case['name']} (chunk size {chunk_size})")
+
+        # Truncation must never raise and may only return a complete object
+        cut = rng.randint(0, len(content))
+        try:
+            truncated = extract_json(content[:cut])
+        except Exception as e:
+            failures += 1
+            print(f"truncation raised: {case['name']} at {cut}: {e!r}")
+        else:
+            if truncated is not None and not isinstance(truncated, dict):
+                failures += 1
+                print(f"truncation returned non-object: {case['name']} at {cut}")
+
+        # Prose around a valid object must not hide it
+        if expected is not None:
+            prefix = rng.choice(["", "Sure!\n", "Here you go:\n\n", "Note: use {id} params.\n"])
+            suffix = rng.choice(["", "\nEnjoy!", "\n\nLet me know {if} you need more."])
+            if extract_json(prefix + content + suffix) != expected:
+                failures += 1
+                print(f"prose wrapping changed result: {case['name']} ({prefix!r}, {suffix!r})")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="Timing iterations over the corpus")
+    parser.add_argument("--fuzz", type=int, default=0, help="Number of fuzz iterations to run")
+    parser.add_argument("--seed", type=int, default=0, help="Fuzz random seed")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    run_benchmark(corpus, args.repeat)
+
+    if args.fuzz:
+        failures = run_fuzz(corpus, args.fuzz, args.seed)
+        print(f"fuzz: {args.fuzz} iterations, {failures} failures")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
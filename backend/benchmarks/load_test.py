@@ -0,0 +1,276 @@
+"""End-to-end load test of the conversation API against the fake OpenAI server.
+
+Each virtual user has its own session and repeatedly sends a message (a new
+plan first, follow-ups after that), lists its conversations and toggles
+tasks through the batch endpoint. Reports latency percentiles per operation,
+throughput and memory growth.
+
+Run from the backend directory. By default the backend runs in-process and
+the fake OpenAI server in a background thread:
+    python -m benchmarks.load_test --users 20 --iterations 5
+
+Against a running backend (started with OPENAI_BASE_URL pointing at
+`python -m benchmarks.fake_openai`), with memory read from its process:
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --pid <backend pid>
+
+The in-process transport buffers streamed responses, so first-event
+latencies with --stream are only meaningful with --url.
+
+Use --max-p99-ms and --max-error-rate to fail the run on regressions.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import httpx
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+
+TOPICS = ["todo list", "recipe finder", "habit tracker", "markdown blog", "expense splitter",
+          "weather dashboard", "chat room", "url shortener", "flashcards", "photo gallery"]
+FOLLOW_UPS = ["Can you add a testing task?", "Move deployment to Sunday please",
+              "What should I do first?", "Make Saturday lighter"]
+
+
+def rss_kb(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size of a process in KiB, from /proc"""
+    path = Path(f"/proc/{pid or 'self'}/status")
+    try:
+        for line in path.read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class Results:
+    """Latencies and status codes per operation"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    def record(self, operation: str, seconds: float, status: int):
+        self.latencies.setdefault(operation, []).append(seconds)
+        counts = self.statuses.setdefault(operation, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def errors(self) -> int:
+        return sum(n for counts in self.statuses.values() for status, n in counts.items() if status >= 400)
+
+
+async def timed(results: Results, operation: str, request) -> Optional[httpx.Response]:
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        # Transport failures count as status 599
+        results.record(operation, time.perf_counter() - started, 599)
+        return None
+    results.record(operation, time.perf_counter() - started, response.status_code)
+    return response
+
+
+async def send_message(client: httpx.AsyncClient, results: Results, operation: str, payload: dict, stream: bool) -> Optional[dict]:
+    """Send a message and return the stored conversation"""
+    if not stream:
+        response = await timed(results, operation, client.post("/api/conversations", json=payload))
+        return response.json() if response is not None and response.status_code == 200 else None
+
+    started = time.perf_counter()
+    conversation = None
+    try:
+        async with client.stream("POST", "/api/conversations/stream", json=payload) as response:
+            first_event = True
+            async for line in response.aiter_lines():
+                if first_event:
+                    results.record(f"{operation}-first-event", time.perf_counter() - started, response.status_code)
+                    first_event = False
+                if response.status_code == 200 and line:
+                    event = json.loads(line)
+                    if event["type"] == "done":
+                        conversation = event["conversation"]
+            status = response.status_code
+    except httpx.HTTPError:
+        status = 599
+    results.record(operation, time.perf_counter() - started, status)
+    return conversation
+
+
+async def virtual_user(client: httpx.AsyncClient, results: Results, user: int, args: argparse.Namespace):
+    rng = random.Random(args.seed + user)
+    plan: Optional[dict] = None
+
+    for iteration in range(args.iterations):
+        if plan is None:
+            mode = "detailed" if rng.random() < args.detailed_ratio else "basic"
+            message = f"Plan a {rng.choice(TOPICS)} app for this weekend (user {user})"
+            conversation = await send_message(client, results, "create", {"message": message, "mode": mode}, args.stream)
+        else:
+            message = rng.choice(FOLLOW_UPS)
+            conversation = await send_message(client, results, "follow-up", {"message": message, "mode": "basic"}, args.stream)
+
+        if conversation and conversation.get("projectPlan"):
+            plan = conversation
+
+        await timed(results, "list", client.get("/api/conversations"))
+
+        if plan is None:
+            continue
+        for _ in range(args.patches):
+            timeline = plan["projectPlan"]["timeline"]
+            updates = []
+            for _ in range(rng.randint(1, 3)):
+                block = rng.randrange(len(timeline))
+                if timeline[block]["tasks"]:
+                    updates.append({
+                        "timeBlockIndex": block,
+                        "taskIndex": rng.randrange(len(timeline[block]["tasks"])),
+                        "completed": rng.random() < 0.5
+                    })
+            if not updates:
+                break
+            response = await timed(results, "patch-tasks", client.patch(
+                f"/api/conversations/{plan['id']}/tasks/batch",
+                json={"version": plan.get("planVersion", 0), "updates": updates}
+            ))
+            if response is not None and response.status_code == 200:
+                plan["planVersion"] = response.json()["version"]
+
+
+def start_fake_openai(args: argparse.Namespace) -> str:
+    """Run the fake OpenAI server in a background thread and return its base URL"""
+    import uvicorn
+    from benchmarks.fake_openai import FakeSettings, build_app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    settings = FakeSettings(
+        ttft=args.ttft_ms / 1000,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate
+    )
+    server = uvicorn.Server(uvicorn.Config(build_app(settings), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def build_client(args: argparse.Namespace) -> httpx.AsyncClient:
+    """A client with its own cookie jar, against the remote or in-process backend"""
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        return httpx.AsyncClient(base_url=args.url, timeout=timeout)
+
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://backend", timeout=timeout)
+
+
+async def run(args: argparse.Namespace) -> Results:
+    results = Results()
+    clients = [build_client(args) for _ in range(args.users)]
+    try:
+        await asyncio.gather(*[
+            virtual_user(client, results, user, args) for user, client in enumerate(clients)
+        ])
+    finally:
+        for client in clients:
+            await client.aclose()
+    return results
+
+
+def report(results: Results, elapsed: float, rss_before: Optional[int], rss_after: Optional[int]):
+    print(f"{'operation':<24} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for operation, latencies in results.latencies.items():
+        ordered = sorted(latencies)
+        errors = sum(n for status, n in results.statuses[operation].items() if status >= 400)
+        print(
+            f"{operation:<24} {len(ordered):>7} {errors:>7} "
+            f"{percentile(ordered, 50) * 1000:>9.1f} {percentile(ordered, 95) * 1000:>9.1f} "
+            f"{percentile(ordered, 99) * 1000:>9.1f} {ordered[-1] * 1000:>9.1f}"
+        )
+
+    statuses: Dict[int, int] = {}
+    for counts in results.statuses.values():
+        for status, n in counts.items():
+            statuses[status] = statuses.get(status, 0) + n
+    print(f"\nstatus codes: {dict(sorted(statuses.items()))}")
+    print(f"requests: {results.total} in {elapsed:.2f}s ({results.total / elapsed:.1f} req/s)")
+    if rss_before is not None and rss_after is not None:
+        print(f"rss: {rss_before / 1024:.1f} MiB -> {rss_after / 1024:.1f} MiB ({(rss_after - rss_before) / 1024:+.1f} MiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=5, help="Messages sent by each user")
+    parser.add_argument("--patches", type=int, default=3, help="Task batch updates after each message")
+    parser.add_argument("--detailed-ratio", type=float, default=0.2, help="Share of new plans in detailed mode")
+    parser.add_argument("--stream", action="store_true", help="Send messages to the streaming endpoint")
+    parser.add_argument("--url", help="Base URL of a running backend, default runs it in-process")
+    parser.add_argument("--pid", type=int, help="Backend process to measure memory of with --url")
+    parser.add_argument("--timeout", type=float, default=180, help="Client timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ttft-ms", type=float, default=200, help="Fake OpenAI time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=2000, help="Fake OpenAI generation speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake OpenAI failure rate, 0-1")
+    parser.add_argument("--max-p99-ms", type=float, help="Fail if any operation's p99 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if the share of failed requests exceeds this")
+    args = parser.parse_args()
+
+    pid = args.pid
+    if not args.url:
+        # The backend reads its configuration when app.main is imported
+        os.environ["OPENAI_BASE_URL"] = start_fake_openai(args)
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        os.environ.setdefault("SESSION_SECRET", "load-test")
+        pid = None
+        # Import before measuring so the baseline includes the loaded app
+        import app.main  # noqa: F401
+
+    rss_before = rss_kb(pid) if pid or not args.url else None
+    started = time.perf_counter()
+    results = asyncio.run(run(args))
+    elapsed = time.perf_counter() - started
+    rss_after = rss_kb(pid) if pid or not args.url else None
+    report(results, elapsed, rss_before, rss_after)
+
+    failed = False
+    if args.max_p99_ms is not None:
+        for operation, latencies in results.latencies.items():
+            p99 = percentile(sorted(latencies), 99) * 1000
+            if p99 > args.max_p99_ms:
+                print(f"FAIL: {operation} p99 {p99:.1f} ms > {args.max_p99_ms:.1f} ms")
+                failed = True
+    if args.max_error_rate is not None and results.total:
+        error_rate = results.errors / results.total
+        if error_rate > args.max_error_rate:
+            print(f"FAIL: error rate {error_rate:.3f} > {args.max_error_rate:.3f}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
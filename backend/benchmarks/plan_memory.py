@@ -0,0 +1,117 @@
+"""Memory of stored plans as pydantic models against compact store records.
+
+Each variant runs in its own process and reports the RSS growth after
+storing the plans, plus the cost of materializing a plan and of a task
+toggle. Every plan gets unique strings, as real plans would.
+
+Run from the backend directory:
+    python -m benchmarks.plan_memory --plans 100000 --mode detailed
+"""
+from benchmarks.fake_openai import DEFAULT_PAYLOADS
+from benchmarks.load_test import rss_kb
+from typing import List
+import argparse
+import gc
+import json
+import subprocess
+import sys
+import time
+
+
+VARIANTS = ("models", "compact")
+
+
+def conversation_json(mode: str, index: int) -> str:
+    """A stored conversation with a plan whose strings are unique to `index`"""
+    payload = DEFAULT_PAYLOADS[mode]
+    plan = json.loads(json.dumps(payload["projectPlan"]))
+    plan["projectOverview"] += f" #{index}"
+    for time_block in plan["timeline"]:
+        for task in time_block["tasks"]:
+            task["task"] += f" #{index}"
+    return json.dumps({
+        "id": f"conversation-{index}",
+        "userMessage": f"I want to build project #{index}",
+        "botResponse": payload["message"] + f" #{index}",
+        "projectPlan": plan,
+        "timestamp": "2024-06-01T10:00:00"
+    })
+
+
+def run_variant(variant: str, plans: int, mode: str):
+    """Store `plans` conversations and print a JSON result line"""
+    from app.models.chat import Conversation
+    from app.storage.memory_store import InMemoryConversationStore
+
+    gc.collect()
+    before = rss_kb()
+    started = time.perf_counter()
+    if variant == "models":
+        # What the store kept before: one pydantic tree per conversation
+        stored: List[Conversation] = [
+            Conversation.model_validate_json(conversation_json(mode, i)) for i in range(plans)
+        ]
+    else:
+        stored = InMemoryConversationStore(max_materialized=0)
+        for i in range(plans):
+            stored.add(f"user-{i % 1000}", Conversation.model_validate_json(conversation_json(mode, i)))
+    build_seconds = time.perf_counter() - started
+    gc.collect()
+    after = rss_kb()
+
+    repeat = 2000
+    started = time.perf_counter()
+    for i in range(repeat):
+        if variant == "models":
+            conversation = stored[i]
+            conversation.project_plan.timeline[0].tasks[0].completed = True
+            conversation.plan_version += 1
+        else:
+            stored.update_tasks(f"conversation-{i}", f"user-{i % 1000}", [(0, 0, True)])
+    toggle_us = (time.perf_counter() - started) / repeat * 1e6
+
+    started = time.perf_counter()
+    for i in range(repeat):
+        if variant == "models":
+            stored[i]
+        else:
+            stored.get(f"conversation-{i}")
+    get_us = (time.perf_counter() - started) / repeat * 1e6
+
+    print(json.dumps({
+        "variant": variant,
+        "rssMiB": (after - before) / 1024,
+        "bytesPerPlan": (after - before) * 1024 / plans,
+        "buildSeconds": build_seconds,
+        "toggleUs": toggle_us,
+        "getUs": get_us
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=100_000)
+    parser.add_argument("--mode", choices=("basic", "detailed"), default="detailed")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.plans, args.mode)
+        return
+
+    tasks = sum(len(block["tasks"]) for block in DEFAULT_PAYLOADS[args.mode]["projectPlan"]["timeline"])
+    print(f"{args.plans} {args.mode} plans with {tasks} tasks each")
+    print(f"{'variant':<10} {'rss MiB':>9} {'bytes/plan':>11} {'build s':>8} {'toggle us':>10} {'get us':>8}")
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.plan_memory", "--variant", variant,
+             "--plans", str(args.plans), "--mode", args.mode],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{variant:<10} {result['rssMiB']:>9.1f} {result['bytesPerPlan']:>11.0f} "
+              f"{result['buildSeconds']:>8.1f} {result['toggleUs']:>10.2f} {result['getUs']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Plan search and similar-plan lookup with the inverted index against scanning the store.
+
+Builds a store of plans with varied messages, tech stacks and tasks,
+then times a session-scoped search and a cross-session similar-plan
+lookup both ways, plus the index build time, from models as plans are
+stored and from the store's records as at startup, and its memory.
+
+Run from the backend directory:
+    python -m benchmarks.plan_search --plans 50000
+"""
+from benchmarks.plan_memory import conversation_json
+from typing import List
+import argparse
+import random
+import time
+import tracemalloc
+
+
+TECHNOLOGIES = ["Svelte", "React", "Vue", "FastAPI", "Django", "Flask", "Node.js", "Go", "Rust", "PostgreSQL",
+                "SQLite", "Redis", "Tailwind", "Supabase", "Firebase", "Stripe", "OpenAI", "C++", "Unity", "Swift"]
+SUBJECTS = ["habit", "budget", "recipe", "workout", "reading", "travel", "garden", "music", "chess", "weather",
+            "podcast", "journal", "language", "plant", "pet", "movie", "study", "meditation", "sleep", "coffee"]
+KINDS = ["tracker", "planner", "dashboard", "chatbot", "game", "marketplace", "scheduler", "analyzer", "bot", "app"]
+FEATURES = ["streaks", "reminders", "sharing", "charts", "offline", "sync", "export", "leaderboard", "tags", "search"]
+
+
+def conversation(index: int, rng: random.Random):
+    from app.models.chat import Conversation
+    data = Conversation.model_validate_json(conversation_json("basic", index))
+    subject, kind = rng.choice(SUBJECTS), rng.choice(KINDS)
+    features = rng.sample(FEATURES, 2)
+    data.user_message = f"Build a {subject} {kind} with {features[0]} and {features[1]}"
+    plan = data.project_plan
+    plan.project_overview = f"A {subject} {kind} #{index}"
+    plan.tech_stack = rng.sample(TECHNOLOGIES, 3)
+    for time_block in plan.timeline:
+        for task in time_block.tasks:
+            task.task += f" for the {subject} {rng.choice(FEATURES)}"
+    return data
+
+
+def timed(function, repeat: int) -> float:
+    """Microseconds per call"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plans", type=int, default=50_000)
+    parser.add_argument("--plans-per-session", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    from app.services.plan_index import PlanIndex, tokenize
+    from app.storage.memory_store import InMemoryConversationStore
+
+    rng = random.Random(1)
+    store = InMemoryConversationStore(max_materialized=0)
+    sessions = max(1, args.plans // args.plans_per_session)
+    entries = [(f"session-{i % sessions}", conversation(i, rng)) for i in range(args.plans)]
+    store.import_conversations(entries)
+
+    started = time.perf_counter()
+    index = PlanIndex()
+    for user, data in entries:
+        index.add(user, data, "basic-v1")
+    build_seconds = time.perf_counter() - started
+
+    # What startup does: index the store's compact records without materializing them
+    started = time.perf_counter()
+    stored = PlanIndex()
+    for user, record in store.iter_plan_records():
+        stored.add_record(user, record)
+    startup_seconds = time.perf_counter() - started
+    del stored
+
+    # Memory measured on a second build, tracing slows the timed one down
+    tracemalloc.start()
+    traced = PlanIndex()
+    for user, data in entries:
+        traced.add(user, data, "basic-v1")
+    index_mib = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    del traced
+
+    query = "svelte habit streaks"
+    message = "Build a habit tracker with streaks and reminders"
+    user = "session-7"
+
+    def scan_search() -> List[str]:
+        # Before: materialize the session's history and match terms in every plan
+        terms = set(tokenize(query))
+        matches = []
+        for data in store.list(user):
+            plan = data.project_plan
+            text = " ".join([plan.project_overview, *plan.tech_stack, *(t.task for b in plan.timeline for t in b.tasks)])
+            if terms & set(tokenize(text)):
+                matches.append(data.id)
+        return matches
+
+    def scan_similar():
+        terms = set(tokenize(message))
+        best = None, 0.0
+        for _, data in store.iter_conversations():
+            other = set(tokenize(data.user_message))
+            similarity = len(terms & other) / len(terms | other)
+            if similarity > best[1]:
+                best = data.id, similarity
+        return best
+
+    print(f"{args.plans} plans, {sessions} sessions; index built in {build_seconds:.1f}s "
+          f"({startup_seconds:.1f}s from stored records), {index_mib:.0f} MiB")
+    print(f"{'operation':<24} {'scan us':>12} {'index us':>12}")
+    print(f"{'session search':<24} {timed(scan_search, args.repeat):>12.0f} "
+          f"{timed(lambda: index.search(query, user=user), args.repeat):>12.0f}")
+    repeat = max(1, args.repeat // 100)
+    print(f"{'similar plan':<24} {timed(scan_similar, repeat):>12.0f} "
+          f"{timed(lambda: index.similar(message, 'basic-v1', 0.8), args.repeat):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare CPU per request of FastAPI response_model serialization against the
+cached TypeAdapter serializer for a conversation history.
+
+Run from the backend directory:
+    python -m benchmarks.serialization --conversations 50
+"""
+from app.models.chat import Conversation, ConversationResponse, ProjectPlan
+from app.services.serialization import ConversationSerializer
+from benchmarks.fake_openai import DEFAULT_PAYLOADS
+from datetime import datetime
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from typing import Callable, List
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+
+def build_history(count: int) -> List[Conversation]:
+    """A history of detailed plans, like a user iterating on a project"""
+    plan = DEFAULT_PAYLOADS["detailed"]["projectPlan"]
+    return [
+        Conversation(
+            id=str(uuid.uuid4()),
+            user_message=f"Refine the plan, step {i}",
+            bot_response="Here's the updated plan with the changes you asked for.",
+            project_plan=ProjectPlan(**plan),
+            timestamp=datetime.now()
+        )
+        for i in range(count)
+    ]
+
+
+def measure(render: Callable[[], bytes], repeat: int) -> float:
+    """CPU microseconds per call"""
+    render()
+    started = time.process_time()
+    for _ in range(repeat):
+        render()
+    return (time.process_time() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    history = build_history(args.conversations)
+    field = create_response_field(name="Response_get_conversations", type_=List[ConversationResponse])
+    loop = asyncio.new_event_loop()
+
+    def response_model() -> bytes:
+        # What FastAPI did with response_model=List[ConversationResponse]
+        content = loop.run_until_complete(serialize_response(field=field, response_content=history))
+        return JSONResponse(content).body
+
+    def uncached() -> bytes:
+        return ConversationSerializer(max_entries=0).dumps_list(history)
+
+    serializer = ConversationSerializer()
+
+    def cached() -> bytes:
+        return serializer.dumps_list(history)
+
+    def cached_after_update() -> bytes:
+        # One task toggle invalidates a single conversation
+        history[-1].plan_version += 1
+        return serializer.dumps_list(history)
+
+    assert json.loads(response_model()) == json.loads(cached()), "serializers disagree"
+
+    print(f"history of {args.conversations} detailed plans, {len(cached()) / 1024:.0f} KiB")
+    print(f"{'serializer':<28} {'cpu us/req':>10} {'speedup':>8}")
+    baseline = None
+    for name, render in (
+        ("response_model (before)", response_model),
+        ("TypeAdapter, uncached", uncached),
+        ("TypeAdapter, cached", cached),
+        ("cached, one plan changed", cached_after_update),
+    ):
+        per_call = measure(render, args.repeat)
+        baseline = baseline or per_call
+        print(f"{name:<28} {per_call:>10.1f} {baseline / per_call:>7.1f}x")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare requests/sec of the signed-cookie session middleware against the
+previous BaseHTTPMiddleware implementation.
+
+Run from the backend directory:
+    python -m benchmarks.session_middleware --requests 5000
+"""
+from app.middleware.session import SessionMiddleware
+from datetime import datetime
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from uuid import uuid4
+import argparse
+import asyncio
+import httpx
+import time
+
+
+legacy_sessions: dict = {}
+
+
+class LegacySessionMiddleware(BaseHTTPMiddleware):
+    """The previous in-memory session middleware, kept for comparison"""
+
+    async def dispatch(self, request: Request, call_next):
+        session_id = request.cookies.get("session_id")
+        if not session_id or session_id not in legacy_sessions:
+            session_id = str(uuid4())
+            legacy_sessions[session_id] = {"created_at": datetime.now().isoformat()}
+        request.state.session_id = session_id
+        response: Response = await call_next(request)
+        response.set_cookie(
+            key="session_id",
+            value=session_id,
+            httponly=True,
+            secure=False,
+            samesite="lax",
+            max_age=86400 * 7
+        )
+        return response
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+    if middleware is SessionMiddleware:
+        app.add_middleware(SessionMiddleware, secret=b"benchmark-secret")
+    else:
+        app.add_middleware(middleware)
+
+    @app.get("/ping")
+    async def ping(request: Request):
+        return {"session": request.state.session_id}
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int, concurrency: int) -> tuple[float, int]:
+    """Return requests/sec and the number of Set-Cookie headers sent"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # First request establishes the session cookie
+        await client.get("/ping")
+        set_cookies = 0
+        per_worker = requests // concurrency
+
+        async def worker():
+            nonlocal set_cookies
+            for _ in range(per_worker):
+                response = await client.get("/ping")
+                if "set-cookie" in response.headers:
+                    set_cookies += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        return per_worker * concurrency / elapsed, set_cookies
+
+
+async def run(requests: int, concurrency: int):
+    print(f"{'middleware':<12} {'req/s':>10} {'set-cookie':>11}")
+    for name, middleware in (("legacy", LegacySessionMiddleware), ("signed", SessionMiddleware)):
+        rps, set_cookies = await measure(build_app(middleware), requests, concurrency)
+        print(f"{name:<12} {rps:>10.0f} {set_cookies:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from app.services.plan_stream import PlanStreamParser
+
+
+def feed_all(content: str, step: int = 3) -> list:
+    parser = PlanStreamParser()
+    events = []
+    for i in range(0, len(content), step):
+        events.extend(parser.feed(content[i:i + step]))
+    return events
+
+
+def test_message_with_raw_newline_keeps_streaming():
+    content = '{"message": "Line one\nLine two\tand three", "projectPlan": null}'
+    events = feed_all(content)
+    assert "".join(event["delta"] for event in events if event["type"] == "message") == "Line one\nLine two\tand three"
+
+
+def test_time_block_with_raw_control_characters_is_emitted():
+    content = (
+        '{"message": "Hi", "projectPlan": {"projectOverview": "App", "techStack": [], "timeline": ['
+        '{"timeBlock": "Saturday\tMorning", "tasks": [{"task": "Set up\nrepo", "essential": true, "estimatedTime": "1 hour"}]}'
+        '], "tips": []}}'
+    )
+    time_blocks = [event for event in feed_all(content) if event["type"] == "timeBlock"]
+    assert len(time_blocks) == 1
+    assert time_blocks[0]["timeBlock"]["tasks"][0]["task"] == "Set up\nrepo"
@@ -42,6 +42,34 @@ class HttpService {
     }
   }
 
+  /**
+   * GET returning the parsed body together with the response headers
+   */
+  async getWithHeaders<T>(
+    endpoint: string,
+    customHeaders?: Record<string, string>
+  ): Promise<{ data: T; headers: Headers }> {
+    try {
+      const response = await fetch(`${this.baseUrl}${endpoint}`, {
+        method: 'GET',
+        headers: {
+          'Content-Type': 'application/json',
+          ...customHeaders,
+        },
+        credentials: 'include',
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return { data: await response.json(), headers: response.headers };
+    } catch (error) {
+      console.error('HTTP Request failed:', error);
+      throw error;
+    }
+  }
+
   async get<T>(endpoint: string, customHeaders?: Record<string, string>): Promise<T> {
     return this.request<T>(endpoint, {
       method: 'GET',
@@ -92,6 +120,47 @@ class HttpService {
     });
   }
 
+  async streamNdjson<T>(
+    endpoint: string,
+    data: unknown,
+    onEvent: (event: T) => void,
+    customHeaders?: Record<string, string>
+  ): Promise<void> {
+    try {
+      const response = await fetch(`${this.baseUrl}${endpoint}`, {
+        method: 'POST',
+        body: JSON.stringify(data),
+        headers: {
+          'Content-Type': 'application/json',
+          ...customHeaders,
+        },
+        credentials: 'include',
+      });
+
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      // Read newline-delimited JSON events as they arrive
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        for (const line of lines) {
+          if (line.trim()) onEvent(JSON.parse(line) as T);
+        }
+      }
+      if (buffer.trim()) onEvent(JSON.parse(buffer) as T);
+    } catch (error) {
+      console.error('Stream request failed:', error);
+      throw error;
+    }
+  }
+
   async uploadFile<T>(endpoint: string, formData: FormData): Promise<T> {
     try {
       const response = await fetch(`${this.baseUrl}${endpoint}`, {
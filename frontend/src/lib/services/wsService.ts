@@ -0,0 +1,127 @@
+const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+const WS_URL = `${API_BASE_URL.replace(/^http/, 'ws')}/api/ws`;
+
+// Reconnect delays grow up to this limit while the server is unreachable
+const MAX_RECONNECT_DELAY_MS = 10000;
+
+export interface PushFrame {
+  type: string;
+  [key: string]: unknown;
+}
+
+interface PendingRequest {
+  resolve: (data: any) => void;
+  reject: (error: unknown) => void;
+  onEvent?: (event: any) => void;
+}
+
+export class WsRequestError extends Error {
+  constructor(public status: number, public detail: unknown) {
+    super(`WebSocket request failed with status ${status}`);
+  }
+}
+
+/**
+ * One WebSocket per tab for chat, task updates and history sync. Requests
+ * are matched to their replies by id; frames without an id are changes
+ * pushed by the server and go to the subscribers.
+ */
+class WsService {
+  private socket: WebSocket | null = null;
+  private pending = new Map<string, PendingRequest>();
+  private subscribers = new Set<(frame: PushFrame) => void>();
+  private nextId = 0;
+  private reconnectDelay = 500;
+  private reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+  private wasConnected = false;
+  private stopped = true;
+
+  get isOpen(): boolean {
+    return this.socket?.readyState === WebSocket.OPEN;
+  }
+
+  /** Open the connection and keep it open until disconnect() */
+  connect(): void {
+    this.stopped = false;
+    if (this.socket) return;
+
+    const socket = new WebSocket(WS_URL);
+    this.socket = socket;
+
+    socket.onopen = () => {
+      this.reconnectDelay = 500;
+      if (this.wasConnected) {
+        // Pushes may have been missed while disconnected
+        this.notify({ type: 'reconnected' });
+      }
+      this.wasConnected = true;
+    };
+
+    socket.onmessage = (message) => {
+      const frame = JSON.parse(message.data);
+      if (frame.id == null) {
+        if (frame.type === 'error') {
+          console.error('WebSocket error:', frame.detail);
+        } else {
+          this.notify(frame);
+        }
+        return;
+      }
+      const request = this.pending.get(frame.id);
+      if (!request) return;
+      if (frame.type === 'chat.event') {
+        request.onEvent?.(frame.event);
+        return;
+      }
+      this.pending.delete(frame.id);
+      if (frame.type === 'error') {
+        request.reject(new WsRequestError(frame.status, frame.detail));
+      } else {
+        request.resolve(frame.data);
+      }
+    };
+
+    socket.onclose = () => {
+      this.socket = null;
+      this.pending.forEach((request) => request.reject(new Error('WebSocket closed')));
+      this.pending.clear();
+      if (!this.stopped) {
+        this.reconnectTimer = setTimeout(() => this.connect(), this.reconnectDelay);
+        this.reconnectDelay = Math.min(this.reconnectDelay * 2, MAX_RECONNECT_DELAY_MS);
+      }
+    };
+  }
+
+  disconnect(): void {
+    this.stopped = true;
+    if (this.reconnectTimer) clearTimeout(this.reconnectTimer);
+    this.socket?.close();
+  }
+
+  /** Receive pushed changes; returns the function to unsubscribe */
+  subscribe(handler: (frame: PushFrame) => void): () => void {
+    this.subscribers.add(handler);
+    return () => this.subscribers.delete(handler);
+  }
+
+  /**
+   * Send a request and resolve with the data of its result. `onEvent` gets
+   * the streamed events of a chat.send request.
+   */
+  request<T>(message: { type: string; [key: string]: unknown }, onEvent?: (event: any) => void): Promise<T> {
+    if (!this.socket || !this.isOpen) {
+      return Promise.reject(new Error('WebSocket is not connected'));
+    }
+    const id = String(++this.nextId);
+    return new Promise<T>((resolve, reject) => {
+      this.pending.set(id, { resolve, reject, onEvent });
+      this.socket!.send(JSON.stringify({ ...message, id }));
+    });
+  }
+
+  private notify(frame: PushFrame): void {
+    this.subscribers.forEach((handler) => handler(frame));
+  }
+}
+
+export const wsService = new WsService();
@@ -1,16 +1,145 @@
 import { httpService } from "$lib/services/httpService";
-import type { SendMessageRequest, ConversationData } from "../types/chat";
+import { wsService } from "$lib/services/wsService";
+import type {
+  SendMessageRequest,
+  ConversationData,
+  StreamEvent,
+  ConversationPage,
+  ConversationSyncPage,
+  TaskUpdate,
+  TaskBatchResponse,
+  JobStatus
+} from "../types/chat";
+
+// Longest a job status request waits on the server
+const JOB_WAIT_SECONDS = 30;
+
+// Conversations per history sync page, the server's maximum
+const SYNC_PAGE_SIZE = 200;
+
+// Rapid checkbox toggles within this window are sent as one batch
+const TASK_UPDATE_DELAY_MS = 150;
+
+interface PendingTaskBatch {
+  version: number;
+  updates: Map<string, TaskUpdate>;
+  waiters: { resolve: (version: number) => void; reject: (error: unknown) => void }[];
+}
+
+const pendingTaskBatches = new Map<string, PendingTaskBatch>();
+const inFlightTaskBatches = new Map<string, Promise<void>>();
+const knownPlanVersions = new Map<string, number>();
+
+async function flushTaskUpdates(conversationId: string): Promise<void> {
+  // Batches of the same plan are sent one after another so each uses the latest version
+  await inFlightTaskBatches.get(conversationId);
+
+  const batch = pendingTaskBatches.get(conversationId);
+  if (!batch) return;
+  pendingTaskBatches.delete(conversationId);
+
+  const request = (async () => {
+    try {
+      const body = {
+        version: knownPlanVersions.get(conversationId) ?? batch.version,
+        updates: [...batch.updates.values()]
+      };
+      // Over the open WebSocket if there is one, which also syncs other tabs without a round trip here
+      const result = wsService.isOpen
+        ? await wsService.request<TaskBatchResponse>({ type: 'tasks.update', conversationId, ...body })
+        : await httpService.patch<TaskBatchResponse>(`/api/conversations/${conversationId}/tasks/batch`, body);
+      knownPlanVersions.set(conversationId, result.version);
+      batch.waiters.forEach((waiter) => waiter.resolve(result.version));
+    } catch (error) {
+      knownPlanVersions.delete(conversationId);
+      batch.waiters.forEach((waiter) => waiter.reject(error));
+    }
+  })();
+
+  inFlightTaskBatches.set(conversationId, request);
+  await request;
+  if (inFlightTaskBatches.get(conversationId) === request) {
+    inFlightTaskBatches.delete(conversationId);
+  }
+}
 
 export const chatService = {
   sendMessage: (data: SendMessageRequest, customHeaders?: Record<string, string>) => {
     return httpService.post<ConversationData>('/api/conversations', data, customHeaders);
   },
 
+  streamMessage: (
+    data: SendMessageRequest,
+    onEvent: (event: StreamEvent) => void,
+    customHeaders?: Record<string, string>
+  ) => {
+    if (wsService.isOpen && !customHeaders) {
+      return wsService.request<void>({ type: 'chat.send', message: data }, onEvent);
+    }
+    return httpService.streamNdjson<StreamEvent>('/api/conversations/stream', data, onEvent, customHeaders);
+  },
+
+  /**
+   * Queue a message as a background job. Retrying with the same idempotency
+   * key returns the same job instead of generating the plan twice.
+   */
+  submitJob: (data: SendMessageRequest, idempotencyKey: string = crypto.randomUUID()) => {
+    return httpService.post<JobStatus>('/api/jobs', data, { 'Idempotency-Key': idempotencyKey });
+  },
+
+  /** Long-poll a job until it has succeeded or failed */
+  waitForJob: async (jobId: string): Promise<JobStatus> => {
+    for (;;) {
+      const job = await httpService.get<JobStatus>(`/api/jobs/${jobId}?wait=${JOB_WAIT_SECONDS}`);
+      if (job.status === 'succeeded' || job.status === 'failed') return job;
+    }
+  },
+
+  /**
+   * A page of the conversations after the given one, to catch up after the
+   * WebSocket reconnected. While `hasMore` is true, request the next page
+   * with the id of the page's last conversation. Without `since` the whole
+   * history is returned.
+   */
+  syncConversations: async (since?: string): Promise<ConversationSyncPage> => {
+    if (wsService.isOpen) {
+      return wsService.request<ConversationSyncPage>(
+        since ? { type: 'history.sync', since, limit: SYNC_PAGE_SIZE } : { type: 'history.sync' }
+      );
+    }
+    if (!since) {
+      return { conversations: await httpService.get<ConversationData[]>('/api/conversations'), hasMore: false };
+    }
+    const params = new URLSearchParams({ since, limit: String(SYNC_PAGE_SIZE) });
+    const { data, headers } = await httpService.getWithHeaders<ConversationData[]>(`/api/conversations?${params}`);
+    return { conversations: data, hasMore: headers.has('X-Next-Cursor') };
+  },
+
+  getConversation: (conversationId: string, customHeaders?: Record<string, string>) => {
+    return httpService.get<ConversationData>(`/api/conversations/${conversationId}`, customHeaders);
+  },
+
   getConversations: (customHeaders?: Record<string, string>) => {
     return httpService.get<ConversationData[]>('/api/conversations', customHeaders);
   },
 
+  /**
+   * Get the newest conversations, or the ones before a cursor. The browser
+   * revalidates unchanged pages with the ETag and gets a 304.
+   */
+  getConversationPage: async (limit: number, before?: string): Promise<ConversationPage> => {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (before) params.set('before', before);
+    const { data, headers } = await httpService.getWithHeaders<ConversationData[]>(
+      `/api/conversations?${params}`
+    );
+    return { conversations: data, nextCursor: headers.get('X-Next-Cursor') };
+  },
+
   clearConversations: async (): Promise<void> => {
+    if (wsService.isOpen) {
+      return wsService.request<void>({ type: 'conversations.clear' });
+    }
     return httpService.delete<void>('/api/conversations');
   },
 
@@ -31,4 +160,29 @@ export const chatService = {
       customHeaders
     );
   },
+
+  /**
+   * Queue a task completion change. Changes to the same plan made in quick
+   * succession are coalesced into one versioned batch request; the promise
+   * resolves with the new plan version once the batch is stored.
+   */
+  queueTaskUpdate: (
+    conversationId: string,
+    planVersion: number,
+    timeBlockIndex: number,
+    taskIndex: number,
+    completed: boolean
+  ): Promise<number> => {
+    return new Promise((resolve, reject) => {
+      let batch = pendingTaskBatches.get(conversationId);
+      if (!batch) {
+        batch = { version: planVersion, updates: new Map(), waiters: [] };
+        pendingTaskBatches.set(conversationId, batch);
+        setTimeout(() => flushTaskUpdates(conversationId), TASK_UPDATE_DELAY_MS);
+      }
+      // The last toggle of a task wins
+      batch.updates.set(`${timeBlockIndex}:${taskIndex}`, { timeBlockIndex, taskIndex, completed });
+      batch.waiters.push({ resolve, reject });
+    });
+  },
 };
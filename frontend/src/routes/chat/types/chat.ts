@@ -17,6 +17,29 @@ export interface ProjectPlan {
   tips: string[];
 }
 
+export interface PlanPatchOperation {
+  op:
+    | 'addTask'
+    | 'updateTask'
+    | 'removeTask'
+    | 'moveTask'
+    | 'addTimeBlock'
+    | 'renameTimeBlock'
+    | 'removeTimeBlock'
+    | 'setOverview'
+    | 'setTechStack'
+    | 'setTips';
+  blockIndex?: number;
+  taskIndex?: number;
+  toBlockIndex?: number;
+  toTaskIndex?: number;
+  task?: string;
+  essential?: boolean;
+  estimatedTime?: string;
+  name?: string;
+  value?: string | string[];
+}
+
 export interface SendMessageRequest {
   message: string;
   mode?: 'basic' | 'detailed';
@@ -27,5 +50,53 @@ export interface ConversationData {
   userMessage: string;
   botResponse: string;
   projectPlan?: ProjectPlan;
+  planPatch?: PlanPatchOperation[];
+  baseConversationId?: string;
+  planVersion: number;
   timestamp: string;
 }
+
+export interface TaskUpdate {
+  timeBlockIndex: number;
+  taskIndex: number;
+  completed: boolean;
+}
+
+export interface TaskBatchResponse {
+  message: string;
+  version: number;
+}
+
+export type StreamEvent =
+  | { type: 'message'; delta: string }
+  | { type: 'timeBlock'; index: number; timeBlock: TimeBlock }
+  | { type: 'patch'; operations: PlanPatchOperation[] }
+  | { type: 'error'; message: string }
+  | { type: 'done'; conversation: ConversationData };
+
+// Changes pushed over the WebSocket when another tab or request changed the history
+export type PushEvent =
+  | { type: 'conversation.created'; conversation: ConversationData }
+  | { type: 'tasks.updated'; conversationId: string; version: number; updates: TaskUpdate[] }
+  | { type: 'conversations.cleared' }
+  | { type: 'reconnected' };
+
+export interface ConversationPage {
+  conversations: ConversationData[];
+  nextCursor: string | null; // Pass as `before` to load older conversations
+}
+
+export interface ConversationSyncPage {
+  conversations: ConversationData[];
+  hasMore: boolean; // More conversations after this page, request them with the last id as `since`
+}
+
+export interface JobStatus {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  conversationId: string | null;
+  conversation: ConversationData | null;
+  error: string | null;
+  createdAt: string;
+  finishedAt: string | null;
+}